@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""Asset inventory (migration plan task 3.2): what each site references, how big, and how much is shared.
+
+Image, video, PDF, download, script, stylesheet and font references are
+pulled from the HTML site_crawler.py stored (and from url() rules in the
+stylesheets found there). Every distinct URL is sized by the shared
+session's probe: a HEAD, or a one-byte ranged GET where HEAD gives no length.
+Identical files across sites are found by content hash. Only assets whose
+size collides with another asset's are downloaded, and they are hashed
+as they stream, so a unique file is never fetched and nothing is held in
+memory or written to disk. Everything goes to a small SQLite store that
+later runs resume from.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import os
+import posixpath
+import re
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from http_session import HEADERS, CatalogSession
+from pool_map import bounded_map
+from site_crawler import STATE_PATH, normalize_url
+
+ASSET_PATH = "data/assets/assets.sqlite"
+CONCURRENCY = 32
+# Larger files are sized but not hashed (videos, installers)
+MAX_HASH_BYTES = 256 * 1024 * 1024
+MAX_CSS_BYTES = 2 * 1024 * 1024
+COMMIT_EVERY = 200
+
+KIND_EXTENSIONS = {
+    "image": (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".svg", ".ico", ".bmp", ".tif", ".tiff"),
+    "video": (".mp4", ".m4v", ".mov", ".webm", ".avi", ".ogv"),
+    "audio": (".mp3", ".wav", ".ogg", ".m4a"),
+    "pdf": (".pdf",),
+    "download": (".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".csv", ".txt"),
+    "script": (".js", ".mjs"),
+    "stylesheet": (".css",),
+    "font": (".woff", ".woff2", ".ttf", ".otf", ".eot"),
+}
+EXTENSION_KIND = {ext: kind for kind, exts in KIND_EXTENSIONS.items() for ext in exts}
+# Plain links count as assets only when they point at files
+LINKED_KINDS = {"image", "video", "audio", "pdf", "download"}
+CSS_URL = re.compile(r"""url\(\s*(['"]?)([^'")]+?)\1\s*\)|@import\s+(['"])([^'"]+)\3""", re.I)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    site TEXT,                  -- NULL for stylesheets, which belong to every site using them
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS assets (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    host TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status INTEGER,
+    content_type TEXT,
+    size INTEGER,
+    etag TEXT,
+    sha256 BLOB,
+    probed REAL,
+    hashed REAL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS refs (
+    page INTEGER NOT NULL,
+    asset INTEGER NOT NULL,
+    PRIMARY KEY (page, asset)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS refs_asset ON refs(asset);
+CREATE INDEX IF NOT EXISTS assets_size ON assets(size);
+CREATE INDEX IF NOT EXISTS assets_sha256 ON assets(sha256);
+"""
+
+# Every (site, asset) pair, following stylesheets (and their @imports) to what they load
+SITE_ASSETS = """
+WITH RECURSIVE site_assets(site, asset) AS (
+    SELECT p.site, r.asset FROM refs r JOIN pages p ON p.id = r.page WHERE p.site IS NOT NULL
+    UNION
+    SELECT sa.site, r.asset FROM site_assets sa
+    JOIN assets a ON a.id = sa.asset AND a.kind = 'stylesheet'
+    JOIN pages p ON p.url = a.url
+    JOIN refs r ON r.page = p.id
+)
+"""
+
+
+def open_store(path: str | Path = ASSET_PATH) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def asset_kind(url: str, hint: str | None = None) -> str | None:
+    ext = posixpath.splitext(urlsplit(url).path.lower())[1]
+    return EXTENSION_KIND.get(ext) or hint
+
+
+class AssetExtractor(HTMLParser):
+    """Collects (raw URL, kind hint) for everything a page loads or links as a file."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.base: str | None = None
+        self.refs: list[tuple[str, str | None]] = []
+        self._in_style = False
+        self._media: str | None = None
+
+    def _add(self, url: str | None, hint: str | None):
+        if url and not url.startswith(("data:", "blob:", "javascript:", "mailto:", "tel:", "#")):
+            self.refs.append((url.strip(), hint))
+
+    def _srcset(self, value: str | None, hint: str):
+        for candidate in (value or "").split(","):
+            self._add(candidate.strip().split(" ")[0], hint)
+
+    def handle_starttag(self, tag, attrs):
+        a = dict(attrs)
+        if tag == "base" and self.base is None:
+            self.base = a.get("href")
+        elif tag == "img":
+            for attr in ("src", "data-src", "data-lazy-src"):
+                self._add(a.get(attr), "image")
+            self._srcset(a.get("srcset") or a.get("data-srcset"), "image")
+        elif tag in ("video", "audio"):
+            self._media = tag
+            self._add(a.get("src"), tag)
+            self._add(a.get("poster"), "image")
+        elif tag == "source":
+            hint = self._media or "image"
+            self._add(a.get("src"), hint)
+            self._srcset(a.get("srcset"), hint)
+        elif tag == "script":
+            self._add(a.get("src"), "script")
+        elif tag == "link":
+            rel = (a.get("rel") or "").lower().split()
+            if "stylesheet" in rel:
+                self._add(a.get("href"), "stylesheet")
+            elif "icon" in rel or "apple-touch-icon" in rel:
+                self._add(a.get("href"), "image")
+            elif "preload" in rel and a.get("as") in ("font", "image", "script", "style"):
+                self._add(a.get("href"), {"style": "stylesheet"}.get(a["as"], a["as"]))
+        elif tag in ("object", "embed", "iframe"):
+            url = a.get("data") or a.get("src")
+            if url and asset_kind(url) in LINKED_KINDS:
+                self._add(url, None)
+        elif tag == "a":
+            href = a.get("href")
+            if href and asset_kind(href) in LINKED_KINDS:
+                self._add(href, None)
+        elif tag == "meta" and a.get("property") in ("og:image", "twitter:image"):
+            self._add(a.get("content"), "image")
+        elif tag == "style":
+            self._in_style = True
+        if a.get("style") and "url(" in a["style"]:
+            self.css(a["style"])
+
+    def handle_endtag(self, tag):
+        if tag == "style":
+            self._in_style = False
+        elif tag in ("video", "audio"):
+            self._media = None
+
+    def handle_data(self, data):
+        if self._in_style:
+            self.css(data)
+
+    def css(self, text: str):
+        for m in CSS_URL.finditer(text):
+            self._add(m.group(2) or m.group(4), "stylesheet" if m.group(4) else None)
+
+
+def resolve_refs(refs, base: str) -> list[tuple[str, str]]:
+    """Absolute, normalized (url, kind) pairs; unknown kinds are dropped."""
+    out = {}
+    for raw, hint in refs:
+        url = normalize_url(urljoin(base, raw))
+        kind = asset_kind(url, hint) if url else None
+        if kind:
+            out.setdefault(url, kind)
+    return list(out.items())
+
+
+def extract_page(job) -> tuple[str, str, list[tuple[str, str]]]:
+    """(site, page URL, [(asset URL, kind)]) for one stored page; runs in a worker process."""
+    site, url, final_url, html = job
+    parser = AssetExtractor()
+    try:
+        parser.feed(zlib.decompress(html).decode("utf-8", errors="replace"))
+        parser.close()
+    except Exception:
+        pass
+    base = final_url or url
+    if parser.base:
+        base = urljoin(base, parser.base)
+    return site, url, resolve_refs(parser.refs, base)
+
+
+def css_refs(text: str, css_url: str) -> list[tuple[str, str]]:
+    parser = AssetExtractor()
+    parser.css(text)
+    # Anything a stylesheet loads without a telling extension is most likely an image
+    return resolve_refs([(u, hint or "image") for u, hint in parser.refs], css_url)
+
+
+class Inventory:
+    """Extraction, probing and hashing against one asset store."""
+
+    def __init__(self, db: sqlite3.Connection, session: CatalogSession, concurrency: int = CONCURRENCY,
+                 max_hash_bytes: int = MAX_HASH_BYTES):
+        self.db = db
+        self.session = session
+        self.concurrency = concurrency
+        self.max_hash_bytes = max_hash_bytes
+        self.downloaded = 0
+        self._writes = 0
+
+    def add_refs(self, site: str | None, page: str, refs: list[tuple[str, str]]) -> None:
+        db = self.db
+        db.execute("INSERT OR IGNORE INTO pages (site, url) VALUES (?, ?)", (site, page))
+        page_id = db.execute("SELECT id FROM pages WHERE url=?", (page,)).fetchone()[0]
+        db.executemany("INSERT OR IGNORE INTO assets (url, host, kind) VALUES (?, ?, ?)",
+                       [(url, urlsplit(url).hostname or "", kind) for url, kind in refs])
+        db.executemany("INSERT OR IGNORE INTO refs (page, asset) SELECT ?, id FROM assets WHERE url=?",
+                       [(page_id, url) for url, _ in refs])
+
+    def extract(self, crawl_db: sqlite3.Connection, only: list[str] | None = None, workers: int | None = None) -> int:
+        """Parse every stored page not yet in the store; returns pages parsed."""
+        done = {r[0] for r in self.db.execute("SELECT url FROM pages WHERE site IS NOT NULL")}
+        sql = "SELECT site, url, final_url, html FROM pages WHERE html IS NOT NULL"
+        params: list = []
+        if only:
+            sql += f" AND site IN ({','.join('?' * len(only))})"
+            params = list(only)
+        jobs = (tuple(row) for row in crawl_db.execute(sql, params) if row[1] not in done)
+        workers = workers or os.cpu_count() or 1
+        n = 0
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for site, url, refs in bounded_map(pool, extract_page, jobs, workers):
+                self.add_refs(site, url, refs)
+                n += 1
+                if n % 500 == 0:
+                    self.db.commit()
+        self.db.commit()
+        return n
+
+    def _update(self, sql: str, params) -> None:
+        self.db.execute(sql, params)
+        self._writes += 1
+        if self._writes % COMMIT_EVERY == 0:
+            self.db.commit()
+
+    async def _pool(self, rows, work, stamp: str) -> None:
+        """Run work(row) for every row with at most ``concurrency`` in flight.
+
+        A row whose work fails still gets its ``stamp`` column set, so it
+        isn't picked up again in this run.
+        """
+        it = iter(rows)
+
+        async def worker():
+            for row in it:
+                try:
+                    await work(row)
+                except Exception as e:
+                    self._update(f"UPDATE assets SET error=?, {stamp}=? WHERE id=?",
+                                 (f"{type(e).__name__}: {e}"[:500], time.time(), row["id"]))
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        self.db.commit()
+
+    async def probe(self, row) -> None:
+        """Size an asset without downloading it (see CatalogSession.probe)."""
+        head = await self.session.probe(row["url"], size=True)
+        if head is None:
+            raise ConnectionError("no answer to HEAD or GET")
+        self._update("UPDATE assets SET status=?, content_type=?, size=?, etag=?, probed=?, error=NULL WHERE id=?",
+                     (head.status, head.headers.get("content-type", "").split(";")[0] or None, head.size,
+                      head.headers.get("etag"), time.time(), row["id"]))
+
+    async def fetch_hash(self, row) -> None:
+        """Stream the asset through sha256; stylesheets are also scanned for what they load."""
+        url = row["url"]
+        digest = hashlib.sha256()
+        css = bytearray() if row["kind"] == "stylesheet" else None
+        total = 0
+        async with self.session.stream("GET", url) as r:
+            if r.status_code >= 400:
+                self._update("UPDATE assets SET status=?, hashed=? WHERE id=?", (r.status_code, time.time(), row["id"]))
+                return
+            async for chunk in r.aiter_bytes():
+                total += len(chunk)
+                if total > self.max_hash_bytes:
+                    digest = None
+                    break
+                digest.update(chunk)
+                if css is not None and len(css) < MAX_CSS_BYTES:
+                    css += chunk
+        self.downloaded += total
+        self._update("UPDATE assets SET sha256=?, size=COALESCE(size, ?), hashed=? WHERE id=?",
+                     (digest.digest() if digest else None, total if digest else None, time.time(), row["id"]))
+        if css is not None:
+            self.add_refs(None, url, css_refs(css.decode("utf-8", errors="replace"), str(r.url)))
+
+    async def scan(self) -> None:
+        """Probe, then hash what might be a duplicate; repeat while stylesheets reveal new assets."""
+        while True:
+            unprobed = self.db.execute("SELECT id, url, kind FROM assets WHERE probed IS NULL").fetchall()
+            if unprobed:
+                print(f"Probing {len(unprobed)} assets...")
+                await self._pool(unprobed, self.probe, "probed")
+            # A file with a size nobody else has can't be a duplicate, so it is never
+            # downloaded; stylesheets are, for the fonts and images they pull in
+            to_hash = self.db.execute("""
+                SELECT id, url, kind FROM assets
+                WHERE hashed IS NULL AND probed IS NOT NULL AND status < 400
+                  AND (size IS NULL OR size <= ?)
+                  AND (kind = 'stylesheet' OR size IS NULL OR size IN (
+                       SELECT size FROM assets WHERE status < 400 AND size IS NOT NULL
+                       GROUP BY size HAVING COUNT(*) > 1))""", (self.max_hash_bytes,)).fetchall()
+            if to_hash:
+                print(f"Hashing {len(to_hash)} assets that may be duplicates...")
+                await self._pool(to_hash, self.fetch_hash, "hashed")
+            if not self.db.execute("SELECT 1 FROM assets WHERE probed IS NULL LIMIT 1").fetchone():
+                return
+
+
+def report(db: sqlite3.Connection, out_dir: str | Path) -> None:
+    """asset_report.csv per site, asset_duplicates.csv and asset_hosts.csv, plus a printed summary."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    broken = "(a.status >= 400 OR (a.probed IS NOT NULL AND a.status IS NULL))"
+    with open(out / "asset_report.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["site", "total_assets", "images", "videos", "pdfs", "other", "total_gb", "broken_links"])
+        for r in db.execute(SITE_ASSETS + f"""
+                SELECT sa.site, COUNT(*), SUM(a.kind='image'), SUM(a.kind='video'), SUM(a.kind='pdf'),
+                       SUM(a.kind NOT IN ('image', 'video', 'pdf')), SUM(COALESCE(a.size, 0)), SUM({broken})
+                FROM site_assets sa JOIN assets a ON a.id = sa.asset GROUP BY sa.site ORDER BY sa.site"""):
+            w.writerow([*r[:6], round(r[6] / 1e9, 3), r[7]])
+    with open(out / "asset_duplicates.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["sha256", "bytes", "copies", "sites", "bytes_saved", "example_url"])
+        w.writerows(db.execute(SITE_ASSETS + """
+            SELECT hex(a.sha256), MAX(a.size), COUNT(DISTINCT a.id), COUNT(DISTINCT sa.site),
+                   MAX(a.size) * (COUNT(DISTINCT a.id) - 1) AS saved, MIN(a.url)
+            FROM assets a LEFT JOIN site_assets sa ON sa.asset = a.id
+            WHERE a.sha256 IS NOT NULL GROUP BY a.sha256 HAVING COUNT(DISTINCT a.id) > 1
+            ORDER BY saved DESC"""))
+    with open(out / "asset_hosts.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["host", "assets", "bytes", "sites"])
+        w.writerows(db.execute(SITE_ASSETS + """, host_sites AS (
+                SELECT a.host, COUNT(DISTINCT sa.site) AS sites
+                FROM site_assets sa JOIN assets a ON a.id = sa.asset GROUP BY a.host)
+            SELECT a.host, COUNT(*), SUM(COALESCE(a.size, 0)), COALESCE(hs.sites, 0)
+            FROM assets a LEFT JOIN host_sites hs ON hs.host = a.host
+            GROUP BY a.host ORDER BY COUNT(*) DESC"""))
+
+    t = db.execute(SITE_ASSETS + f"""
+        SELECT (SELECT COUNT(*) FROM site_assets),
+               (SELECT SUM(COALESCE(a.size, 0)) FROM site_assets sa JOIN assets a ON a.id = sa.asset),
+               (SELECT COUNT(*) FROM assets), (SELECT SUM(COALESCE(size, 0)) FROM assets),
+               (SELECT COUNT(*) FROM (SELECT 1 FROM assets GROUP BY COALESCE(sha256, id))),
+               (SELECT SUM(s) FROM (SELECT MAX(COALESCE(size, 0)) AS s FROM assets GROUP BY COALESCE(sha256, id))),
+               (SELECT COUNT(*) FROM assets a WHERE {broken})""").fetchone()
+    refs, ref_bytes, urls, url_bytes, contents, content_bytes, n_broken = (v or 0 for v in t)
+    print(f"{refs} site/asset pairs ({ref_bytes / 1e9:.2f} GB if every site keeps its own copy), "
+          f"{urls} distinct URLs ({url_bytes / 1e9:.2f} GB), {contents} distinct files by content "
+          f"({content_bytes / 1e9:.2f} GB); {n_broken} broken")
+    print(f"Reports written to {out / 'asset_report.csv'}, asset_duplicates.csv and asset_hosts.csv")
+
+
+async def run(args):
+    db = open_store(args.store)
+    session = CatalogSession(HEADERS, 30.0, global_limit=args.concurrency, per_host=args.per_host)
+    inventory = Inventory(db, session, args.concurrency, args.max_hash_mb * 1024 * 1024)
+    crawl = sqlite3.connect(args.state)
+    n = inventory.extract(crawl, args.only, args.workers)
+    crawl.close()
+    print(f"Extracted asset references from {n} new pages")
+    async with session:
+        await inventory.scan()
+    print(session.report())
+    print(f"Downloaded {inventory.downloaded / 1e6:.1f} MB to hash possible duplicates")
+    report(db, Path(args.store).parent)
+    db.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Inventory, size and deduplicate the assets of crawled sites")
+    ap.add_argument("--state", default=STATE_PATH, help="crawl state database from site_crawler.py")
+    ap.add_argument("--store", default=ASSET_PATH, help="asset database (resumable); reports go next to it")
+    ap.add_argument("--only", nargs="*", help="only these sites")
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="requests in flight")
+    ap.add_argument("--per-host", type=int, default=8, help="starting requests in flight per host (adapts)")
+    ap.add_argument("--max-hash-mb", type=int, default=MAX_HASH_BYTES // (1024 * 1024),
+                    help="don't download larger files to hash them")
+    ap.add_argument("--workers", type=int, default=None, help="HTML parser processes (default: all cores)")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""Benchmark the full catalog pipeline against a synthetic fleet, fully offline.
+
+For each size a fresh process runs resmed_catalog.catalog() against a
+fake_fleet server (HTTP, stub DNS and crt.sh in a second process), so peak
+memory is that of the pipeline alone. Throughput, latency percentiles, peak
+RSS and how many of the expected sites were found are appended to a JSONL
+results file, tagged with the git commit, and compared against the previous
+result for the same size.
+
+    python scripts/bench_catalog.py                  # 100, 1k and 10k sites
+    python scripts/bench_catalog.py --sizes 100 500
+    python scripts/bench_catalog.py --sizes 1000 --wordlist words.txt
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RESULTS_PATH = "data/bench/catalog_bench.jsonl"
+SIZES = [100, 1000, 10000]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_once(size: int, seed: int, concurrency: int, wordlist: str | None = None) -> dict:
+    """Run the pipeline once against a fleet of ``size`` sites; must run in a fresh process."""
+    import fake_fleet
+    import resmed_catalog as rc
+    from dns_engine import DNSEngine
+    from http_session import CatalogSession
+    from instrumentation import RunMetrics
+    from subdomain_brute import BruteDNS, SubdomainBrute
+
+    ports = multiprocessing.Queue()
+    server = multiprocessing.Process(target=fake_fleet.serve, args=(size, seed, ports), daemon=True)
+    server.start()
+    http_port, dns_port = ports.get(timeout=120)
+    fleet = fake_fleet.Fleet(size, seed)
+    expected = fleet.expected()
+
+    # Point the catalog's sources at the fleet
+    rc.SELECTORS = fleet.selector_urls
+    rc.CT_DUMP, rc.CT_SAVE = None, None
+    rc.METRICS = metrics = RunMetrics(f"bench_{size}")
+    rc.DNS = DNSEngine(nameservers=["127.0.0.1"], port=dns_port, metrics=metrics)
+    rc.RECHECK_DELAY = 2.0
+    if wordlist:
+        rc.BRUTE = SubdomainBrute(os.path.abspath(wordlist), BruteDNS(nameservers=["127.0.0.1"], port=dns_port),
+                                  extra_words=rc.SUBDOMAINS)
+    session = CatalogSession(rc.HEADERS, rc.TIMEOUT, global_limit=concurrency,
+                             transport=fake_fleet.FleetTransport(http_port), metrics=metrics)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="catalog_bench_") as workdir:
+        os.chdir(workdir)
+        started = time.perf_counter()
+        try:
+            with open(os.devnull, "w") as quiet, contextlib.redirect_stdout(quiet):
+                async with session:
+                    with metrics.phase("total"):
+                        await rc.catalog(session)
+            wall = time.perf_counter() - started
+            with open("resmed_sites.csv", encoding="utf-8") as f:
+                found = {row["host"] for row in csv.DictReader(f)}
+        finally:
+            os.chdir(cwd)
+            server.kill()
+
+    s = metrics.summary()
+    http = session.stats()
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "sites": size,
+        "seed": seed,
+        "wall_seconds": round(wall, 2),
+        "expected": len(expected),
+        "found": len(found & expected),
+        "missed": sorted(expected - found)[:20],
+        "unexpected": sorted(found - expected)[:20],
+        "sites_per_second": round(len(found) / wall, 2),
+        "requests": http["requests"],
+        "requests_per_second": round(http["requests"] / wall, 1),
+        "retried": http["retried"],
+        "throttled": http["throttled"],
+        "latency_ms": {stage: {k: round(v * 1000, 1) for k, v in d.items() if k.startswith("p")}
+                       for stage, d in s["requests"].items() if stage in ("ttfb", "total")},
+        "dns_ms": {k: round(v * 1000, 1) for k, v in s["dns"].items() if k.startswith("p")},
+        "dns_queries": s["dns"]["count"],
+        "phases": s["phases"],
+        "peak_rss_mb": round(peak_kb / 1024, 1),
+        "wordlist": rc.BRUTE.stats() if rc.BRUTE else None,
+    }
+
+
+def run_child(size: int, seed: int, concurrency: int, wordlist: str | None = None) -> dict:
+    """Run one size in a fresh interpreter so ru_maxrss is per size."""
+    cmd = [sys.executable, __file__, "--child", str(size), "--seed", str(seed), "--concurrency", str(concurrency)]
+    if wordlist:
+        cmd += ["--wordlist", wordlist]
+    out = subprocess.run(cmd, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"benchmark at {size} sites failed:\n{out.stderr[-4000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def previous(results_path: Path, size: int) -> dict | None:
+    if not results_path.exists():
+        return None
+    last = None
+    with open(results_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("sites") == size:
+                last = record
+    return last
+
+
+def compare(current: dict, before: dict | None) -> str:
+    line = (f"{current['sites']:>6} sites: {current['wall_seconds']:.1f}s, {current['sites_per_second']} sites/s, "
+            f"{current['requests_per_second']} req/s, TTFB p95 {current['latency_ms']['ttfb']['p95']}ms, "
+            f"peak {current['peak_rss_mb']} MB, found {current['found']}/{current['expected']}")
+    if before:
+        def delta(key):
+            old, new = before.get(key), current.get(key)
+            return f"{(new - old) / old:+.0%}" if old else "n/a"
+        line += (f"\n         vs {before.get('commit') or '?'}: wall {delta('wall_seconds')}, "
+                 f"throughput {delta('sites_per_second')}, memory {delta('peak_rss_mb')}")
+    return line
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Offline throughput benchmark for the catalog pipeline")
+    ap.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="fleet sizes to run")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--concurrency", type=int, default=50, help="global request limit, as in resmed_catalog.py")
+    ap.add_argument("--wordlist", help="also brute-force subdomains from this wordlist")
+    ap.add_argument("--results", default=RESULTS_PATH, help="JSONL file results are appended to")
+    ap.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(bench_once(args.child, args.seed, args.concurrency, args.wordlist))))
+        return
+
+    results_path = Path(args.results)
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    meta = {"commit": git_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()}
+    for size in args.sizes:
+        print(f"Benchmarking {size} sites...", flush=True)
+        record = {**meta, **run_child(size, args.seed, args.concurrency, args.wordlist)}
+        print(compare(record, previous(results_path, size)), flush=True)
+        with open(results_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {results_path}")
+
+
+if __name__ == "__main__":
+    main()
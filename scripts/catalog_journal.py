@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""Cataloged hosts as compact records, streamed to an append-only journal.
+
+Each host is written as one JSON line as soon as it is cataloged. Lines are
+flushed straight away, so a crash of the process loses nothing. They are
+fsync'd at most every FSYNC_INTERVAL seconds, so a power cut loses at most
+that much. A run that finds a journal resumes from it, and hosts already
+answered are not fetched again. A line torn by the crash is cut off before
+appending. The final CSV is built by reading the journal back, so the run
+never holds every host's row in memory.
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+JOURNAL_PATH = "data/cache/catalog_journal.jsonl"
+FSYNC_INTERVAL = 1.0
+
+CSV_FIELDS = ["host", "url", "status", "title", "hosting_provider", "ip", "cname_chain"]
+
+
+@dataclass(slots=True)
+class SiteRecord:
+    """One cataloged host: the CSV columns plus where its redirects went."""
+    host: str
+    url: str
+    status: int | None = None
+    title: str | None = None
+    hosting_provider: str | None = None
+    ip: str | None = None
+    cname_chain: str = ""
+    final_url: str | None = None
+    # Intermediate redirect hops, so a resumed run can rebuild the redirect graph
+    history: tuple[str, ...] = ()
+
+    def csv_row(self) -> list:
+        return [self.host, self.url, self.status, self.title, self.hosting_provider, self.ip, self.cname_chain]
+
+    def to_json(self) -> str:
+        return json.dumps([self.host, self.url, self.status, self.title, self.hosting_provider, self.ip,
+                           self.cname_chain, self.final_url, self.history], ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, line: str) -> "SiteRecord":
+        *fields, history = json.loads(line)
+        return cls(*fields, history=tuple(history))
+
+
+class CatalogJournal:
+    """Append-only JSONL of SiteRecords for one catalog run (and its resumptions)."""
+
+    def __init__(self, path: str | Path = JOURNAL_PATH, fsync_interval: float = FSYNC_INTERVAL):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.written = 0
+        self._file = None
+        self._synced = 0.0
+        # Bytes of intact records found by replay(); anything after is cut off
+        self._good = 0
+
+    def replay(self) -> Iterator[SiteRecord]:
+        """Records a previous run left behind, up to the first torn or garbled line."""
+        self._good = 0
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = SiteRecord.from_json(line.decode("utf-8"))
+                except (ValueError, TypeError):
+                    break
+                self._good += len(line)
+                yield record
+
+    def open(self) -> None:
+        """Start appending after what replay() read; without a replay, start empty."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._file.truncate(self._good)
+        self._synced = time.monotonic()
+
+    def write(self, record: SiteRecord) -> None:
+        self._file.write(record.to_json().encode("utf-8") + b"\n")
+        self._file.flush()
+        self.written += 1
+        now = time.monotonic()
+        if now - self._synced >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._synced = now
+
+    def records(self) -> Iterator[SiteRecord]:
+        """Every record written so far, read back from disk."""
+        if self._file:
+            self._file.flush()
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                yield SiteRecord.from_json(line)
+
+    def close(self) -> None:
+        if self._file:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def discard(self) -> None:
+        """The run finished and its CSV is written; the next run starts fresh."""
+        self.close()
+        self.path.unlink(missing_ok=True)
@@ -1,8 +1,47 @@
 #!/usr/bin/env python3
-"""Consolidate analysis from 4 agent chunks into single report."""
+"""Consolidate per-site analysis results into a single report.
+
+Measured scores (html_score.py) and agent chunk reports both land in the
+results store; every figure in the report comes from aggregate queries over
+it, so any number of chunks or scoring runs can feed in.
+"""
+import argparse
 import re
+import time
 from pathlib import Path
 from typing import Dict, List
+from urllib.parse import urlsplit
+
+from result_store import STORE_PATH, ResultStore, summary
+
+SITE_HEADING = re.compile(r"^## Site:\s*(\S+)", re.MULTILINE)
+FIELDS = {
+    "platform": re.compile(r"CMS:\s*\**\s*([^\n\[]+)"),
+    "score": re.compile(r"HTML Consistency Score:\s*\**\s*([\d.]+)\s*/\s*10"),
+    "automation_pct": re.compile(r"Automation Potential:\s*\**\s*~?([\d.]+)\s*%"),
+    "pages_total": re.compile(r"Est\. Total Pages\**:\s*\**\s*~?([\d,]+)"),
+    "hours_per_page": re.compile(r"Effort per Page\**:\s*\**\s*~?([\d.]+)"),
+    "effort_hours": re.compile(r"Total Effort\**:\s*\**\s*~?([\d,.]+)"),
+}
+NUMERIC = {"score": float, "automation_pct": float, "pages_total": int,
+           "hours_per_page": float, "effort_hours": float}
+
+
+def parse_site_section(url: str, text: str) -> Dict:
+    """Metrics from one '## Site:' section of an agent report (format in AGENT_TASK_INSTRUCTIONS.md)."""
+    site = {"site": urlsplit(url if "://" in url else f"https://{url}").hostname or url}
+    for key, pattern in FIELDS.items():
+        m = pattern.search(text)
+        if not m:
+            continue
+        value = m.group(1).strip().rstrip("*").strip()
+        if key in NUMERIC:
+            try:
+                value = NUMERIC[key](float(value.replace(",", "")))
+            except ValueError:
+                continue
+        site[key] = value
+    return site
 
 
 def parse_chunk_analysis(filepath: Path) -> Dict:
@@ -10,61 +49,101 @@ def parse_chunk_analysis(filepath: Path) -> Dict:
     with open(filepath, 'r', encoding='utf-8') as f:
         content = f.read()
 
-    # TODO: Parse markdown to extract:
-    # - Site scores
-    # - Effort estimates
-    # - Platform types
-    # - Automation percentages
+    headings = list(SITE_HEADING.finditer(content))
+    sites: List[Dict] = []
+    for i, m in enumerate(headings):
+        end = headings[i + 1].start() if i + 1 < len(headings) else len(content)
+        sites.append(parse_site_section(m.group(1), content[m.end():end]))
 
     return {
         "chunk": filepath.stem,
         "content": content,
-        # Add parsed metrics here
+        "sites": sites,
     }
 
 
-def consolidate_reports(analysis_dir: str = "data/analysis") -> str:
-    """Read all chunk reports and consolidate into single report."""
+def _table(headers: List[str], rows) -> List[str]:
+    lines = ["| " + " | ".join(headers) + " |", "|" + "---|" * len(headers)]
+    for row in rows:
+        lines.append("| " + " | ".join("" if v is None else str(v) for v in row) + " |")
+    return lines
+
+
+def consolidate_reports(analysis_dir: str = "data/analysis", store_path: str = STORE_PATH,
+                        sites_csv: str = "data/resmed_sites.csv") -> str:
+    """Import chunk reports into the results store and build the consolidated report."""
 
     analysis_path = Path(analysis_dir)
     chunk_files = sorted(analysis_path.glob("analysis_chunk_*.md"))
 
-    if len(chunk_files) != 4:
-        print(f"Warning: Expected 4 chunk files, found {len(chunk_files)}")
-
     print(f"Consolidating {len(chunk_files)} chunk reports...")
 
+    chunks = []
+    with ResultStore(store_path) as store:
+        store.import_catalog(sites_csv)
+        for chunk_file in chunk_files:
+            print(f"  Reading {chunk_file.name}...")
+            chunk_data = parse_chunk_analysis(chunk_file)
+            store.write_sites(chunk_data["sites"], source="agent")
+            chunks.append(chunk_data)
+
+        started = time.perf_counter()
+        s = summary(store)
+        print(f"Aggregated in {time.perf_counter() - started:.3f}s")
+
+    t = s["totals"]
     consolidated = []
     consolidated.append("# ResMed Multi-Site Analysis - Consolidated Report\n")
     consolidated.append("## Executive Summary\n")
-
-    # Parse each chunk
-    chunks = []
-    for chunk_file in chunk_files:
-        print(f"  Reading {chunk_file.name}...")
-        chunk_data = parse_chunk_analysis(chunk_file)
-        chunks.append(chunk_data)
-
-    # TODO: Calculate consolidated metrics
-    # - Total sites
-    # - Score distribution
-    # - Total effort hours
-    # - Platform breakdown
-    # - Average automation potential
-
-    consolidated.append("\n## Chunk Reports\n")
-    for chunk in chunks:
-        consolidated.append(f"\n---\n\n{chunk['content']}\n")
+    consolidated.append(f"- **Total sites**: {t['sites']}")
+    consolidated.append(f"- **Total pages**: ~{t['pages']:,}")
+    consolidated.append(f"- **Total effort**: ~{t['hours']:,.0f} hours")
+    if t["avg_score"] is not None:
+        consolidated.append(f"- **Average score**: {t['avg_score']:.1f}/10")
+    if t["automation"] is not None:
+        consolidated.append(f"- **Average automation potential**: {t['automation']:.0f}%")
+
+    consolidated.append("\n### Score Distribution\n")
+    consolidated.extend(_table(["Band", "Sites", "Hours"],
+                               ((r["band"], r["sites"], round(r["hours"] or 0)) for r in s["distribution"])))
+    if s["histogram"]:
+        consolidated.append("\n### Page Scores\n")
+        consolidated.extend(_table(["Score", "Pages"], ((r["bucket"], r["pages"]) for r in s["histogram"])))
+
+    c = s["components"]
+    if c["inline_styles"] is not None:
+        consolidated.append("\n### Rubric Components (average, 10 = easiest)\n")
+        consolidated.extend(_table(list(c.keys()), [tuple(c)]))
+
+    for key, title in (("platform", "Platform Breakdown"), ("hosting_provider", "Hosting Breakdown")):
+        consolidated.append(f"\n### {title}\n")
+        consolidated.extend(_table(["Name", "Sites", "Pages", "Avg score", "Hours", "Automation %"],
+                                   (tuple(r) for r in s[key])))
+
+    consolidated.append("\n### Highest Priority Sites (Easy Wins)\n")
+    consolidated.extend(f"{i}. {r['site']} - Score: {r['score']:.1f}/10, ~{r['effort_hours'] or 0:.0f} hours"
+                        for i, r in enumerate(s["easiest"], 1))
+    consolidated.append("\n### Most Challenging Sites\n")
+    consolidated.extend(f"{i}. {r['site']} - Score: {r['score']:.1f}/10, ~{r['effort_hours'] or 0:.0f} hours"
+                        for i, r in enumerate(s["hardest"], 1))
+
+    if chunks:
+        consolidated.append("\n## Chunk Reports\n")
+        for chunk in chunks:
+            consolidated.append(f"\n---\n\n{chunk['content']}\n")
 
     return "\n".join(consolidated)
 
 
 def main():
     """Generate consolidated report."""
-    output_path = Path("data/analysis/CONSOLIDATED_REPORT.md")
+    ap = argparse.ArgumentParser(description="Consolidate agent chunk reports and scores into one report")
+    ap.add_argument("--out", default="data/analysis/CONSOLIDATED_REPORT.md", help="markdown report to write")
+    output_path = Path(ap.parse_args().out)
 
     report = consolidate_reports()
 
+    output_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_path, 'w', encoding='utf-8') as f:
         f.write(report)
 
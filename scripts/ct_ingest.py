@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Streaming ingestion of Certificate Transparency (crt.sh) results.
+
+crt.sh answers with one JSON array holding every certificate ever logged for
+the query. Rather than loading it whole, the array is decoded one entry at a
+time as bytes arrive, and only new hostnames are kept, so memory is bounded
+by the number of distinct hosts rather than the size of the CT history.
+"""
+import codecs
+import gzip
+import json
+from pathlib import Path
+from typing import AsyncIterator
+
+CT_URL = "https://crt.sh/?q=%.resmed.com&output=json"
+CHUNK_SIZE = 64 * 1024
+# A single crt.sh entry is a few hundred bytes; anything this big is garbage
+MAX_ELEMENT = 1024 * 1024
+
+
+class JSONArrayStream:
+    """Incremental decoder for a top-level JSON array; yields each element."""
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._started = False
+        self._finished = False
+
+    def feed(self, text: str):
+        self._buf += text
+        buf, pos, end = self._buf, 0, len(self._buf)
+        while pos < end and not self._finished:
+            ch = buf[pos]
+            if ch in " \t\r\n,":
+                pos += 1
+            elif not self._started:
+                if ch != "[":
+                    raise ValueError(f"expected a JSON array, got {ch!r}")
+                self._started = True
+                pos += 1
+            elif ch == "]":
+                self._finished = True
+                pos += 1
+            else:
+                try:
+                    item, pos = self._decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if end - pos > MAX_ELEMENT:
+                        raise ValueError("undecodable element in JSON array")
+                    # Element cut off mid-chunk; wait for the rest
+                    break
+                yield item
+        self._buf = buf[pos:]
+
+    def close(self) -> None:
+        if self._started and not self._finished and self._buf.strip():
+            raise ValueError("truncated JSON array")
+
+
+def hostnames(entry: dict):
+    """Hostnames from one crt.sh entry; wildcards and non-ResMed names are skipped."""
+    for line in entry.get("name_value", "").split("\n"):
+        line = line.strip().lower()
+        if "resmed." in line and not line.startswith("*"):
+            domain = line.replace("*.", "")
+            if domain and not domain.startswith("."):
+                yield domain
+
+
+class CTHosts:
+    """Deduplicated hostname set filled from a stream of raw CT response bytes."""
+
+    def __init__(self):
+        self.hosts: set[str] = set()
+        self.entries = 0
+
+    async def ingest(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        """Decode chunks as they arrive, yielding each hostname the first time it is seen."""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        array = JSONArrayStream()
+        async for chunk in chunks:
+            for host in self._new_hosts(array.feed(decoder.decode(chunk))):
+                yield host
+        for host in self._new_hosts(array.feed(decoder.decode(b"", final=True))):
+            yield host
+        array.close()
+
+    def _new_hosts(self, entries):
+        for entry in entries:
+            self.entries += 1
+            for host in hostnames(entry):
+                if host not in self.hosts:
+                    self.hosts.add(host)
+                    yield host
+
+
+async def read_dump(path: str | Path) -> AsyncIterator[bytes]:
+    """Chunks of a saved crt.sh response (plain or .gz) in place of the live endpoint."""
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def stream_url(session, url: str = CT_URL, save_to: str | Path | None = None,
+                     timeout=None) -> AsyncIterator[bytes]:
+    """Chunks of a live (or stand-in) crt.sh response, optionally teed to a dump file."""
+    out = None
+    if save_to:
+        Path(save_to).parent.mkdir(parents=True, exist_ok=True)
+        partial = Path(f"{save_to}.part")
+        out = (gzip.open if str(save_to).endswith(".gz") else open)(partial, "wb")
+    try:
+        async with session.stream("GET", url, timeout=timeout) as r:
+            if r.status_code != 200:
+                raise RuntimeError(f"crt.sh returned HTTP {r.status_code}")
+            async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                if out:
+                    out.write(chunk)
+                yield chunk
+        if out:
+            out.close()
+            # Only a complete response replaces the previous dump
+            partial.replace(save_to)
+            out = None
+    finally:
+        if out:
+            out.close()
+            partial.unlink(missing_ok=True)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""One entry point for the discovery scripts.
+
+    python scripts/discovery.py catalog --offline
+    python scripts/discovery.py crawl --only www.resmed.com
+    python scripts/discovery.py split --queue
+    python scripts/discovery.py consolidate
+
+A command's module is imported only when that command runs. So `split` and
+`consolidate` never load httpx, dnspython or parsel, and `--help` answers at
+once. Everything after the command goes to that script's own options.
+"""
+import argparse
+import importlib
+import sys
+
+# command -> (module in scripts/, one-line help)
+COMMANDS = {
+    "catalog": ("resmed_catalog", "discover and catalog ResMed sites"),
+    "crawl": ("site_crawler", "crawl cataloged sites into a page inventory"),
+    "score": ("html_score", "score crawled HTML for migration difficulty"),
+    "assets": ("asset_inventory", "inventory and deduplicate every site's assets"),
+    "links": ("link_graph", "build and query the cross-site link graph"),
+    "split": ("split_sites", "split sites into chunks, or queue them for workers"),
+    "queue": ("job_queue", "work on (or inspect) the site analysis queue"),
+    "consolidate": ("consolidate_analysis", "build the consolidated report"),
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    ap = argparse.ArgumentParser(
+        prog="discovery.py", description="ResMed multi-site discovery",
+        epilog="commands:\n" + "\n".join(f"  {name:<12} {help}" for name, (_, help) in COMMANDS.items())
+        + "\n\nRun 'discovery.py COMMAND --help' for a command's options.",
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("command", choices=COMMANDS, metavar="COMMAND")
+    ap.add_argument("args", nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+    module = importlib.import_module(COMMANDS[args.command][0])
+    # The script parses sys.argv itself, as when run directly
+    sys.argv = [f"discovery.py {args.command}", *args.args]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
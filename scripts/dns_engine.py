@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""Non-blocking DNS lookups with a shared TTL cache for the catalog phases."""
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+import dns.asyncresolver
+import dns.exception
+import dns.message
+import dns.name
+import dns.rdatatype
+import dns.resolver
+
+# Bounds applied to TTLs taken from answers, so a zero-TTL record still
+# dedupes lookups within a run and a week-long TTL can't pin stale data.
+MIN_TTL = 30
+MAX_TTL = 3600
+# Negative answers fall back to this when the SOA minimum is unavailable
+NEGATIVE_TTL = 300
+# NXDOMAIN names remembered at most; a wordlist run produces millions
+MAX_NEGATIVE = 1_000_000
+
+
+@dataclass(frozen=True)
+class DNSResult:
+    """CNAME chain and A records for one hostname, from a single resolution."""
+    host: str
+    cname_chain: list[str] = field(default_factory=list)
+    ips: list[str] = field(default_factory=list)
+    nxdomain: bool = False
+
+    @property
+    def ip(self) -> str | None:
+        return self.ips[0] if self.ips else None
+
+    @property
+    def exists(self) -> bool:
+        return bool(self.ips)
+
+
+def _negative_ttl(response: dns.message.Message | None) -> int:
+    """Negative-cache TTL from the SOA in the authority section (RFC 2308)."""
+    if response is not None:
+        for rrset in response.authority:
+            if rrset.rdtype == dns.rdatatype.SOA:
+                return min(rrset.ttl, rrset[0].minimum)
+    return NEGATIVE_TTL
+
+
+def result_from_response(host: str, response: dns.message.QueryMessage) -> tuple[DNSResult, float]:
+    """DNSResult and cache TTL from a NOERROR response to an A query."""
+    chaining = response.resolve_chaining()
+    chain = [str(rrset[0].target).rstrip(".") for rrset in chaining.cnames]
+    if chaining.answer is None:
+        return DNSResult(host, chain), _negative_ttl(response)
+    ips = [rdata.address for rdata in chaining.answer]
+    ttl = min(max(chaining.minimum_ttl, MIN_TTL), MAX_TTL)
+    return DNSResult(host, chain, ips), ttl
+
+
+class DNSEngine:
+    """Async resolver with bounded in-flight queries and a positive/negative cache.
+
+    Concurrent lookups of the same name share one query. Pass ``nameservers``
+    (and ``port``) to point the engine at a local stub resolver. ``persist`` is
+    an optional on-disk store (see http_cache.ResponseCache) consulted before
+    the network; with ``offline`` set, stored answers are used regardless of
+    age and nothing is sent. ``metrics`` (instrumentation.RunMetrics) gets the
+    duration of every query that goes to the network. NXDOMAIN answers are
+    kept apart as bare expiry times, oldest dropped beyond ``max_negative``.
+    """
+
+    def __init__(self, concurrency: int = 200, timeout: float = 5.0,
+                 nameservers: list[str] | None = None, port: int = 53,
+                 persist=None, offline: bool = False, metrics=None, max_negative: int = MAX_NEGATIVE):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.nameservers = nameservers
+        self.port = port
+        self.persist = persist
+        self.offline = offline
+        self.metrics = metrics
+        self.max_negative = max_negative
+        self.queries = 0
+        self.in_flight = 0
+        self.cache_hits = 0
+        self._resolver: dns.asyncresolver.Resolver | None = None
+        self._sem: asyncio.Semaphore | None = None
+        self._cache: dict[str, tuple[float, DNSResult]] = {}
+        self._nx: dict[str, float] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    def _get_resolver(self) -> dns.asyncresolver.Resolver:
+        if self._resolver is None:
+            if self.nameservers:
+                resolver = dns.asyncresolver.Resolver(configure=False)
+                resolver.nameservers = list(self.nameservers)
+                resolver.port = self.port
+            else:
+                resolver = dns.asyncresolver.Resolver()
+            resolver.lifetime = self.timeout
+            # Caching is done here, across record types and negative answers
+            resolver.cache = None
+            self._resolver = resolver
+        return self._resolver
+
+    def cached(self, host: str) -> DNSResult | None:
+        """Return an unexpired cache entry for host, if any."""
+        now = time.monotonic()
+        entry = self._cache.get(host)
+        if entry and entry[0] > now:
+            return entry[1]
+        expires = self._nx.get(host)
+        if expires is not None and expires > now:
+            return DNSResult(host, nxdomain=True)
+        return None
+
+    def store(self, result: DNSResult, ttl: float) -> None:
+        expires = time.monotonic() + ttl
+        if result.nxdomain:
+            self._cache.pop(result.host, None)
+            if len(self._nx) >= self.max_negative:
+                # Dicts keep insertion order, so this is the oldest entry
+                del self._nx[next(iter(self._nx))]
+            self._nx[result.host] = expires
+        else:
+            self._nx.pop(result.host, None)
+            self._cache[result.host] = (expires, result)
+
+    async def resolve(self, host: str) -> DNSResult:
+        """Resolve host to its CNAME chain and A records in one pass."""
+        host = host.lower().rstrip(".")
+        hit = self.cached(host)
+        if hit is not None:
+            self.cache_hits += 1
+            return hit
+        pending = self._inflight.get(host)
+        if pending is not None:
+            self.cache_hits += 1
+            return await pending
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[host] = future
+        try:
+            result, ttl = await self._query(host)
+            self.store(result, ttl)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; don't warn about an unretrieved error
+            future.exception()
+            raise
+        finally:
+            del self._inflight[host]
+
+    async def _query(self, host: str) -> tuple[DNSResult, float]:
+        if self.persist is not None:
+            stored = self.persist.get_dns(host, allow_stale=self.offline)
+            if stored is not None:
+                self.cache_hits += 1
+                return stored, MAX_TTL
+        if self.offline:
+            return DNSResult(host), MAX_TTL
+        result, ttl = await self._lookup(host)
+        if self.persist is not None:
+            self.persist.put_dns(result, ttl)
+        return result, ttl
+
+    async def _lookup(self, host: str) -> tuple[DNSResult, float]:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        async with self._sem:
+            self.queries += 1
+            self.in_flight += 1
+            started = time.perf_counter()
+            try:
+                return await self._ask(host)
+            finally:
+                self.in_flight -= 1
+                if self.metrics is not None:
+                    self.metrics.record_dns(time.perf_counter() - started)
+
+    async def _ask(self, host: str) -> tuple[DNSResult, float]:
+        """One resolution over the network; subclasses may send queries their own way."""
+        try:
+            answer = await self._get_resolver().resolve(host, "A", raise_on_no_answer=False)
+        except dns.resolver.NXDOMAIN as e:
+            response = e.responses().get(dns.name.from_text(host))
+            return DNSResult(host, nxdomain=True), _negative_ttl(response)
+        except (dns.exception.DNSException, OSError):
+            # SERVFAIL, timeouts and unreachable servers: short negative entry
+            return DNSResult(host), MIN_TTL
+        return result_from_response(host, answer.response)
+
+    async def resolve_many(self, hosts) -> list[DNSResult]:
+        return await asyncio.gather(*(self.resolve(h) for h in hosts))
+
+    def stats(self) -> dict:
+        return {"queries": self.queries, "cache_hits": self.cache_hits,
+                "cached_names": len(self._cache), "negative_names": len(self._nx)}
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""A synthetic ResMed estate for offline benchmarks: web sites, DNS and crt.sh in one process.
+
+The fleet is generated deterministically from (size, seed). Sites are spread
+over the catalog's TLDs and reachable the same ways real ones are: listed on
+country-selector hub pages (which also link to each other, and sometimes to a
+site's own selector page rather than its root), linked only through hreflang
+alternates (some several hops out), or known only from Certificate
+Transparency. Some redirect to another site, some are slow, some answer 429 a
+couple of times before serving, some 404.
+
+A minimal asyncio HTTP/1.1 server answers for every host by its Host header
+(crt.sh included), and a UDP stub resolver answers for the fleet's names,
+with NXDOMAIN for everything else. FleetTransport points an httpx client at
+the server without changing the URLs the caller sees.
+"""
+import asyncio
+import json
+import random
+import zlib
+from dataclasses import dataclass, field
+
+import dns.message
+import dns.rcode
+import dns.rrset
+import httpx
+
+from host_rules import default_classifier
+from resmed_catalog import SUBDOMAINS, TLDS
+
+# Subdomains the catalog's guesses can find, besides www
+GUESSABLE = [s for s in SUBDOMAINS if not default_classifier().exclusion(f"https://{s}.resmed.com")]
+HUBS = 5
+# Share of hreflang-only sites moved behind another hreflang-only site
+CHAINED = 0.3
+# Share of listed sites a hub links to through their own country-selector page
+VIA_SELECTOR = 0.1
+# Mix of site behaviours, as cumulative shares
+KINDS = [("redirect", 0.05), ("slow", 0.10), ("throttle", 0.13), ("missing", 0.15), ("ok", 1.0)]
+PAGE_PADDING = 24 * 1024
+
+
+@dataclass
+class Site:
+    host: str
+    kind: str = "ok"
+    target: str | None = None
+    alternates: list[str] = field(default_factory=list)
+    delay: float = 0.0
+    cname: str | None = None
+    server: str = "nginx"
+
+
+class Fleet:
+    """Deterministic description of N synthetic sites and how each can be discovered."""
+
+    def __init__(self, size: int, seed: int = 0, hubs: int = HUBS):
+        rng = random.Random(seed)
+        self.sites: dict[str, Site] = {}
+        for i in range(size):
+            tld = TLDS[i % len(TLDS)]
+            k = i // len(TLDS)
+            if k == 0:
+                host = f"www.resmed.{tld}"
+            elif k <= len(GUESSABLE):
+                host = f"{GUESSABLE[k - 1]}.resmed.{tld}"
+            else:
+                host = f"market{k}.resmed.{tld}"
+            site = Site(host)
+            r = rng.random()
+            site.kind = next(kind for kind, share in KINDS if r < share)
+            if site.kind == "slow":
+                site.delay = rng.uniform(0.3, 1.5)
+            if rng.random() < 0.3:
+                site.cname = f"{host}.edgekey.net"
+            site.server = rng.choice(["nginx", "Apache", "cloudflare", "AkamaiGHost"])
+            self.sites[host] = site
+
+        hosts = list(self.sites)
+        rng.shuffle(hosts)
+        listed = hosts[: int(len(hosts) * 0.4)]
+        linked = hosts[len(listed): int(len(hosts) * 0.7)]
+        ct_only = hosts[len(listed) + len(linked):]
+        self.hub_pages = {f"hub{j}.resmed.com": listed[j::hubs] for j in range(hubs)}
+        # Each hreflang-only site hangs off a listed site that serves its page
+        parents = [h for h in listed if self.sites[h].kind in ("ok", "slow", "throttle")] or listed
+        parent_of = {}
+        for host in linked:
+            parent_of[host] = rng.choice(parents)
+            self.sites[parent_of[host]].alternates.append(host)
+        # Some sit deeper: only an earlier hreflang-only site links to them. A
+        # separate random stream leaves the rest of the fleet as it was
+        chain_rng = random.Random(seed + 1)
+        serving = []
+        for host in linked:
+            if serving and chain_rng.random() < CHAINED:
+                self.sites[parent_of[host]].alternates.remove(host)
+                self.sites[chain_rng.choice(serving)].alternates.append(host)
+            if self.sites[host].kind in ("ok", "slow", "throttle"):
+                serving.append(host)
+        self.via_selector = {h for h in listed if chain_rng.random() < VIA_SELECTOR}
+        for site in self.sites.values():
+            if site.kind == "redirect":
+                target = rng.choice(hosts)
+                if (self.sites[target].kind in ("ok", "slow") and target != site.host
+                        and default_classifier().exclusion(f"https://{target}") is None):
+                    site.target = target
+                else:
+                    site.kind = "ok"
+        ct_hosts = set(ct_only) | {h for h in hosts if rng.random() < 0.5}
+        noise = [f"dev-{h}" for h in rng.sample(hosts, min(len(hosts), max(1, size // 20)))]
+        self.ct_entries = []
+        for n, host in enumerate(sorted(ct_hosts) + noise):
+            names = [host, f"*.{host}"] if rng.random() < 0.3 else [host]
+            self.ct_entries.append({"id": n, "issuer_name": "C=US, O=Fake CA", "name_value": "\n".join(names)})
+
+    @property
+    def selector_urls(self) -> list[str]:
+        return [f"https://{hub}/country-selector" for hub in self.hub_pages]
+
+    def expected(self) -> set[str]:
+        """Hosts a correct catalog run ends up with."""
+        rules = default_classifier()
+        return {h for h, s in self.sites.items()
+                if s.kind in ("ok", "slow", "throttle") and rules.exclusion(f"https://{h}") is None}
+
+    def dns_answer(self, name: str) -> list[tuple[str, str, str]]:
+        """(owner, type, value) records for a query name; empty for NXDOMAIN."""
+        host = name.rstrip(".")
+        if host.startswith("e") and host.endswith(".akamaiedge.net"):
+            return [(name, "A", "127.0.0.1")]
+        site = self.sites.get(host)
+        if site is None:
+            return []
+        if site.cname:
+            edge = f"e{zlib.crc32(host.encode()) % 10000}.dscx.akamaiedge.net."
+            return [(name, "CNAME", f"{site.cname}."), (f"{site.cname}.", "CNAME", edge), (edge, "A", "127.0.0.1")]
+        return [(name, "A", "127.0.0.1")]
+
+
+def _page(title: str, head: str = "", body: str = "") -> bytes:
+    padding = "<p>" + "Lorem ipsum dolor sit amet. " * (PAGE_PADDING // 28) + "</p>"
+    return (f"<!doctype html><html><head><meta charset=utf-8><title>{title}</title>{head}</head>"
+            f"<body>{body}{padding}</body></html>").encode()
+
+
+class FleetServer:
+    """HTTP/1.1 keep-alive server plus stub DNS for a Fleet."""
+
+    def __init__(self, fleet: Fleet):
+        self.fleet = fleet
+        self.hits: dict[str, int] = {}
+        self.requests = 0
+
+    async def respond(self, method: str, host: str, path: str) -> tuple[int, dict, bytes]:
+        fleet = self.fleet
+        if host == "crt.sh":
+            return 200, {"content-type": "application/json"}, json.dumps(fleet.ct_entries).encode()
+        if host in fleet.hub_pages:
+            links = "".join(f'<li><a href="https://{h}/{"country-selector" * (h in fleet.via_selector)}">{h}</a></li>'
+                            for h in fleet.hub_pages[host])
+            links += "".join(f'<li><a href="https://{hub}/country-selector">{hub}</a></li>'
+                             for hub in fleet.hub_pages if hub != host)
+            return 200, {"content-type": "text/html; charset=utf-8"}, _page("Country selector", body=f"<ul>{links}</ul>")
+        site = fleet.sites.get(host)
+        if site is None or site.kind == "missing":
+            return 404, {"content-type": "text/html"}, _page("Not found")
+        headers = {"content-type": "text/html; charset=utf-8", "server": site.server}
+        if site.server == "cloudflare":
+            headers["cf-ray"] = "0000000000000000-SYD"
+        if site.kind == "throttle":
+            n = self.hits[host] = self.hits.get(host, 0) + 1
+            if n <= 2:
+                return 429, {"retry-after": "1", "content-type": "text/plain"}, b"slow down"
+        if site.kind == "slow":
+            await asyncio.sleep(site.delay)
+        if site.kind == "redirect":
+            return 301, {"location": f"https://{site.target}/"}, b""
+        alternates = "".join(f'<link rel="alternate" hreflang="x-{i}" href="https://{h}/">'
+                             for i, h in enumerate(site.alternates))
+        return 200, headers, _page(f"ResMed {host}", head=alternates)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    raw = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                lines = raw.decode("latin-1").split("\r\n")
+                method, path, _ = lines[0].split(" ", 2)
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        k, v = line.split(":", 1)
+                        headers[k.strip().lower()] = v.strip()
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))
+                self.requests += 1
+                host = headers.get("host", "").split(":")[0]
+                status, out_headers, body = await self.respond(method, host, path)
+                out_headers["content-length"] = str(len(body))
+                head = f"HTTP/1.1 {status} X\r\n" + "".join(f"{k}: {v}\r\n" for k, v in out_headers.items())
+                writer.write(head.encode() + b"\r\n" + (b"" if method == "HEAD" else body))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def dns_datagram(self, data: bytes) -> bytes:
+        q = dns.message.from_wire(data)
+        r = dns.message.make_response(q)
+        records = self.fleet.dns_answer(q.question[0].name.to_text())
+        for owner, rtype, value in records:
+            r.answer.append(dns.rrset.from_text(owner, 300, "IN", rtype, value))
+        if not records:
+            r.set_rcode(dns.rcode.NXDOMAIN)
+            r.authority.append(dns.rrset.from_text("resmed.com.", 600, "IN", "SOA",
+                                                   "ns. hostmaster. 1 7200 900 1209600 300"))
+        return r.to_wire()
+
+    async def start(self, host: str = "127.0.0.1") -> tuple[int, int]:
+        """Start both servers; returns (http_port, dns_port)."""
+        server = self
+
+        class DNSProtocol(asyncio.DatagramProtocol):
+            def connection_made(self, transport):
+                self.transport = transport
+
+            def datagram_received(self, data, addr):
+                self.transport.sendto(server.dns_datagram(data), addr)
+
+        self._http = await asyncio.start_server(self.handle, host, 0, backlog=4096)
+        transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(DNSProtocol, local_addr=(host, 0))
+        self._dns = transport
+        return self._http.sockets[0].getsockname()[1], transport.get_extra_info("sockname")[1]
+
+    async def close(self) -> None:
+        self._dns.close()
+        self._http.close()
+        await self._http.wait_closed()
+
+
+def serve(size: int, seed: int, ports) -> None:
+    """Process entry point: build the fleet, start serving, report ports on ``ports`` (a Queue)."""
+    async def main():
+        server = FleetServer(Fleet(size, seed))
+        ports.put(await server.start())
+        await asyncio.Event().wait()
+    asyncio.run(main())
+
+
+class FleetTransport(httpx.AsyncBaseTransport):
+    """Sends every request to the local fleet server, keeping the original Host header."""
+
+    def __init__(self, port: int, **kwargs):
+        self.port = port
+        self.inner = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = request.url.copy_with(scheme="http", host="127.0.0.1", port=self.port)
+        local = httpx.Request(request.method, url, headers=request.headers, stream=request.stream,
+                              extensions=request.extensions)
+        return await self.inner.handle_async_request(local)
+
+    async def aclose(self) -> None:
+        await self.inner.aclose()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Data-driven host exclusion and hosting detection, compiled once into regexes.
+
+Rules live in host_rules.json. Each rule table's literal patterns are merged
+into a trie-shaped regex, so one C-level scan finds every offset where a
+pattern starts. Each hit's text is looked up in a table of the best rule for
+it and its prefixes, and the highest-priority one wins. That reproduces the
+old first-match-wins if-chains exactly, and the winning rule is returned so a
+classification can be traced back to the line of the table that made it.
+"""
+import json
+import re
+from dataclasses import dataclass
+from functools import cache
+from pathlib import Path
+
+RULES_PATH = Path(__file__).with_name("host_rules.json")
+RESMED_URL = re.compile(r"^https?://[^/]*resmed\.[a-z\.]+(/|$)", re.I)
+
+
+@dataclass(frozen=True)
+class Rule:
+    """One matched entry from the rule table."""
+    priority: int
+    name: str
+    field: str
+    pattern: str
+
+
+def trie_regex(words) -> str:
+    """Regex alternation of literal words with common prefixes factored out."""
+    root: dict = {}
+    for w in words:
+        node = root
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        alts = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        body = alts[0] if len(alts) == 1 else f"(?:{'|'.join(alts)})"
+        if "" in node:
+            # A word ends here but longer ones continue
+            return f"(?:{body})?" if len(alts) == 1 and len(body) > 1 else f"{body}?"
+        return body
+
+    return build(root)
+
+
+# Where a literal must be for its rule to count: anywhere (None), at the start
+# of the text (START), or inside a named span of it
+START = "^"
+
+
+class RuleMatcher:
+    """Highest-priority match among many literal patterns, each allowed anywhere,
+    only at the start, or only inside one named span of the text."""
+
+    def __init__(self, rules: list[tuple[Rule, str, str | None]]):
+        # (rule, literal, where); earlier entries win on conflicts
+        table: dict[str, list[tuple[Rule, str | None]]] = {}
+        seen = set()
+        for rule, literal, where in rules:
+            if (literal, where) not in seen:
+                seen.add((literal, where))
+                table.setdefault(literal, []).append((rule, where))
+        self._regex = re.compile(trie_regex(table)) if table else None
+        # At any offset the trie matches the longest literal there, and every
+        # other literal matching at that offset is a prefix of it. So each
+        # literal's entry lists the rules of all its prefixes, best first
+        self.candidates = {
+            w: sorted(((rule, n, where) for n in range(1, len(w) + 1) for rule, where in table.get(w[:n], ())),
+                      key=lambda c: c[0].priority)
+            for w in table}
+
+    def match(self, text: str, spans: dict[str, tuple[int, int]] | None = None) -> Rule | None:
+        best = None
+        m = self._regex.search(text) if self._regex else None
+        while m:
+            at = m.start()
+            for rule, n, where in self.candidates[m.group()]:
+                if best is not None and rule.priority >= best.priority:
+                    break
+                if where is None or (at == 0 if where == START
+                                     else spans[where][0] <= at and at + n <= spans[where][1]):
+                    best = rule
+                    break
+            # Search again one past each hit, so overlapping hits are seen too
+            m = self._regex.search(text, at + 1)
+        return best
+
+
+def _first(*matches: Rule | None) -> Rule | None:
+    found = [m for m in matches if m is not None]
+    return min(found, key=lambda m: m.priority) if found else None
+
+
+class HostClassifier:
+    """Compiled form of a rule file; see host_rules.json for the format."""
+
+    def __init__(self, table: dict):
+        entries = []
+        n = 0
+        for entry in table["exclude"]:
+            for p in entry["patterns"]:
+                rule = Rule(n, entry["rule"], entry["match"], p)
+                n += 1
+                if entry["match"] == "prefix":
+                    # A prefix also excludes when it appears as a -suffix of a label
+                    entries.append((rule, p, START))
+                    entries.append((rule, "-" + p.rstrip(".-"), None))
+                else:
+                    entries.append((rule, p, None))
+        self.exclude = RuleMatcher(entries)
+
+        entries = []
+        self.header_names: dict[str, Rule] = {}
+        n = 0
+        for entry in table["hosting"]:
+            for p in entry["patterns"]:
+                rule = Rule(n, entry["provider"], entry["field"], p)
+                n += 1
+                # Header rules test for the presence of a response header
+                if entry["field"] == "header":
+                    self.header_names.setdefault(p, rule)
+                else:
+                    # "signals" is the whole text; the other fields are spans of it
+                    entries.append((rule, p, None if entry["field"] == "signals" else entry["field"]))
+        self.hosting = RuleMatcher(entries)
+
+    def exclusion(self, url: str) -> Rule | None:
+        """The rule that excludes url's host, or None to keep it."""
+        host = re.sub(r"^https?://", "", url).split("/")[0].lower()
+        return self.exclude.match(host)
+
+    def hosting_provider(self, headers: dict, cname_chain: list[str]) -> Rule | None:
+        """The hosting/CDN rule that matches a response, or None."""
+        return self._hosting_rule(*self._hosting_signals(headers, cname_chain))
+
+    def _hosting_signals(self, headers: dict, cname_chain: list[str]) -> tuple[str, int, int, tuple]:
+        """What hosting rules look at: the signals text (server first, x-powered-by
+        last), the lengths of those two spans, and the rule-table headers present."""
+        # Names from httpx are lower-case already; only other callers need a copy
+        names = " ".join(headers)
+        h = headers if names == names.lower() else {k.lower(): v for k, v in headers.items()}
+        server = h.get("server", "").lower()
+        powered_by = h.get("x-powered-by", "").lower()
+        signals = f"{server} {h.get('via', '').lower()} {' '.join(cname_chain).lower()} {powered_by}"
+        present = () if self.header_names.keys().isdisjoint(h) else tuple(filter(h.__contains__, self.header_names))
+        return signals, len(server), len(powered_by), present
+
+    def _hosting_rule(self, signals: str, server: int, powered_by: int, present: tuple) -> Rule | None:
+        end = len(signals)
+        rule = self.hosting.match(signals, {"server": (0, server), "powered_by": (end - powered_by, end)})
+        return _first(rule, *(self.header_names[k] for k in present)) if present else rule
+
+    def classify_hosts(self, urls) -> list[Rule | None]:
+        """exclusion() over many URLs, matching each distinct host once."""
+        seen: dict[str, Rule | None] = {}
+        out = []
+        for url in urls:
+            host = re.sub(r"^https?://", "", url).split("/")[0].lower()
+            if host not in seen:
+                seen[host] = self.exclude.match(host)
+            out.append(seen[host])
+        return out
+
+    def classify_hosting(self, responses) -> list[Rule | None]:
+        """hosting_provider() over many (headers, cname_chain) pairs, matching each
+        distinct combination of signals once."""
+        seen: dict[tuple, Rule | None] = {}
+        signals_of = self._hosting_signals
+        out = []
+        for headers, chain in responses:
+            key = signals_of(headers, chain)
+            try:
+                out.append(seen[key])
+            except KeyError:
+                out.append(seen.setdefault(key, self._hosting_rule(*key)))
+        return out
+
+
+def load_rules(path: str | Path = RULES_PATH) -> HostClassifier:
+    with open(path, encoding="utf-8") as f:
+        return HostClassifier(json.load(f))
+
+
+@cache
+def default_classifier() -> HostClassifier:
+    return load_rules()
+
+
+def is_resmed_url(u: str) -> bool:
+    """Whether a URL is on a resmed.<suffix> host (any subdomain)."""
+    return bool(RESMED_URL.match(u))
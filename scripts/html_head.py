@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Incremental extraction of <title> and hreflang alternates from a document head."""
+import codecs
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+
+# Stop reading a page after this much body even if </head> never shows up
+HEAD_MAX_BYTES = 64 * 1024
+
+
+@dataclass
+class PageHead:
+    """What the catalog needs from a page: response metadata plus head tags."""
+    url: str
+    status: int
+    headers: dict[str, str]
+    final_url: str
+    history: list[str] = field(default_factory=list)
+    title: str | None = None
+    alternates: list[tuple[str, str]] = field(default_factory=list)
+    # False when reading stopped at </head> or the byte cap
+    complete: bool = True
+    # Length of the resource, when a probe was asked to size it
+    size: int | None = None
+
+    @property
+    def is_html(self) -> bool:
+        return "text/html" in self.headers.get("content-type", "").lower()
+
+
+class HeadParser(HTMLParser):
+    """Feed it decoded chunks; ``done`` turns True once the head is over."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: str | None = None
+        self.alternates: list[tuple[str, str]] = []
+        self.done = False
+        self._title_parts: list[str] | None = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "link":
+            a = dict(attrs)
+            if (a.get("rel") or "").lower() == "alternate" and a.get("hreflang") is not None and a.get("href"):
+                self.alternates.append((a["hreflang"], a["href"]))
+        elif tag == "body":
+            self.done = True
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._title_parts is not None:
+            self.title = "".join(self._title_parts).strip() or None
+            self._title_parts = None
+        elif tag == "head":
+            self.done = True
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def close(self):
+        super().close()
+        # An unclosed <title> at the cut-off still counts
+        if self._title_parts is not None:
+            self.handle_endtag("title")
+
+
+def charset_of(headers) -> str:
+    """Charset from a Content-Type header, falling back to UTF-8."""
+    for param in headers.get("content-type", "").split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "charset" and value:
+            try:
+                return codecs.lookup(value.strip("\"'")).name
+            except LookupError:
+                break
+    return "utf-8"
+
+
+class HeadReader:
+    """Accumulates raw chunks, decoding and parsing them as they arrive."""
+
+    def __init__(self, headers, max_bytes: int = HEAD_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.body = bytearray()
+        self.parser = HeadParser()
+        self._decoder = codecs.getincrementaldecoder(charset_of(headers))(errors="replace")
+
+    def feed(self, chunk: bytes) -> bool:
+        """Consume a chunk; returns True when no more input is needed."""
+        self.body += chunk
+        self.parser.feed(self._decoder.decode(chunk))
+        return self.parser.done or len(self.body) >= self.max_bytes
+
+    def close(self) -> None:
+        self.parser.feed(self._decoder.decode(b"", final=True))
+        self.parser.close()
+
+
+def parse_head(body: bytes, headers, max_bytes: int = HEAD_MAX_BYTES) -> HeadParser:
+    """Run the incremental parser over an already-downloaded body."""
+    reader = HeadReader(headers, max_bytes)
+    for i in range(0, len(body), 8192):
+        if reader.feed(body[i:i + 8192]):
+            break
+    reader.close()
+    return reader.parser
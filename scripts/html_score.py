@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""Compute the migration difficulty score from crawled HTML instead of by hand.
+
+Each page stored by site_crawler.py is run through a streaming HTML parser
+that collects the rubric's raw metrics (inline styles, div nesting, semantic
+tags, shortcodes/HubL, embedded scripts and iframes) plus a MinHash
+signature of its tag paths. Parsing is CPU-bound, so pages are spread over a
+process pool; only the small metric records come back to the parent. There,
+each site's pages are clustered into templates (template_cluster.py), which
+gives structure consistency, and the 1-10 scores are assembled using the
+weights from docs/AGENT_TASK_INSTRUCTIONS.md.
+"""
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from statistics import mean
+
+from html_head import charset_of
+from pool_map import bounded_map
+from result_store import STORE_PATH, ResultStore
+from template_cluster import MAX_PATH_DEPTH, cluster, minhash, shingle
+
+STATE_PATH = "data/crawl/crawl_state.sqlite"
+OUT_DIR = "data/analysis"
+
+# Rubric weights (AGENT_TASK_INSTRUCTIONS.md, "Scoring Rubric")
+WEIGHTS = {"inline_styles": 0.30, "structure": 0.25, "semantic": 0.20, "custom_code": 0.15, "nesting": 0.10}
+
+SEMANTIC_TAGS = {"header", "nav", "main", "article", "section", "aside", "footer", "figure",
+                 "figcaption", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "table", "blockquote"}
+# Elements whose attributes and children are not content
+NON_CONTENT = {"html", "head", "meta", "link", "title", "script", "style", "noscript", "base", "template"}
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta",
+             "param", "source", "track", "wbr"}
+
+# [shortcode attr="x"], [/shortcode]; bare words only so "[1]" citations don't count
+SHORTCODE_RE = re.compile(r"\[/?([a-z][a-z0-9_-]{1,40})(?:\s+[^\]\[]{0,200})?/?\]")
+HUBL_RE = re.compile(r"\{%-?\s*\w+|\{\{\s*[\w.]+")
+
+PLATFORM_SIGNATURES = [
+    ("HubSpot", ("hs_cos_wrapper", "hscoscdn", "js.hs-scripts.com", "hubspot.com")),
+    ("Shopify", ("cdn.shopify.com", "myshopify.com", "shopify.theme")),
+    ("WordPress", ("/wp-content/", "/wp-includes/", "wp-json")),
+]
+
+
+@dataclass
+class PageMetrics:
+    """Raw measurements of one page; scores are derived from these later."""
+    site: str
+    url: str
+    platform: str = "Custom"
+    elements: int = 0
+    styled: int = 0
+    divs: int = 0
+    max_div_depth: int = 0
+    avg_div_depth: float = 0.0
+    semantic: int = 0
+    shortcodes: int = 0
+    hubl: int = 0
+    wp_blocks: int = 0
+    scripts: int = 0
+    inline_scripts: int = 0
+    iframes: int = 0
+    signature: tuple[int, ...] = ()
+    error: str = ""
+
+    @property
+    def inline_style_ratio(self) -> float:
+        return self.styled / self.elements if self.elements else 0.0
+
+    @property
+    def semantic_ratio(self) -> float:
+        """Semantic tags against the generic containers they could replace."""
+        total = self.semantic + self.divs
+        return self.semantic / total if total else 0.0
+
+    @property
+    def custom_code(self) -> int:
+        return self.shortcodes + self.hubl + self.inline_scripts + self.iframes
+
+
+class MetricsParser(HTMLParser):
+    """Streams through a document once, counting what the rubric needs."""
+
+    def __init__(self, metrics: PageMetrics):
+        super().__init__(convert_charrefs=True)
+        self.m = metrics
+        self.stack: list[str] = []
+        self.div_depth = 0
+        self.div_depth_total = 0
+        self.paths: set[int] = set()
+        self.in_script = False
+        self.in_body = False
+
+    def handle_starttag(self, tag, attrs):
+        m = self.m
+        if tag == "body":
+            self.in_body = True
+        if tag == "script":
+            m.scripts += 1
+            if not any(k == "src" for k, _ in attrs):
+                m.inline_scripts += 1
+            self.in_script = True
+        elif tag == "iframe":
+            m.iframes += 1
+        if tag not in NON_CONTENT and self.in_body:
+            m.elements += 1
+            if any(k == "style" and v and v.strip() for k, v in attrs):
+                m.styled += 1
+            if tag in SEMANTIC_TAGS:
+                m.semantic += 1
+            # Deeper paths would be cut back to an ancestor's, already counted
+            if len(self.stack) < MAX_PATH_DEPTH:
+                self.paths.add(shingle(self.stack + [tag]))
+            for k, v in attrs:
+                if k == "class" and v and "hs_cos_wrapper" in v:
+                    m.hubl += 1
+        if tag == "div":
+            m.divs += 1
+            self.div_depth += 1
+            self.div_depth_total += self.div_depth
+            m.max_div_depth = max(m.max_div_depth, self.div_depth)
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return
+        # Implicitly close anything left open inside it
+        while self.stack:
+            open_tag = self.stack.pop()
+            if open_tag == "div":
+                self.div_depth -= 1
+            elif open_tag == "script":
+                self.in_script = False
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.in_script or not self.in_body:
+            return
+        self.m.shortcodes += len(SHORTCODE_RE.findall(data))
+        self.m.hubl += len(HUBL_RE.findall(data))
+
+    def handle_comment(self, data):
+        if data.lstrip().startswith("wp:"):
+            self.m.wp_blocks += 1
+
+    def close(self):
+        super().close()
+        m = self.m
+        m.avg_div_depth = round(self.div_depth_total / m.divs, 2) if m.divs else 0.0
+        m.signature = minhash(self.paths)
+
+
+def detect_platform(html: str) -> str:
+    sample = html[:200_000].lower()
+    for name, signatures in PLATFORM_SIGNATURES:
+        if any(s in sample for s in signatures):
+            return name
+    return "Custom"
+
+
+def analyze_html(site: str, url: str, html: str) -> PageMetrics:
+    metrics = PageMetrics(site, url, platform=detect_platform(html))
+    parser = MetricsParser(metrics)
+    try:
+        for i in range(0, len(html), 65536):
+            parser.feed(html[i:i + 65536])
+        parser.close()
+    except Exception as e:
+        metrics.error = str(e)
+    return metrics
+
+
+def analyze_page(job: tuple[str, str, str, bytes]) -> PageMetrics:
+    """Pool entry point: (site, url, content_type, zlib-compressed HTML) -> metrics."""
+    site, url, content_type, blob = job
+    html = zlib.decompress(blob).decode(charset_of({"content-type": content_type or ""}), errors="replace")
+    return analyze_html(site, url, html)
+
+
+def _clamp(x: float) -> float:
+    return max(0.0, min(10.0, x))
+
+
+def component_scores(m: PageMetrics, structure: float) -> dict[str, float]:
+    """0-10 per rubric component, 10 being easiest to migrate."""
+    return {
+        # Low (<20%) to High (>60%) inline styling
+        "inline_styles": _clamp(10 * (1 - m.inline_style_ratio / 0.6)),
+        "structure": _clamp(10 * structure),
+        # A third of containers being semantic is about as good as real sites get
+        "semantic": _clamp(10 * m.semantic_ratio / 0.33),
+        "custom_code": _clamp(10 * (1 - m.custom_code / 20)),
+        # Up to ~8 nested divs is normal for a theme; 25+ is div soup
+        "nesting": _clamp(10 * (25 - m.max_div_depth) / 17),
+    }
+
+
+def overall(components: dict[str, float]) -> float:
+    score = sum(WEIGHTS[k] * v for k, v in components.items())
+    return round(max(1.0, min(10.0, score)), 1)
+
+
+def templates(pages: list[PageMetrics]) -> list[list[PageMetrics]]:
+    """A site's pages grouped by DOM shape, most common template first."""
+    return [[pages[i] for i in group] for group in cluster([p.signature for p in pages])]
+
+
+def structure_consistency(groups: list[list[PageMetrics]]) -> dict[str, float]:
+    """Per page: share of its site's pages that use the same template."""
+    total = sum(len(g) for g in groups)
+    return {p.url: len(g) / total for g in groups for p in g}
+
+
+@dataclass
+class SiteScore:
+    site: str
+    platform: str
+    pages: int
+    score: float
+    components: dict[str, float] = field(default_factory=dict)
+    inline_style_ratio: float = 0.0
+    semantic_ratio: float = 0.0
+    max_div_depth: int = 0
+    avg_div_depth: float = 0.0
+    shortcodes: int = 0
+    hubl: int = 0
+    scripts: int = 0
+    iframes: int = 0
+    structure: float = 0.0
+    templates: int = 0
+    outlier_pages: int = 0
+
+
+def score_site(site: str, pages: list[PageMetrics], groups: list[list[PageMetrics]]) -> tuple[SiteScore, list[dict]]:
+    structure = structure_consistency(groups)
+    # Template numbers follow popularity; a page alone in its group is an outlier
+    template_of = {p.url: (n, len(g) == 1 < len(pages)) for n, g in enumerate(groups, 1) for p in g}
+    page_rows = []
+    for p in pages:
+        comps = component_scores(p, structure[p.url])
+        template, outlier = template_of[p.url]
+        page_rows.append({"score": overall(comps), **{k: round(v, 2) for k, v in comps.items()},
+                          "template": template, "outlier": int(outlier)})
+    # The site-level structure figure is how much of the site follows its most common layouts
+    site_structure = mean(structure[p.url] for p in pages)
+    components = {k: round(mean(r[k] for r in page_rows), 2) for k in WEIGHTS}
+    components["structure"] = round(_clamp(10 * site_structure), 2)
+    platform = Counter(p.platform for p in pages).most_common(1)[0][0]
+    return SiteScore(
+        site, platform, len(pages), overall(components), components,
+        inline_style_ratio=round(mean(p.inline_style_ratio for p in pages), 4),
+        semantic_ratio=round(mean(p.semantic_ratio for p in pages), 4),
+        max_div_depth=max(p.max_div_depth for p in pages),
+        avg_div_depth=round(mean(p.avg_div_depth for p in pages), 2),
+        shortcodes=sum(p.shortcodes for p in pages), hubl=sum(p.hubl for p in pages),
+        scripts=sum(p.scripts for p in pages), iframes=sum(p.iframes for p in pages),
+        structure=round(site_structure, 4),
+        templates=sum(len(g) > 1 for g in groups) or 1,
+        outlier_pages=sum(r["outlier"] for r in page_rows),
+    ), page_rows
+
+
+def iter_jobs(db: sqlite3.Connection, only: list[str] | None = None):
+    sql = "SELECT site, url, content_type, html FROM pages WHERE html IS NOT NULL"
+    params: list = []
+    if only:
+        sql += f" AND site IN ({','.join('?' * len(only))})"
+        params = list(only)
+    for row in db.execute(sql + " ORDER BY site, url", params):
+        yield tuple(row)
+
+
+def count_jobs(db: sqlite3.Connection, only: list[str] | None = None) -> int:
+    sql = "SELECT COUNT(*) FROM pages WHERE html IS NOT NULL"
+    if only:
+        sql += f" AND site IN ({','.join('?' * len(only))})"
+    return db.execute(sql, list(only or [])).fetchone()[0]
+
+
+def analyze_pages(jobs, workers: int | None = None) -> list[PageMetrics]:
+    """Parse pages across a process pool; results come back in input order.
+
+    Jobs are read from the iterable a few batches ahead of the workers, so
+    only the HTML being parsed is in memory.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        return [analyze_page(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(bounded_map(pool, analyze_page, jobs, workers))
+
+
+def score_pages(metrics: list[PageMetrics]) -> tuple[list[SiteScore], list[tuple[PageMetrics, dict]]]:
+    by_site: dict[str, list[PageMetrics]] = {}
+    for m in metrics:
+        by_site.setdefault(m.site, []).append(m)
+    sites, pages = [], []
+    for site, site_pages in sorted(by_site.items()):
+        site_score, rows = score_site(site, site_pages, templates(site_pages))
+        sites.append(site_score)
+        pages.extend(zip(site_pages, rows))
+    return sites, pages
+
+
+PAGE_FIELDS = ["site", "url", "platform", "score", *WEIGHTS, "inline_style_ratio", "semantic_ratio",
+               "max_div_depth", "avg_div_depth", "shortcodes", "hubl", "wp_blocks", "scripts",
+               "inline_scripts", "iframes", "template", "outlier", "error"]
+SITE_FIELDS = ["site", "platform", "pages", "score", *WEIGHTS, "inline_style_ratio", "semantic_ratio",
+               "max_div_depth", "avg_div_depth", "shortcodes", "hubl", "scripts", "iframes",
+               "templates", "outlier_pages"]
+
+
+def page_record(m: PageMetrics, row: dict) -> dict:
+    d = asdict(m)
+    d.update(row, inline_style_ratio=round(m.inline_style_ratio, 4), semantic_ratio=round(m.semantic_ratio, 4))
+    return d
+
+
+def site_record(s: SiteScore) -> dict:
+    d = asdict(s)
+    d.update(d.pop("components"))
+    return d
+
+
+def write_scores(sites: list[SiteScore], pages: list[tuple[PageMetrics, dict]], out_dir: str = OUT_DIR):
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / "page_scores.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=PAGE_FIELDS, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(page_record(m, row) for m, row in pages)
+    with open(out / "site_scores.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=SITE_FIELDS, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(site_record(s) for s in sites)
+    # One row per template and per outlier page, with a page to look at
+    groups: dict[tuple[str, int], list] = {}
+    for m, row in pages:
+        groups.setdefault((m.site, row["template"]), [0, m.url, row["outlier"]])[0] += 1
+    site_pages = {s.site: s.pages for s in sites}
+    with open(out / "templates.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["site", "template", "pages", "share", "outlier", "example_url"])
+        for (site, template), (count, url, outlier) in sorted(groups.items()):
+            w.writerow([site, template, count, round(count / site_pages[site], 4), outlier, url])
+    print(f"Scores written to {out / 'site_scores.csv'} and {out / 'page_scores.csv'}, "
+          f"templates to {out / 'templates.csv'}")
+
+
+def html_page_counts(db: sqlite3.Connection) -> dict[str, int]:
+    """Live HTML pages per site in the crawl, scored or not; effort is sized on these."""
+    return dict(db.execute("SELECT site, COUNT(*) FROM pages WHERE state='done' AND status < 400 "
+                           "AND content_type LIKE 'text/html%' GROUP BY site"))
+
+
+def store_scores(store: ResultStore, sites: list[SiteScore], pages: list[tuple[PageMetrics, dict]],
+                 page_counts: dict[str, int]):
+    store.write_pages(page_record(m, row) for m, row in pages)
+    store.write_sites({**site_record(s), "pages_scored": s.pages,
+                       "pages_total": max(page_counts.get(s.site, 0), s.pages)} for s in sites)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Score crawled HTML for migration difficulty")
+    ap.add_argument("--state", default=STATE_PATH, help="crawl state database from site_crawler.py")
+    ap.add_argument("--out", default=OUT_DIR, help="directory for site_scores.csv and page_scores.csv")
+    ap.add_argument("--only", nargs="*", help="score only these sites")
+    ap.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    ap.add_argument("--store", default=STORE_PATH, help="results database read by consolidate_analysis.py")
+    args = ap.parse_args()
+
+    db = sqlite3.connect(args.state)
+    page_counts = html_page_counts(db)
+    print(f"Scoring {count_jobs(db, args.only)} pages...")
+    metrics = analyze_pages(iter_jobs(db, args.only), args.workers)
+    db.close()
+    sites, pages = score_pages(metrics)
+    for s in sites:
+        print(f"  {s.site}: {s.score}/10 over {s.pages} pages ({s.platform}), "
+              f"{s.templates} templates, {s.outlier_pages} outlier pages")
+    write_scores(sites, pages, args.out)
+    with ResultStore(args.store) as store:
+        store_scores(store, sites, pages, page_counts)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Persistent SQLite cache of HTTP responses and DNS answers for catalog re-runs."""
+import json
+import sqlite3
+import time
+import zlib
+from pathlib import Path
+
+import httpx
+
+DEFAULT_PATH = "data/cache/catalog_cache.sqlite"
+DEFAULT_MAX_AGE = 30 * 24 * 3600      # 30 days
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024  # 512 MB of compressed bodies
+
+# The cached body is stored decoded, so these no longer describe it
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    final_url TEXT NOT NULL,
+    history TEXT NOT NULL,
+    body BLOB NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    partial INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS dns (
+    host TEXT PRIMARY KEY,
+    cname_chain TEXT NOT NULL,
+    ips TEXT NOT NULL,
+    nxdomain INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+def _headers(r: httpx.Response) -> list[tuple[str, str]]:
+    return [(k, v) for k, v in r.headers.multi_items() if k.lower() not in _DROP_HEADERS]
+
+
+def _build_response(status: int, headers: list, url: str, body: bytes = b"",
+                    history: list | None = None) -> httpx.Response:
+    return httpx.Response(status, headers=headers, content=body,
+                          request=httpx.Request("GET", url), history=history or [])
+
+
+class CachedResponse:
+    """A stored response plus the validators needed to revalidate it."""
+
+    def __init__(self, row: sqlite3.Row):
+        self.url = row["url"]
+        self.status = row["status"]
+        self.headers = [tuple(h) for h in json.loads(row["headers"])]
+        self.final_url = row["final_url"]
+        self.history = json.loads(row["history"])
+        self.body = zlib.decompress(row["body"])
+        self.etag = row["etag"]
+        self.last_modified = row["last_modified"]
+        self.stored_at = row["stored_at"]
+        # Only the head of the document was read (see html_head)
+        self.partial = bool(row["partial"])
+
+    def conditional_headers(self) -> dict[str, str]:
+        h = {}
+        if self.etag:
+            h["If-None-Match"] = self.etag
+        if self.last_modified:
+            h["If-Modified-Since"] = self.last_modified
+        return h
+
+    def to_response(self) -> httpx.Response:
+        """Rebuild an httpx.Response, including redirect history, from the entry."""
+        history = [_build_response(status, headers, url) for url, status, headers in self.history]
+        return _build_response(self.status, self.headers, self.final_url, self.body, history)
+
+
+class ResponseCache:
+    """URL-keyed response store with age and size limits, plus a DNS answer table."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_age: float = DEFAULT_MAX_AGE,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        columns = {row["name"] for row in self.db.execute("PRAGMA table_info(responses)")}
+        if "partial" not in columns:
+            self.db.execute("ALTER TABLE responses ADD COLUMN partial INTEGER NOT NULL DEFAULT 0")
+        self.expire()
+
+    def get(self, url: str) -> CachedResponse | None:
+        row = self.db.execute("SELECT * FROM responses WHERE url=?", (url,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # Committed with the next write; only feeds LRU eviction
+        self.db.execute("UPDATE responses SET accessed_at=? WHERE url=?", (time.time(), url))
+        return CachedResponse(row)
+
+    def put(self, url: str, r: httpx.Response, body: bytes | None = None, partial: bool = False) -> None:
+        """Store r; pass ``body`` for streamed responses whose content wasn't read in full."""
+        body = zlib.compress(r.content if body is None else bytes(body))
+        history = [[str(h.url), h.status_code, _headers(h)] for h in r.history]
+        now = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?,?,?,?,?,?,?,?,?,?,?,?)",
+            (url, r.status_code, json.dumps(_headers(r)), str(r.url), json.dumps(history), body,
+             r.headers.get("etag"), r.headers.get("last-modified"), len(body), now, now, int(partial)))
+        self.db.commit()
+
+    def touch(self, url: str) -> None:
+        """Record a successful revalidation (304) so the entry counts as fresh."""
+        self.revalidated += 1
+        now = time.time()
+        self.db.execute("UPDATE responses SET stored_at=?, accessed_at=? WHERE url=?", (now, now, url))
+        self.db.commit()
+
+    def get_dns(self, host: str, allow_stale: bool = False) -> "DNSResult | None":
+        # Only the catalog caches DNS; the crawler and inventory needn't load dnspython
+        from dns_engine import DNSResult
+        row = self.db.execute("SELECT * FROM dns WHERE host=?", (host,)).fetchone()
+        if row is None or (not allow_stale and row["expires_at"] <= time.time()):
+            return None
+        return DNSResult(host, json.loads(row["cname_chain"]), json.loads(row["ips"]),
+                         bool(row["nxdomain"]))
+
+    def put_dns(self, result: "DNSResult", ttl: float) -> None:
+        self.db.execute("INSERT OR REPLACE INTO dns VALUES (?,?,?,?,?)",
+                        (result.host, json.dumps(result.cname_chain), json.dumps(result.ips),
+                         int(result.nxdomain), time.time() + ttl))
+        self.db.commit()
+
+    def expire(self) -> None:
+        """Drop entries older than max_age, then least-recently-used ones over max_bytes."""
+        self.db.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.max_age,))
+        self.db.execute("DELETE FROM dns WHERE expires_at < ?", (time.time() - self.max_age,))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_bytes:
+            rows = self.db.execute("SELECT url, size FROM responses ORDER BY accessed_at").fetchall()
+            evict = []
+            for row in rows:
+                if total <= self.max_bytes:
+                    break
+                evict.append((row["url"],))
+                total -= row["size"]
+            self.db.executemany("DELETE FROM responses WHERE url=?", evict)
+        self.db.commit()
+
+    def close(self) -> None:
+        self.expire()
+        self.db.close()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "revalidated": self.revalidated}
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""One pooled HTTP client shared by every catalog phase, with concurrency caps."""
+import asyncio
+import contextlib
+import re
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import httpx
+
+from html_head import HEAD_MAX_BYTES, HeadReader, PageHead, parse_head
+from http_cache import CachedResponse, ResponseCache
+from instrumentation import RequestTimer, RunMetrics
+from rate_limit import RETRY_STATUSES, THROTTLE_STATUSES, HostLimiter, backoff, retry_after
+
+# Sent with every request, by the catalog, the crawler and the asset inventory alike
+HEADERS = {"User-Agent": "Mozilla/5.0 (ResMedCatalogBot/1.0; +https://example.com/bot)"}
+# Failures worth another try; a refused or unresolvable connection is not one
+RETRY_ERRORS = (httpx.TimeoutException, httpx.ReadError, httpx.WriteError, httpx.RemoteProtocolError)
+# HEAD answers that say nothing about a GET: servers (and WAFs) that refuse the method
+HEAD_REJECTED = (403, 405, 501)
+
+
+def _content_length(r: httpx.Response) -> int | None:
+    try:
+        return int(r.headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+class CatalogSession:
+    """Keep-alive HTTP/2 client that lives for the whole run.
+
+    Requests are capped globally and paced per host (see rate_limit.py): each
+    host's concurrency and rate adapt to its latency and 429/503 responses, and
+    throttled or timed-out requests are retried with jittered backoff, waiting
+    out any Retry-After. Connections are pooled by origin and reused between phases; the
+    httpcore trace hooks count new connections against requests sent (redirect
+    hops included) to report how often that happened. With a ``cache``, GETs
+    revalidate stored entries; with ``offline`` they are served from it only.
+    """
+
+    def __init__(self, headers: dict | None = None, timeout: httpx.Timeout | float = 20.0,
+                 max_connections: int = 100, max_keepalive: int = 50, keepalive_expiry: float = 60.0,
+                 global_limit: int = 50, per_host: int = 6, http2: bool = True,
+                 cache: ResponseCache | None = None, offline: bool = False,
+                 transport: httpx.AsyncBaseTransport | None = None,
+                 max_per_host: int = 32, host_rate: float = 10.0, retries: int = 3,
+                 max_retry_after: float = 120.0, metrics: RunMetrics | None = None):
+        self.headers = headers or {}
+        self.timeout = timeout if isinstance(timeout, httpx.Timeout) else httpx.Timeout(timeout)
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.global_limit = global_limit
+        self.per_host = per_host
+        self.max_per_host = max(per_host, max_per_host)
+        self.host_rate = host_rate
+        self.retries = retries
+        self.max_retry_after = max_retry_after
+        self.http2 = http2
+        self.cache = cache
+        self.offline = offline
+        self.transport = transport
+        self.metrics = metrics
+        self.client: httpx.AsyncClient | None = None
+        self.requests = 0
+        self.exchanges = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+        self.failures = 0
+        self.retried = 0
+        self.throttled = 0
+        self.gave_up = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.bytes = 0
+        self.connections_by_host: Counter[str] = Counter()
+        self.requests_by_host: Counter[str] = Counter()
+        self._global: asyncio.Semaphore | None = None
+        self._hosts: dict[str, HostLimiter] = {}
+
+    async def __aenter__(self) -> "CatalogSession":
+        self.client = httpx.AsyncClient(http2=self.http2, limits=self.limits, headers=self.headers,
+                                        timeout=self.timeout, transport=self.transport)
+        self._global = asyncio.Semaphore(self.global_limit)
+        if self.metrics:
+            self.metrics.gauge("http_waiting", lambda: self.waiting)
+            self.metrics.gauge("http_in_flight", lambda: self.in_flight)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.client.aclose()
+        self.client = None
+
+    def limiter(self, host: str) -> HostLimiter:
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            limiter = self._hosts[host] = HostLimiter(self.per_host, self.max_per_host, self.host_rate)
+        return limiter
+
+    def _tracer(self, host: str, timer: RequestTimer | None):
+        async def trace(event: str, info: dict) -> None:
+            if timer is not None:
+                timer.event(event)
+            if event == "connection.connect_tcp.complete":
+                self.connections += 1
+                self.connections_by_host[host] += 1
+            elif event == "connection.start_tls.complete":
+                self.tls_handshakes += 1
+            elif event.endswith("send_request_headers.started"):
+                self.exchanges += 1
+        return trace
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, url: str):
+        """Hold a global and a per-host slot; yields (request extensions, timer or None)."""
+        host = urlsplit(url).hostname or ""
+        self.waiting += 1
+        waiting = True
+        try:
+            # Wait out the host's pacing before taking a global slot
+            async with self.limiter(host).slot(), self._global:
+                self.waiting -= 1
+                waiting = False
+                self.in_flight += 1
+                self.requests += 1
+                self.requests_by_host[host] += 1
+                timer = self.metrics.timer(host) if self.metrics else None
+                try:
+                    yield {"trace": self._tracer(host, timer)}, timer
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if waiting:
+                self.waiting -= 1
+
+    def _done(self, timer: RequestTimer | None, r: httpx.Response | None) -> None:
+        nbytes = r.num_bytes_downloaded if r is not None else 0
+        self.bytes += nbytes
+        if timer is not None:
+            timer.finish(nbytes, ok=r is not None)
+
+    def _retry_delay(self, url: str, r: httpx.Response | None, error: Exception | None,
+                     elapsed: float, attempt: int) -> float | None:
+        """Feed the outcome to the host's limiter; seconds to wait before retrying, or None to stop."""
+        limiter = self.limiter(urlsplit(url).hostname or "")
+        if error is not None:
+            if isinstance(error, httpx.TimeoutException):
+                limiter.on_congestion()
+            retryable = isinstance(error, RETRY_ERRORS)
+            delay = backoff(attempt)
+        else:
+            if r.status_code not in RETRY_STATUSES:
+                limiter.on_success(elapsed)
+                return None
+            retryable = True
+            delay = backoff(attempt)
+            if r.status_code in THROTTLE_STATUSES:
+                self.throttled += 1
+                limiter.on_congestion()
+                wait = retry_after(r.headers.get("retry-after"))
+                if wait is not None:
+                    if wait > self.max_retry_after:
+                        retryable = False
+                    else:
+                        # The whole host waits, not just this request
+                        limiter.pause(wait)
+                        delay = wait
+        if not retryable or attempt >= self.retries:
+            if r is not None:
+                self.gave_up += 1
+            return None
+        self.retried += 1
+        return delay
+
+    async def request(self, method: str, url: str, headers: dict | None = None,
+                      timeout: httpx.Timeout | None = None,
+                      follow_redirects: bool = True) -> httpx.Response:
+        """Send one request within the limits, retrying throttled and timed-out attempts."""
+        attempt = 0
+        while True:
+            r = error = None
+            started = time.monotonic()
+            try:
+                async with self._slot(url) as (extensions, timer):
+                    started = time.monotonic()
+                    try:
+                        r = await self.client.request(method, url, headers=headers,
+                                                      timeout=timeout or self.timeout,
+                                                      follow_redirects=follow_redirects, extensions=extensions)
+                    finally:
+                        self._done(timer, r)
+            except httpx.HTTPError as e:
+                error = e
+            delay = self._retry_delay(url, r, error, time.monotonic() - started, attempt)
+            if delay is None:
+                if error is not None:
+                    raise error
+                return r
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    @contextlib.asynccontextmanager
+    async def stream(self, method: str, url: str, headers: dict | None = None,
+                     timeout: httpx.Timeout | None = None, follow_redirects: bool = True):
+        """Streamed request within the limits; the slot is held until the body is closed.
+
+        Retries happen before any body is read, so callers only ever see the
+        final attempt.
+        """
+        attempt = 0
+        yielded = False
+        while True:
+            delay = None
+            started = time.monotonic()
+            try:
+                async with self._slot(url) as (extensions, timer):
+                    started = time.monotonic()
+                    r = None
+                    try:
+                        async with self.client.stream(method, url, headers=headers, timeout=timeout or self.timeout,
+                                                      follow_redirects=follow_redirects, extensions=extensions) as r:
+                            delay = self._retry_delay(url, r, None, time.monotonic() - started, attempt)
+                            if delay is None:
+                                yielded = True
+                                yield r
+                                return
+                    finally:
+                        self._done(timer, r)
+            except RETRY_ERRORS as e:
+                # Errors while the caller reads the body are theirs to handle
+                if yielded or delay is not None:
+                    raise
+                delay = self._retry_delay(url, None, e, time.monotonic() - started, attempt)
+                if delay is None:
+                    raise
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def fetch(self, url: str, timeout: httpx.Timeout | None = None) -> tuple[httpx.Response | None, str | None]:
+        """GET url (through the cache) and return (response, final_url_after_redirects)."""
+        cached = self.cache.get(url) if self.cache else None
+        if cached and cached.partial:
+            # Only a head-only read was stored; that can't stand in for the page
+            cached = None
+        if self.offline:
+            r = cached.to_response() if cached else None
+            return (r, str(r.url) if r else None)
+        # Revalidate what we already have; a 304 costs no body transfer
+        headers = cached.conditional_headers() if cached else None
+        try:
+            r = await self.request("GET", url, headers=headers, timeout=timeout)
+        except Exception:
+            self.failures += 1
+            return (None, None)
+        if cached and r.status_code == 304:
+            self.cache.touch(url)
+            r = cached.to_response()
+        elif self.cache and r.status_code not in THROTTLE_STATUSES:
+            # A throttled answer says nothing about the page; don't let it replace a good one
+            self.cache.put(url, r)
+        return (r, str(r.url))
+
+    async def fetch_head(self, url: str, max_bytes: int = HEAD_MAX_BYTES,
+                         timeout: httpx.Timeout | None = None) -> PageHead | None:
+        """Stream a GET only as far as </head> (or max_bytes) and extract its metadata.
+
+        Non-HTML responses are not read at all. Abandoning the body resets the
+        stream on HTTP/2; an HTTP/1.1 connection is closed instead of reused.
+        """
+        cached = self.cache.get(url) if self.cache else None
+        if self.offline:
+            return self._head_from_cache(url, cached, max_bytes) if cached else None
+        headers = cached.conditional_headers() if cached else None
+        try:
+            async with self.stream("GET", url, headers=headers, timeout=timeout) as r:
+                if cached and r.status_code == 304:
+                    self.cache.touch(url)
+                    return self._head_from_cache(url, cached, max_bytes)
+                reader = HeadReader(r.headers, max_bytes)
+                complete = False
+                if "text/html" in r.headers.get("content-type", "").lower():
+                    complete = True
+                    async for chunk in r.aiter_bytes():
+                        if reader.feed(chunk):
+                            complete = False
+                            break
+                reader.close()
+        except Exception:
+            self.failures += 1
+            return None
+        if self.cache and r.status_code not in THROTTLE_STATUSES:
+            self.cache.put(url, r, body=reader.body, partial=not complete)
+        return PageHead(url, r.status_code, dict(r.headers), str(r.url), [str(h.url) for h in r.history],
+                        reader.parser.title, reader.parser.alternates, complete)
+
+    def _head_from_cache(self, url: str, cached: CachedResponse, max_bytes: int) -> PageHead:
+        r = cached.to_response()
+        parser = parse_head(cached.body, r.headers, max_bytes)
+        return PageHead(url, r.status_code, dict(r.headers), str(r.url), [str(h.url) for h in r.history],
+                        parser.title, parser.alternates, not cached.partial)
+
+    async def probe(self, url: str, timeout: httpx.Timeout | None = None, size: bool = False) -> PageHead | None:
+        """HEAD-first check: status, headers and final URL, no body.
+
+        Falls back to a streamed GET, closed before the body, when HEAD fails
+        or is rejected (403/405/501). With ``size`` the resource's length is
+        wanted as well: requests ask for identity encoding, so Content-Length
+        is the file's, and where HEAD gives no length the GET asks for one
+        byte and takes the total from Content-Range. Probes bypass the cache
+        except when offline.
+        """
+        if self.offline:
+            cached = self.cache.get(url) if self.cache else None
+            return self._head_from_cache(url, cached, 0) if cached else None
+        identity = {"Accept-Encoding": "identity"} if size else None
+        r = None
+        try:
+            r = await self.request("HEAD", url, headers=identity, timeout=timeout)
+        except Exception:
+            pass
+        length = _content_length(r) if size and r is not None and r.status_code < 400 else None
+        if r is None or r.status_code in HEAD_REJECTED or (size and length is None and r.status_code < 400):
+            try:
+                async with self.stream("GET", url, headers={**identity, "Range": "bytes=0-0"} if size else None,
+                                       timeout=timeout) as r:
+                    pass
+            except Exception:
+                self.failures += 1
+                return None
+            if size:
+                m = re.search(r"/(\d+)\s*$", r.headers.get("content-range", ""))
+                # A 200 ignored the range; its length is the whole file's and the body is left unread
+                length = int(m.group(1)) if m else _content_length(r) if r.status_code == 200 else None
+        # A one-byte range answered is the resource found
+        status = 200 if r.status_code == 206 else r.status_code
+        return PageHead(url, status, dict(r.headers), str(r.url), [str(h.url) for h in r.history],
+                        complete=False, size=length)
+
+    def stats(self) -> dict:
+        reused = max(self.exchanges - self.connections, 0)
+        return {"requests": self.requests, "exchanges": self.exchanges,
+                "new_connections": self.connections, "tls_handshakes": self.tls_handshakes,
+                "reused": reused, "reuse_ratio": round(reused / self.exchanges, 3) if self.exchanges else 0.0,
+                "failures": self.failures, "retried": self.retried, "throttled": self.throttled,
+                "gave_up": self.gave_up, "bytes": self.bytes, "hosts": len(self.requests_by_host),
+                "backed_off_hosts": sum(1 for h in self._hosts.values() if h.decreases)}
+
+    def report(self) -> str:
+        s = self.stats()
+        lines = [f"HTTP: {s['requests']} requests ({s['exchanges']} incl. redirects) over {s['new_connections']} connections "
+                 f"({s['reused']} reused, {s['reuse_ratio']:.0%}; {s['tls_handshakes']} TLS handshakes, "
+                 f"{s['failures']} failed) across {s['hosts']} hosts"]
+        if s["throttled"] or s["retried"]:
+            lines.append(f"  {s['throttled']} throttled responses, {s['retried']} retries, {s['gave_up']} still "
+                         f"failing after retries; {s['backed_off_hosts']} hosts slowed down")
+        busiest = self.requests_by_host.most_common(5)
+        for host, n in busiest:
+            lines.append(f"  {host}: {n} requests, {self.connections_by_host[host]} connections")
+        return "\n".join(lines)
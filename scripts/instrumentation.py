@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""Run metrics for the catalog: phase wall times, per-request timings, gauges.
+
+Request timings come from httpcore's trace events, so they split a request
+into connect (TCP, including the OS name lookup), TLS, time to first byte
+and body transfer without touching the request code. Queue depths are
+sampled on a timer. Everything is exported as JSON (for diffing runs) and
+Prometheus text exposition format.
+"""
+import asyncio
+import contextlib
+import cProfile
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable
+
+METRICS_DIR = "data/metrics"
+# Stages of one HTTP exchange as measured from trace events
+STAGES = ("connect", "tls", "ttfb", "body", "total")
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def quantile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank quantile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    i = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+class RequestTimer:
+    """Collects the trace events of one request; ``finish()`` hands the timings over."""
+
+    __slots__ = ("metrics", "host", "start", "marks", "timings")
+
+    def __init__(self, metrics: "RunMetrics", host: str):
+        self.metrics = metrics
+        self.host = host
+        self.start = time.perf_counter()
+        self.marks: dict[str, float] = {}
+        self.timings: dict[str, float] = defaultdict(float)
+
+    def event(self, name: str) -> None:
+        now = time.perf_counter()
+        # e.g. "connection.connect_tcp.started" / "http11.receive_response_body.complete"
+        step, _, phase = name.rpartition(".")
+        step = step.rpartition(".")[2]
+        if phase == "started":
+            self.marks[step] = now
+            return
+        began = self.marks.pop(step, None)
+        if began is None:
+            return
+        if step == "connect_tcp":
+            self.timings["connect"] += now - began
+        elif step == "start_tls":
+            self.timings["tls"] += now - began
+        elif step == "receive_response_headers":
+            # From request sent to headers back; includes server think time
+            self.timings["ttfb"] += now - began
+        elif step == "receive_response_body":
+            self.timings["body"] += now - began
+
+    def finish(self, nbytes: int = 0, ok: bool = True) -> None:
+        self.timings["total"] = time.perf_counter() - self.start
+        self.metrics.record_request(self.host, self.timings, nbytes, ok)
+
+
+class RunMetrics:
+    """Everything measured during one run; cheap enough to leave on."""
+
+    def __init__(self, name: str = "catalog"):
+        self.name = name
+        self.started = time.time()
+        self.phases: dict[str, float] = {}
+        self.counters: dict[str, float] = defaultdict(float)
+        self.samples: dict[str, list[float]] = {s: [] for s in STAGES}
+        self.dns_samples: list[float] = []
+        self.hosts: dict[str, dict] = defaultdict(lambda: {"requests": 0, "errors": 0, "bytes": 0,
+                                                           "seconds": 0.0, "ttfb": []})
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.gauge_stats: dict[str, dict] = {}
+        self.info: dict = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Wall time of a block; nested or overlapping phases are each timed on their own."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    async def timed(self, name: str, aw):
+        """Await aw as a named phase."""
+        with self.phase(name):
+            return await aw
+
+    def count(self, name: str, n: float = 1) -> None:
+        self.counters[name] += n
+
+    def timer(self, host: str) -> RequestTimer:
+        return RequestTimer(self, host)
+
+    def record_request(self, host: str, timings: dict, nbytes: int, ok: bool) -> None:
+        for stage in STAGES:
+            if stage in timings:
+                self.samples[stage].append(timings[stage])
+        h = self.hosts[host]
+        h["requests"] += 1
+        h["errors"] += 0 if ok else 1
+        h["bytes"] += nbytes
+        h["seconds"] += timings.get("total", 0.0)
+        if "ttfb" in timings:
+            h["ttfb"].append(timings["ttfb"])
+        self.counters["requests"] += 1
+        self.counters["bytes"] += nbytes
+        if not ok:
+            self.counters["request_errors"] += 1
+
+    def record_dns(self, seconds: float) -> None:
+        self.dns_samples.append(seconds)
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Register a callable sampled by ``sample()``; max and mean are reported."""
+        self.gauges[name] = read
+        self.gauge_stats.setdefault(name, {"max": 0.0, "sum": 0.0, "n": 0})
+
+    def sample(self) -> None:
+        for name, read in self.gauges.items():
+            value = float(read())
+            s = self.gauge_stats[name]
+            s["max"] = max(s["max"], value)
+            s["sum"] += value
+            s["n"] += 1
+
+    async def sampler(self, interval: float = 0.25) -> None:
+        """Background task sampling the gauges until cancelled."""
+        while True:
+            self.sample()
+            await asyncio.sleep(interval)
+
+    def summary(self, slowest: int = 20) -> dict:
+        def dist(values: list[float]) -> dict:
+            v = sorted(values)
+            out = {"count": len(v), "mean": round(sum(v) / len(v), 4) if v else 0.0}
+            out.update({f"p{int(q * 100)}": round(quantile(v, q), 4) for q in QUANTILES})
+            out["max"] = round(v[-1], 4) if v else 0.0
+            return out
+
+        hosts = []
+        for host, h in self.hosts.items():
+            ttfb = sorted(h["ttfb"])
+            hosts.append({"host": host, "requests": h["requests"], "errors": h["errors"], "bytes": h["bytes"],
+                          "seconds": round(h["seconds"], 3), "ttfb_p95": round(quantile(ttfb, 0.95), 4)})
+        hosts.sort(key=lambda h: h["seconds"], reverse=True)
+        gauges = {name: {"max": s["max"], "mean": round(s["sum"] / s["n"], 2) if s["n"] else 0.0}
+                  for name, s in self.gauge_stats.items()}
+        return {
+            "name": self.name,
+            "started": self.started,
+            "wall_seconds": round(time.time() - self.started, 3),
+            "phases": {k: round(v, 3) for k, v in self.phases.items()},
+            "counters": dict(self.counters),
+            "requests": {stage: dist(self.samples[stage]) for stage in STAGES},
+            "dns": dist(self.dns_samples),
+            "gauges": gauges,
+            "slowest_hosts": hosts[:slowest],
+            **self.info,
+        }
+
+    def prometheus(self) -> str:
+        s = self.summary()
+        p = self.name
+        lines = [f"# TYPE {p}_phase_seconds gauge"]
+        lines += [f'{p}_phase_seconds{{phase="{k}"}} {v}' for k, v in s["phases"].items()]
+        lines.append(f"# TYPE {p}_request_seconds summary")
+        for stage, d in s["requests"].items():
+            lines += [f'{p}_request_seconds{{stage="{stage}",quantile="{q}"}} {d[f"p{int(q * 100)}"]}'
+                      for q in QUANTILES]
+            lines.append(f'{p}_request_seconds_count{{stage="{stage}"}} {d["count"]}')
+        lines.append(f"# TYPE {p}_dns_seconds summary")
+        lines += [f'{p}_dns_seconds{{quantile="{q}"}} {s["dns"][f"p{int(q * 100)}"]}' for q in QUANTILES]
+        lines.append(f'{p}_dns_seconds_count {s["dns"]["count"]}')
+        for name, value in s["counters"].items():
+            lines.append(f"# TYPE {p}_{name}_total counter")
+            lines.append(f"{p}_{name}_total {value}")
+        for name, g in s["gauges"].items():
+            lines.append(f"# TYPE {p}_{name} gauge")
+            lines.append(f'{p}_{name}{{stat="max"}} {g["max"]}')
+            lines.append(f'{p}_{name}{{stat="mean"}} {g["mean"]}')
+        for key, value in s.items():
+            if isinstance(value, (int, float)) and key not in ("started",):
+                lines.append(f"{p}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, out_dir: str | Path = METRICS_DIR) -> tuple[Path, Path]:
+        out = Path(out_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        json_path, prom_path = out / f"{self.name}_metrics.json", out / f"{self.name}_metrics.prom"
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(prom_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        return json_path, prom_path
+
+    def report(self) -> str:
+        s = self.summary(slowest=5)
+        lines = ["Phases: " + ", ".join(f"{k} {v:.1f}s" for k, v in s["phases"].items())]
+        r = s["requests"]
+        lines.append("Requests: " + ", ".join(f"{stage} p50 {r[stage]['p50'] * 1000:.0f}ms / p95 "
+                                              f"{r[stage]['p95'] * 1000:.0f}ms" for stage in ("connect", "tls", "ttfb", "total")))
+        lines.append(f"DNS: {s['dns']['count']} lookups, p50 {s['dns']['p50'] * 1000:.0f}ms / "
+                     f"p95 {s['dns']['p95'] * 1000:.0f}ms; {s['counters'].get('bytes', 0) / 1e6:.1f} MB received")
+        if s["gauges"]:
+            lines.append("Queues: " + ", ".join(f"{k} max {g['max']:.0f} mean {g['mean']}"
+                                                for k, g in s["gauges"].items()))
+        for h in s["slowest_hosts"]:
+            lines.append(f"  {h['host']}: {h['seconds']:.1f}s over {h['requests']} requests, "
+                         f"TTFB p95 {h['ttfb_p95'] * 1000:.0f}ms")
+        return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def profiled(path: str | Path | None):
+    """cProfile the block and dump pstats to path (load with snakeviz, or flameprof for a flame graph)."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(str(path))
+        print(f"Profile written to {path}")
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""Lease-based work queue in SQLite for spreading site analysis over many workers.
+
+Workers (processes, or machines sharing the file) each lease the most
+expensive job still waiting, so big sites start first and small ones fill in
+the gaps at the end; total time then tracks total work divided by workers
+rather than the slowest fixed chunk. A lease that isn't completed or renewed
+before it expires (a crashed worker) goes back on the queue. Job durations
+are kept, so the next run is weighted by how long each site actually took.
+"""
+import argparse
+import json
+import os
+import shlex
+import socket
+import sqlite3
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+QUEUE_PATH = "data/queue/jobs.sqlite"
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+# Fallback cost when nothing is known about a site
+DEFAULT_PAGES = 50
+SECONDS_PER_PAGE = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    cost REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_pending ON jobs(state, cost DESC);
+"""
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and it went back on the queue; another worker may hold it now."""
+
+
+@dataclass
+class Job:
+    key: str
+    payload: dict
+    cost: float
+    attempts: int
+    # Who holds the lease; renew/complete/fail only touch the job while it still does
+    worker: str | None = None
+    # Set once a renewal finds the lease gone, so the handler can stop
+    lost: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class JobQueue:
+    """One handle per worker; every state change is a short IMMEDIATE transaction."""
+
+    def __init__(self, path: str | Path = QUEUE_PATH, lease_seconds: float = LEASE_SECONDS,
+                 max_attempts: int = MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # Autocommit; transactions are opened explicitly so leasing is atomic
+        self.db = sqlite3.connect(self.path, timeout=60.0, isolation_level=None, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _tx(self, sql: str, params=()) -> tuple[list[sqlite3.Row], int]:
+        """Run one statement in its own write transaction; returns (rows, rowcount)."""
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self.db.execute(sql, params)
+                rows = cur.fetchall()
+                self.db.execute("COMMIT")
+                return rows, cur.rowcount
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def _read(self, sql: str, params=()) -> list[sqlite3.Row]:
+        with self._lock:
+            return self.db.execute(sql, params).fetchall()
+
+    def enqueue(self, key: str, payload: dict, estimate: float | None = None) -> None:
+        """Add or re-arm a job, costed by its last measured duration, else ``estimate`` (seconds).
+
+        Only finished (done or failed) jobs are re-armed; one that is queued or
+        leased already is left as it is, so a worker mid-run keeps its lease.
+        """
+        with self._lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute("SELECT duration FROM jobs WHERE key=?", (key,)).fetchone()
+                cost = (row["duration"] if row and row["duration"] else None) or estimate \
+                    or DEFAULT_PAGES * SECONDS_PER_PAGE
+                self.db.execute("""
+                    INSERT INTO jobs (key, payload, cost) VALUES (?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET payload=excluded.payload, cost=excluded.cost,
+                        state='queued', worker=NULL, lease_expires=NULL, attempts=0, error=NULL,
+                        started=NULL, finished=NULL
+                    WHERE jobs.state IN ('done', 'failed')""",
+                                (key, json.dumps(payload), cost))
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def requeue_expired(self) -> int:
+        """Put jobs whose lease ran out back in the queue (or fail them after max_attempts)."""
+        now = time.time()
+        failed = self._tx("UPDATE jobs SET state='failed', error='lease expired', worker=NULL "
+                          "WHERE state='leased' AND lease_expires < ? AND attempts >= ?",
+                          (now, self.max_attempts))[1]
+        return self._tx("UPDATE jobs SET state='queued', worker=NULL, lease_expires=NULL "
+                        "WHERE state='leased' AND lease_expires < ?", (now,))[1] + failed
+
+    def lease(self, worker: str | None = None) -> Job | None:
+        """Claim the costliest queued job (longest-processing-time first), or None when drained."""
+        self.requeue_expired()
+        now = time.time()
+        rows, _ = self._tx("""
+            UPDATE jobs SET state='leased', worker=?, lease_expires=?, attempts=attempts + 1,
+                            started=?
+            WHERE key = (SELECT key FROM jobs WHERE state='queued' ORDER BY cost DESC, key LIMIT 1)
+            RETURNING key, payload, cost, attempts, worker""",
+                       (worker or worker_id(), now + self.lease_seconds, now))
+        if not rows:
+            return None
+        row = rows[0]
+        return Job(row["key"], json.loads(row["payload"]), row["cost"], row["attempts"], row["worker"])
+
+    # The updates below match on the lease holder as well as the key, so a worker
+    # whose lease expired can't overwrite the job once someone else has it
+
+    def renew(self, job: Job) -> bool:
+        """Extend the lease; False (and job.lost set) if this worker no longer holds it."""
+        renewed = self._tx("UPDATE jobs SET lease_expires=? WHERE key=? AND worker=? AND state='leased'",
+                           (time.time() + self.lease_seconds, job.key, job.worker))[1] == 1
+        if not renewed:
+            job.lost.set()
+        return renewed
+
+    def complete(self, job: Job) -> bool:
+        """Mark the job done; False if the lease was lost and nothing was recorded."""
+        now = time.time()
+        return self._tx("UPDATE jobs SET state='done', finished=?, duration=? - started, lease_expires=NULL, "
+                        "error=NULL WHERE key=? AND worker=? AND state='leased'",
+                        (now, now, job.key, job.worker))[1] == 1
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Record a failure; the job is retried until it has used max_attempts.
+
+        False if the lease was lost and nothing was recorded.
+        """
+        return self._tx("UPDATE jobs SET state=CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                        "worker=NULL, lease_expires=NULL, error=? WHERE key=? AND worker=? AND state='leased'",
+                        (self.max_attempts, error[:2000], job.key, job.worker))[1] == 1
+
+    def pending(self) -> bool:
+        return bool(self._read("SELECT 1 FROM jobs WHERE state IN ('queued', 'leased') LIMIT 1"))
+
+    def progress(self) -> dict:
+        rows = self._read("SELECT state, COUNT(*) AS n, SUM(cost) AS cost FROM jobs GROUP BY state")
+        by_state = {r["state"]: (r["n"], r["cost"] or 0.0) for r in rows}
+        total = sum(n for n, _ in by_state.values())
+        total_cost = sum(c for _, c in by_state.values())
+        done_cost = by_state.get("done", (0, 0.0))[1] + by_state.get("failed", (0, 0.0))[1]
+        workers = self._read("SELECT COUNT(DISTINCT worker) FROM jobs WHERE state='leased'")[0][0]
+        first = self._read("SELECT MIN(started) FROM jobs WHERE started IS NOT NULL")[0][0]
+        eta = None
+        if first and done_cost:
+            elapsed = time.time() - first
+            eta = elapsed / done_cost * (total_cost - done_cost)
+        return {"total": total, **{state: n for state, (n, _) in by_state.items()},
+                "cost_done": round(done_cost, 1), "cost_total": round(total_cost, 1),
+                "active_workers": workers, "eta_seconds": round(eta) if eta is not None else None}
+
+    def report(self) -> str:
+        p = self.progress()
+        pct = p["cost_done"] / p["cost_total"] if p["cost_total"] else 0.0
+        eta = f", ~{p['eta_seconds'] // 60}m left" if p["eta_seconds"] is not None else ""
+        return (f"{p.get('done', 0)}/{p['total']} done, {p.get('leased', 0)} running on "
+                f"{p['active_workers']} workers, {p.get('queued', 0)} queued, {p.get('failed', 0)} failed "
+                f"({pct:.0%} of estimated work{eta})")
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def run_worker(queue: JobQueue, handler, worker: str | None = None, poll: float = 5.0) -> int:
+    """Lease and run jobs until the queue is drained; returns how many this worker finished.
+
+    The lease is renewed in the background while ``handler(job)`` runs, so only
+    a dead worker's jobs expire. If a renewal finds the lease gone anyway (the
+    worker stalled past it), ``job.lost`` is set for the handler to stop on, and
+    whatever the handler ends with is dropped: the job belongs to whoever
+    leased it next.
+    """
+    worker = worker or worker_id()
+    finished = 0
+    while True:
+        job = queue.lease(worker)
+        if job is None:
+            if not queue.pending():
+                return finished
+            # Others still hold leases that may expire; wait and look again
+            time.sleep(poll)
+            continue
+        stop = threading.Event()
+
+        def keep_alive():
+            while not stop.wait(queue.lease_seconds / 3):
+                if not queue.renew(job):
+                    return
+
+        renewer = threading.Thread(target=keep_alive, daemon=True)
+        renewer.start()
+        try:
+            handler(job)
+        except Exception as e:
+            if queue.fail(job, f"{type(e).__name__}: {e}"):
+                print(f"[{worker}] {job.key} failed (attempt {job.attempts}): {e}")
+            else:
+                print(f"[{worker}] {job.key} lease lost; dropped")
+        else:
+            if queue.complete(job):
+                finished += 1
+                print(f"[{worker}] {job.key} done; {queue.report()}")
+            else:
+                print(f"[{worker}] {job.key} lease lost; result dropped")
+        finally:
+            stop.set()
+            renewer.join()
+
+
+def command_handler(template: str, poll: float = 1.0):
+    """Handler running a shell command per job; {url}, {host} and {key} are filled in.
+
+    The command is killed if the job's lease is lost while it runs.
+    """
+    def handler(job: Job):
+        fields = {k: shlex.quote(str(v)) for k, v in job.payload.items()}
+        fields["key"] = shlex.quote(job.key)
+        command = template.format(**fields)
+        with subprocess.Popen(command, shell=True) as proc:
+            while True:
+                try:
+                    proc.wait(timeout=poll)
+                    break
+                except subprocess.TimeoutExpired:
+                    if job.lost.is_set():
+                        proc.kill()
+                        raise LeaseLost(job.key)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, command)
+    return handler
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Work on (or inspect) the site analysis queue")
+    ap.add_argument("--queue", default=QUEUE_PATH, help="queue database shared by all workers")
+    sub = ap.add_subparsers(dest="command", required=True)
+    work = sub.add_parser("work", help="lease and process jobs until the queue is empty")
+    work.add_argument("run", help="command per site, e.g. 'your-agent-tool --url {url}'")
+    work.add_argument("--lease", type=float, default=LEASE_SECONDS, help="lease length in seconds")
+    sub.add_parser("status", help="print progress")
+    sub.add_parser("requeue", help="return expired leases to the queue now")
+    args = ap.parse_args()
+
+    queue = JobQueue(args.queue, lease_seconds=getattr(args, "lease", LEASE_SECONDS))
+    if args.command == "work":
+        n = run_worker(queue, command_handler(args.run))
+        print(f"Worker finished {n} jobs; {queue.report()}")
+    elif args.command == "requeue":
+        print(f"Requeued {queue.requeue_expired()} jobs")
+    print(queue.report())
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""Link graph of every crawled page, for URL-structure and link-rewriting work (plan task 4.1).
+
+URLs and hosts are interned to integer ids and edges stored CSR-style in
+``array`` buffers: an offsets array per node plus flat target and flag
+arrays, once by source (outbound) and once by target (inbound). An edge
+costs 10 bytes for both directions, so millions fit in memory. Each edge
+records whether the link was written as an absolute URL. Those are the
+ones that break when a site changes domain, since relative links move
+with the site.
+
+    python scripts/link_graph.py build             # parse the crawl, save data/links/links.graph
+    python scripts/link_graph.py report            # hard-coded, broken, redirected and top inbound links
+    python scripts/link_graph.py inbound URL
+    python scripts/link_graph.py rewrite https://resmed.de   # pages to edit if it moves
+"""
+import argparse
+import csv
+import heapq
+import json
+import os
+import sqlite3
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from host_rules import is_resmed_url
+from pool_map import bounded_map
+from redirect_graph import root_of
+from site_crawler import STATE_PATH, LinkExtractor, normalize_url
+
+GRAPH_PATH = "data/links/links.graph"
+# Edge flags
+ABSOLUTE = 1
+# Node status: crawled pages keep their HTTP status; these mark the rest
+NOT_CRAWLED = -1
+FAILED = 0
+MAGIC = b"LINKGRAPH1\n"
+
+
+def extract_page_links(job) -> tuple[str, str, list[tuple[str, int]]]:
+    """(page URL, final URL, [(target, flags)]) for one stored page; runs in a worker process."""
+    url, final_url, html = job
+    parser = LinkExtractor()
+    try:
+        parser.feed(zlib.decompress(html).decode("utf-8", errors="replace"))
+        parser.close()
+    except Exception:
+        pass
+    base = final_url or url
+    if parser.base:
+        base = urljoin(base, parser.base)
+    targets: dict[str, int] = {}
+    for href in parser.links:
+        if href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            continue
+        target = normalize_url(urljoin(base, href))
+        if target:
+            absolute = ABSOLUTE if href.lower().startswith(("http:", "https:", "//")) else 0
+            targets[target] = targets.get(target, 0) | absolute
+    return url, final_url, list(targets.items())
+
+
+def _csr(n: int, keys: array, values: array, flags: array) -> tuple[array, array, array]:
+    """Counting sort of (key, value, flag) edges into offsets/values/flags arrays."""
+    offsets = array("I", [0]) * (n + 1)
+    for k in keys:
+        offsets[k + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    cursor = array("I", offsets[:-1])
+    out_values = array("I", [0]) * len(keys)
+    out_flags = array("B", [0]) * len(keys)
+    for k, v, f in zip(keys, values, flags):
+        i = cursor[k]
+        out_values[i] = v
+        out_flags[i] = f
+        cursor[k] = i + 1
+    return offsets, out_values, out_flags
+
+
+class LinkGraph:
+    """Interned URLs and hosts with outbound and inbound CSR adjacency."""
+
+    def __init__(self):
+        self.urls: list[str] = []
+        self.index: dict[str, int] = {}
+        self.hosts: list[str] = []
+        self.host_index: dict[str, int] = {}
+        self.node_host = array("I")
+        self.status = array("h")
+        # Crawled URL -> where it redirected, for links that go through a redirect
+        self.redirects: dict[int, int] = {}
+        self.out_offsets = array("I", [0])
+        self.out_targets = array("I")
+        self.out_flags = array("B")
+        self.in_offsets = array("I", [0])
+        self.in_sources = array("I")
+        self.in_flags = array("B")
+
+    # Building
+
+    def intern(self, url: str) -> int:
+        i = self.index.get(url)
+        if i is None:
+            i = self.index[url] = len(self.urls)
+            self.urls.append(url)
+            host = urlsplit(url).hostname or ""
+            h = self.host_index.get(host)
+            if h is None:
+                h = self.host_index[host] = len(self.hosts)
+                self.hosts.append(host)
+            self.node_host.append(h)
+            self.status.append(NOT_CRAWLED)
+        return i
+
+    @classmethod
+    def from_crawl(cls, crawl_db: sqlite3.Connection, workers: int | None = None) -> "LinkGraph":
+        g = cls()
+        for row in crawl_db.execute("SELECT url, state, status, final_url FROM pages WHERE state != 'queued'"):
+            i = g.intern(row[0])
+            g.status[i] = row[2] if row[1] == "done" and row[2] is not None else FAILED
+            final = normalize_url(row[3]) if row[3] else None
+            if final and final != row[0]:
+                g.redirects[i] = g.intern(final)
+        src, dst, flags = array("I"), array("I"), array("B")
+        jobs = crawl_db.execute("SELECT url, final_url, html FROM pages WHERE html IS NOT NULL")
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for url, _, targets in bounded_map(pool, extract_page_links, (tuple(r) for r in jobs), workers):
+                s = g.intern(url)
+                for target, f in targets:
+                    src.append(s)
+                    dst.append(g.intern(target))
+                    flags.append(f)
+        g.out_offsets, g.out_targets, g.out_flags = _csr(len(g.urls), src, dst, flags)
+        g.in_offsets, g.in_sources, g.in_flags = _csr(len(g.urls), dst, src, flags)
+        return g
+
+    # Persistence: a JSON header line, the interned strings, then the raw arrays
+
+    ARRAYS = ("node_host", "status", "out_offsets", "out_targets", "out_flags",
+              "in_offsets", "in_sources", "in_flags")
+
+    def save(self, path: str | Path = GRAPH_PATH) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        strings = zlib.compress("\n".join(self.urls + self.hosts).encode("utf-8"))
+        redirects = array("I", [x for pair in self.redirects.items() for x in pair])
+        header = {"urls": len(self.urls), "hosts": len(self.hosts), "strings": len(strings),
+                  "redirects": len(redirects), **{name: len(getattr(self, name)) for name in self.ARRAYS}}
+        with open(path, "wb") as f:
+            f.write(MAGIC + json.dumps(header).encode() + b"\n")
+            f.write(strings)
+            redirects.tofile(f)
+            for name in self.ARRAYS:
+                getattr(self, name).tofile(f)
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path = GRAPH_PATH) -> "LinkGraph":
+        g = cls()
+        with open(path, "rb") as f:
+            if f.readline() != MAGIC:
+                raise ValueError(f"{path} is not a link graph")
+            header = json.loads(f.readline())
+            strings = zlib.decompress(f.read(header["strings"])).decode("utf-8").split("\n")
+            g.urls, g.hosts = strings[:header["urls"]], strings[header["urls"]:]
+            g.index = {u: i for i, u in enumerate(g.urls)}
+            g.host_index = {h: i for i, h in enumerate(g.hosts)}
+            redirects = array("I")
+            redirects.fromfile(f, header["redirects"])
+            g.redirects = dict(zip(redirects[::2], redirects[1::2]))
+            for name in cls.ARRAYS:
+                a = array(getattr(g, name).typecode)
+                a.fromfile(f, header[name])
+                setattr(g, name, a)
+        return g
+
+    # Queries
+
+    @property
+    def edges(self) -> int:
+        return len(self.out_targets)
+
+    def host_of(self, i: int) -> str:
+        return self.hosts[self.node_host[i]]
+
+    def outbound(self, url: str) -> list[tuple[str, bool]]:
+        i = self.index.get(normalize_url(url) or url)
+        if i is None:
+            return []
+        lo, hi = self.out_offsets[i], self.out_offsets[i + 1]
+        return [(self.urls[t], bool(f & ABSOLUTE)) for t, f in zip(self.out_targets[lo:hi], self.out_flags[lo:hi])]
+
+    def inbound(self, url: str) -> list[tuple[str, bool]]:
+        i = self.index.get(normalize_url(url) or url)
+        if i is None:
+            return []
+        lo, hi = self.in_offsets[i], self.in_offsets[i + 1]
+        return [(self.urls[s], bool(f & ABSOLUTE)) for s, f in zip(self.in_sources[lo:hi], self.in_flags[lo:hi])]
+
+    def inbound_counts(self, top: int = 50) -> list[tuple[str, int]]:
+        offsets = self.in_offsets
+        counts = heapq.nlargest(top, ((offsets[i + 1] - offsets[i], i) for i in range(len(self.urls))))
+        return [(self.urls[i], n) for n, i in counts if n]
+
+    def iter_edges(self):
+        """(source id, target id, flags) for every edge, grouped by source."""
+        offsets, targets, flags = self.out_offsets, self.out_targets, self.out_flags
+        for s in range(len(self.urls)):
+            for e in range(offsets[s], offsets[s + 1]):
+                yield s, targets[e], flags[e]
+
+    def hardcoded_cross_links(self):
+        """(source, target) for absolute links from one ResMed host to another ResMed host."""
+        resmed = [is_resmed_url(f"https://{h}/") for h in self.hosts]
+        node_host = self.node_host
+        for s, t, f in self.iter_edges():
+            hs, ht = node_host[s], node_host[t]
+            if f & ABSOLUTE and hs != ht and resmed[hs] and resmed[ht]:
+                yield self.urls[s], self.urls[t]
+
+    def broken(self):
+        """(target, status, [sources]) for every crawled target that failed or answered >= 400."""
+        for t, status in enumerate(self.status):
+            if status == FAILED or status >= 400:
+                lo, hi = self.in_offsets[t], self.in_offsets[t + 1]
+                if hi > lo:
+                    yield self.urls[t], status, [self.urls[s] for s in self.in_sources[lo:hi]]
+
+    def through_redirects(self, aliases: dict[str, str] | None = None):
+        """(source, target, where it ends up) for links to a URL that redirects.
+
+        Covers crawled URLs seen redirecting, plus any URL on an alias root from
+        resmed_redirects.csv (``aliases``: alias root -> canonical root).
+        """
+        aliases = aliases or {}
+        for s, t, _ in self.iter_edges():
+            if t in self.redirects:
+                yield self.urls[s], self.urls[t], self.urls[self.redirects[t]]
+                continue
+            url = self.urls[t]
+            root = root_of(url)
+            if root in aliases:
+                yield self.urls[s], url, aliases[root] + url[len(root):]
+
+    def rewrite_for(self, old: str) -> list[tuple[str, str]]:
+        """Pages to edit if ``old`` moves: (source page, linked URL), sorted.
+
+        A bare root (scheme://host) means the whole host moves, so only absolute
+        links from other pages count; relative links on the host itself move with
+        it. A full URL means that one page moves, and every link to it counts.
+        """
+        parts = urlsplit(old)
+        if parts.path in ("", "/") and not parts.query:
+            h = self.host_index.get(parts.hostname or "")
+            if h is None:
+                return []
+            targets = [i for i in range(len(self.urls)) if self.node_host[i] == h]
+            absolute_only = True
+        else:
+            i = self.index.get(normalize_url(old) or old)
+            targets = [i] if i is not None else []
+            absolute_only = False
+        out = []
+        for t in targets:
+            for e in range(self.in_offsets[t], self.in_offsets[t + 1]):
+                if not absolute_only or self.in_flags[e] & ABSOLUTE:
+                    out.append((self.urls[self.in_sources[e]], self.urls[t]))
+        return sorted(out)
+
+
+def load_aliases(path: str | Path) -> dict[str, str]:
+    """alias root -> canonical root from resmed_redirects.csv, if it exists."""
+    if not Path(path).exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return {row["alias"]: row["canonical"] for row in csv.DictReader(f)}
+
+
+def report(g: LinkGraph, out_dir: str | Path, aliases: dict[str, str]) -> None:
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    n_hard = n_broken = n_redirected = 0
+    with open(out / "links_hardcoded.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["source", "target"])
+        for row in g.hardcoded_cross_links():
+            w.writerow(row)
+            n_hard += 1
+    with open(out / "links_broken.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["target", "status", "inbound", "sources"])
+        for target, status, sources in g.broken():
+            w.writerow([target, status or "failed", len(sources), " ".join(sources[:20])])
+            n_broken += 1
+    with open(out / "links_redirected.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["source", "target", "resolves_to"])
+        for row in g.through_redirects(aliases):
+            w.writerow(row)
+            n_redirected += 1
+    with open(out / "links_inbound.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["url", "inbound"])
+        w.writerows(g.inbound_counts(top=1000))
+    print(f"{len(g.urls)} URLs on {len(g.hosts)} hosts, {g.edges} links")
+    print(f"  {n_hard} hard-coded links between ResMed domains, {n_broken} broken targets, "
+          f"{n_redirected} links through redirects")
+    print(f"Reports written to {out}/links_*.csv")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build and query the cross-site link graph")
+    ap.add_argument("--graph", default=GRAPH_PATH, help="saved graph file")
+    sub = ap.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="parse the crawl's stored HTML into a graph")
+    build.add_argument("--state", default=STATE_PATH, help="crawl state database from site_crawler.py")
+    build.add_argument("--workers", type=int, default=None, help="parser processes (default: all cores)")
+    rep = sub.add_parser("report", help="write links_*.csv next to the graph")
+    rep.add_argument("--redirects", default="resmed_redirects.csv", help="alias map from resmed_catalog.py")
+    sub.add_parser("inbound", help="pages linking to a URL").add_argument("url")
+    sub.add_parser("rewrite", help="pages to edit if a URL or whole root moves").add_argument("url")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        crawl = sqlite3.connect(args.state)
+        g = LinkGraph.from_crawl(crawl, args.workers)
+        crawl.close()
+        path = g.save(args.graph)
+        print(f"{len(g.urls)} URLs, {g.edges} links saved to {path}")
+        return
+    g = LinkGraph.load(args.graph)
+    if args.command == "report":
+        report(g, Path(args.graph).parent, load_aliases(args.redirects))
+    elif args.command == "inbound":
+        for source, absolute in g.inbound(args.url):
+            print(f"{source}{'  (absolute)' if absolute else ''}")
+    elif args.command == "rewrite":
+        rows = g.rewrite_for(args.url)
+        for source, target in rows:
+            print(f"{source} -> {target}")
+        print(f"{len(rows)} links on {len({s for s, _ in rows})} pages")
+
+
+if __name__ == "__main__":
+    main()
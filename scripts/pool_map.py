@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""Process-pool map that reads its input as it goes.
+
+ProcessPoolExecutor.map submits every job before yielding the first result,
+so mapping over a crawl's pages holds all of their HTML in memory at once.
+bounded_map submits jobs in batches and keeps only a few batches per worker
+in flight, taking more from the iterable as results are consumed.
+"""
+from collections import deque
+from concurrent.futures import Executor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Jobs per task; batches keep pickling overhead small relative to parsing
+CHUNKSIZE = 16
+# Batches in flight per worker, so no worker waits for the next one
+IN_FLIGHT = 2
+
+
+def _run_batch(fn: Callable[[T], R], batch: list[T]) -> list[R]:
+    return [fn(job) for job in batch]
+
+
+def bounded_map(pool: Executor, fn: Callable[[T], R], jobs: Iterable[T], workers: int,
+                chunksize: int = CHUNKSIZE) -> Iterator[R]:
+    """fn over jobs on the pool; results come back in input order."""
+    jobs = iter(jobs)
+    pending = deque()
+    while batch := list(islice(jobs, chunksize)):
+        pending.append(pool.submit(_run_batch, fn, batch))
+        if len(pending) >= IN_FLIGHT * workers:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Per-host pacing for the shared session: token bucket, AIMD concurrency, retry backoff.
+
+Every host gets a request-rate bucket and a concurrency limit that grows by
+one slot per window of clean responses and halves on a 429/503, a timeout or
+a latency spike (additive increase, multiplicative decrease, as TCP does).
+A Retry-After header pauses the whole host until it has passed. Together
+these find the fastest rate a CDN edge tolerates instead of a fixed cap that
+is either too slow or gets the run throttled.
+"""
+import asyncio
+import contextlib
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+RETRY_STATUSES = {429, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+
+
+def retry_after(value: str | None, now: float | None = None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when - (now if now is not None else time.time()))
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class TokenBucket:
+    """Smooths request starts to ``rate`` per second with bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HostLimiter:
+    """Rate, concurrency and cool-down state for one host."""
+
+    def __init__(self, limit: int = 6, max_limit: int = 32, rate: float = 10.0, max_rate: float = 50.0,
+                 min_rate: float = 0.2, slow_factor: float = 4.0):
+        self.limit = float(limit)
+        self.max_limit = max_limit
+        self.max_rate = max(max_rate, rate)
+        self.min_rate = min_rate
+        self.slow_factor = slow_factor
+        self.bucket = TokenBucket(rate, burst=max(1, limit))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency: float | None = None   # EWMA of response time
+        self.baseline: float | None = None  # best latency seen; what "uncongested" looks like
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        try:
+            while (wait := self.paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(wait)
+            await self.bucket.acquire()
+            yield
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def _notify(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    def on_success(self, elapsed: float) -> None:
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+        self.baseline = elapsed if self.baseline is None else min(self.baseline, elapsed)
+        if self.latency > max(1.0, self.slow_factor * self.baseline):
+            # Queueing at the origin shows up as latency before it shows up as 429s
+            self.on_congestion()
+            return
+        # +1 slot per window of `limit` good responses, +1 req/s per second's worth
+        grew = int(self.limit)
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + 1 / self.bucket.rate)
+        self.bucket.burst = max(1.0, self.limit)
+        if int(self.limit) > grew:
+            asyncio.get_running_loop().create_task(self._notify())
+
+    def on_congestion(self) -> None:
+        now = time.monotonic()
+        # One cut per round trip: a burst of 429s from the same window is one signal
+        if now - self._last_decrease < (self.latency or 1.0):
+            return
+        self._last_decrease = now
+        self.decreases += 1
+        self.limit = max(1.0, self.limit / 2)
+        self.bucket.rate = max(self.min_rate, self.bucket.rate / 2)
+        self.bucket.burst = max(1.0, self.limit)
+        # Let the latency estimate re-converge at the lower rate
+        self.latency = self.baseline
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Redirect graph over site roots: which hosts are aliases of which canonical site.
+
+Every fetched page contributes its redirect chain (request URL, each hop in
+the response history, final URL). Roots joined by a chain are merged with
+union-find, always keeping the end of the chain as the set's representative,
+so find() gives the canonical site for any alias however it was reached, and
+in whatever order the chains arrived.
+"""
+import re
+
+
+def root_of(url: str) -> str:
+    """scheme://host of a URL, lower-cased so a host matches however it was written."""
+    m = re.match(r"^(https?://[^/]+)", url)
+    return m.group(1).rstrip("/").lower() if m else url
+
+
+class RedirectGraph:
+    """Union-find of roots plus, per alias, the URL its chain landed on."""
+
+    def __init__(self):
+        self.parent: dict[str, str] = {}
+        # alias root -> final URL (with path) of the first chain it appeared in
+        self.landing: dict[str, str] = {}
+        # canonical roots whose page has been fetched
+        self.cataloged: set[str] = set()
+
+    def find(self, root: str) -> str:
+        parent = self.parent
+        top = root
+        while parent.get(top, top) != top:
+            top = parent[top]
+        # Path compression: point everything on the way straight at the top
+        while root != top:
+            parent[root], root = top, parent[root]
+        return top
+
+    def union(self, alias: str, target: str) -> None:
+        a, t = self.find(alias), self.find(target)
+        if a != t:
+            # The chain's end stays representative; a cycle (a -> t -> a) is a no-op
+            self.parent[a] = t
+
+    def add_chain(self, urls: list[str]) -> str:
+        """Record one fetch's redirect chain; returns the canonical root it ends at."""
+        final = urls[-1]
+        end = root_of(final)
+        for url in urls[:-1]:
+            root = root_of(url)
+            if root != end:
+                self.union(root, end)
+                self.landing.setdefault(root, final)
+        return self.find(end)
+
+    def canonical(self, url: str) -> str:
+        return self.find(root_of(url))
+
+    def is_alias(self, url: str) -> bool:
+        root = root_of(url)
+        return self.find(root) != root
+
+    def mark(self, url: str) -> None:
+        """The canonical site behind url has been cataloged."""
+        self.cataloged.add(self.canonical(url))
+
+    def covered(self, url: str) -> bool:
+        """url's canonical site is already cataloged, so fetching url would add nothing."""
+        return self.canonical(url) in self.cataloged
+
+    def aliases(self) -> list[tuple[str, str, str]]:
+        """(alias, canonical, landing URL) for every alias, sorted."""
+        return sorted((alias, self.find(alias), self.landing.get(alias, ""))
+                      for alias in self.parent if self.find(alias) != alias)
@@ -1,8 +1,20 @@
 #!/usr/bin/env python3
-import asyncio, httpx, re, csv, socket, json
-from parsel import Selector
-import tldextract
-import dns.resolver
+import argparse, asyncio, httpx, re, csv, json
+from urllib.parse import urljoin
+from collections import Counter
+from functools import cache
+from pathlib import Path
+from dns_engine import DNSEngine
+from http_cache import ResponseCache, DEFAULT_PATH as CACHE_PATH
+from http_session import HEADERS, CatalogSession
+from rate_limit import THROTTLE_STATUSES
+from instrumentation import METRICS_DIR, RunMetrics, profiled
+from host_rules import default_classifier, is_resmed_url
+from ct_ingest import CT_URL, CTHosts, read_dump, stream_url
+from subdomain_brute import BRUTE_CONCURRENCY, BruteDNS, SubdomainBrute
+from redirect_graph import RedirectGraph, root_of
+from catalog_journal import CSV_FIELDS, JOURNAL_PATH, CatalogJournal, SiteRecord
+from root_frontier import FRONTIER_PATH, MAX_AGE_DAYS, MAX_DEPTH, SELECTOR, RootFrontier
 
 SELECTORS = [
     "https://ap.resmed.com/home/country-selector",        # APAC hub
@@ -27,55 +39,41 @@ TLDS = ["com", "org", "net", "co.uk", "com.au", "com.cn", "co.jp", "co.kr",
         "ca", "mx", "ar", "cl", "pe", "lat", "la", "asia", "ae", "sa", "qa", "eg",
         "za", "jp", "kr", "tw", "hk", "sg", "my", "th", "id", "ph", "vn", "in"]
 
-HEADERS = {"User-Agent":"Mozilla/5.0 (ResMedCatalogBot/1.0; +https://example.com/bot)"}
 TIMEOUT = httpx.Timeout(20.0)
-SEM = asyncio.Semaphore(20)
-
-def is_resmed_url(u:str)->bool:
-    return bool(re.match(r"^https?://[^/]*resmed\.[a-z\.]+(/|$)", u, re.I))
+# Shared by every phase: one cache, its own limit on in-flight queries
+DNS = DNSEngine(concurrency=200)
+# Phase and request timings for this run; exported when it finishes
+METRICS = RunMetrics("catalog")
+
+# Certificate Transparency source: a saved crt.sh response to read instead of
+# CT_URL, and where a live run saves its response for later offline runs
+CT_DUMP: str|None = None
+CT_SAVE: str|None = "data/cache/crt_sh.json.gz"
+
+# Pipeline sizing: queued roots/guesses before producers wait, and worker pools
+ROOT_QUEUE_SIZE = 1000
+CANDIDATE_QUEUE_SIZE = 1000
+CATALOG_WORKERS = 50
+DNS_WORKERS = 200
+# Seconds before hosts still throttled after retries get their second look
+RECHECK_DELAY = 30.0
+# Wordlist brute force (--wordlist); replaces the SUBDOMAINS guesses when set
+BRUTE: SubdomainBrute|None = None
+# Selector/hreflang discovery: hops followed from the selector pages, and
+# where found roots are kept so later runs only probe the frontier
+DISCOVERY_DEPTH = MAX_DEPTH
+FRONTIER_DB = FRONTIER_PATH
+FRONTIER_MAX_AGE = MAX_AGE_DAYS * 86400
+# A downloaded public suffix list here overrides tldextract's bundled snapshot;
+# either way, parsing a hostname never goes to the network
+SUFFIX_LIST = "data/cache/public_suffix_list.dat"
 
 def should_exclude(u:str)->bool:
-    """Exclude VPN, mail, admin, dev, stage/staging, API subdomains, and resmed.ca"""
-    host = re.sub(r"^https?://", "", u).split("/")[0].lower()
-
-    # Exclude all resmed.ca domains
-    if "resmed.ca" in host:
-        return True
-
-    # Check for excluded prefixes
-    excluded_prefixes = [
-        "vpn.", "mail.", "webmail.",
-        "admin.", "admin-",
-        "api.", "api-", "apim.", "apigateway",
-        "dev.", "dev-", "dev2-", "dev3-", "developer.",
-        "stage.", "staging.", "staging-",
-        "test.", "test-",
-        "uat.", "uat-", "uat2-",
-        "qa.", "qa-", "qa2-",
-        "sbx.", "-sbx.", "sandbox.",
-        "sit.", "-sit.",
-        "poc.", "-poc.",
-        "internal-",
-    ]
-
-    for prefix in excluded_prefixes:
-        if host.startswith(prefix) or f"-{prefix.rstrip('.-')}" in host:
-            return True
-
-    # Check for excluded keywords anywhere in hostname (substring match)
-    excluded_keywords = [
-        "dev", "uat", "test", "staging", "stage", "admin", "sandbox", "sbx", "sit", "qa", "poc",
-        "api", "backend", "analytics", "cognos", "portal"
-    ]
+    """Exclude VPN, mail, admin, dev, stage/staging, API subdomains, and resmed.ca
 
-    parts = host.split(".")
-    for part in parts:
-        # Check if any excluded keyword appears anywhere in this part
-        for keyword in excluded_keywords:
-            if keyword in part:
-                return True
-
-    return False
+    Rules are in host_rules.json; default_classifier().exclusion(u) says which one fired.
+    """
+    return default_classifier().exclusion(u) is not None
 
 def should_exclude_result(status:int|None, title:str|None, hosting:str|None, ip:str|None)->bool:
     """Exclude based on response characteristics"""
@@ -101,328 +99,432 @@ def norm_root(u:str)->str:
     return m.group(1).rstrip("/") if m else u
 
 def guess_hosting(headers:dict, cname_chain:list[str], ip:str|None=None)->str|None:
-    """Enhanced hosting/CDN provider detection"""
-    h = {k.lower():v for k,v in headers.items()}
-    server = h.get("server","").lower()
-    via = h.get("via","").lower()
-    powered_by = h.get("x-powered-by","").lower()
-    cname = " ".join(cname_chain).lower()
-
-    # Combine all signals
-    hay = f"{server} {via} {cname} {powered_by}".lower()
-
-    # CDNs (check first as they're most common)
-    if "cloudflare" in hay or "cf-ray" in h: return "Cloudflare"
-    if "akamai" in hay or "edgesuite.net" in hay or "akamaihd.net" in hay or "akamaiedge" in hay: return "Akamai"
-    if "fastly" in hay or "fastly.net" in hay: return "Fastly"
-    if "cloudfront" in hay or "cloudfront.net" in hay: return "Amazon CloudFront"
-
-    # E-commerce platforms
-    if "shopify" in hay or "myshopify.com" in hay: return "Shopify"
-    if "bigcommerce" in hay or "mybigcommerce.com" in hay: return "BigCommerce"
-    if "woocommerce" in powered_by: return "WooCommerce"
-
-    # CMS/Marketing platforms
-    if "hubspot" in hay or "hscoscdn" in hay or "hubspot.net" in hay: return "HubSpot"
-    if "wordpress.com" in hay or "wp.com" in hay: return "WordPress.com"
-    if "squarespace" in hay: return "Squarespace"
-    if "wix" in hay: return "Wix"
-    if "webflow" in hay: return "Webflow"
-    if "ghost" in hay: return "Ghost"
-
-    # Managed WordPress
-    if "wpengine" in hay or "wpenginepowered" in hay: return "WP Engine"
-    if "kinsta" in hay: return "Kinsta"
-    if "pantheon" in hay or "pantheonsite.io" in hay: return "Pantheon"
-    if "flywheel" in hay: return "Flywheel"
-
-    # PaaS/Hosting
-    if "vercel" in hay or "vercel-dns" in hay or "vercel.app" in hay: return "Vercel"
-    if "netlify" in hay or "netlify.app" in hay or "netlify.com" in hay: return "Netlify"
-    if "heroku" in hay or "herokuapp.com" in hay: return "Heroku"
-    if "aws" in hay or "amazon" in hay or "elastic" in hay: return "AWS"
-    if "azure" in hay or "azurewebsites" in hay or "windows" in hay: return "Microsoft Azure"
-    if "google" in hay or "gcp" in hay or "appspot" in hay: return "Google Cloud"
-    if "digitalocean" in hay: return "DigitalOcean"
-    if "linode" in hay: return "Linode"
-    if "vultr" in hay: return "Vultr"
-
-    # Enterprise/Other
-    if "equisolve" in hay: return "Q4 (Equisolve)"
-    if "q4web" in hay: return "Q4 Web Systems"
-    if "adobedc" in hay or "adobedtm" in hay or "omtrdc" in hay: return "Adobe Experience Cloud"
-    if "optimizely" in hay or "episerver" in hay: return "Optimizely"
-    if "sitecore" in hay: return "Sitecore"
-    if "acquia" in hay: return "Acquia"
-
-    # Web servers (only if no hosting platform detected)
-    if "nginx" in server: return "Nginx (self-hosted)"
-    if "apache" in server: return "Apache (self-hosted)"
-    if "iis" in server or "microsoft" in server: return "IIS (self-hosted)"
-    if "litespeed" in server: return "LiteSpeed (self-hosted)"
-
-    return None
-
-async def fetch(client:httpx.AsyncClient, url:str)->tuple[httpx.Response|None, str|None]:
-    """Fetch URL and return (response, final_url_after_redirects)"""
-    try:
-        r = await client.get(url, headers=HEADERS, timeout=TIMEOUT, follow_redirects=True)
-        final_url = str(r.url) if r else None
-        return (r, final_url)
-    except Exception:
-        return (None, None)
+    """Enhanced hosting/CDN provider detection (rules in host_rules.json)"""
+    rule = default_classifier().hosting_provider(headers, cname_chain)
+    return rule.name if rule else None
 
 async def resolve_cname_chain(host:str)->list[str]:
-    chain=[]
-    try:
-        # follow up to 5 CNAMEs
-        cur=host
-        for _ in range(5):
-            answers = dns.resolver.resolve(cur, 'CNAME')
-            cname=str(answers[0].target).rstrip(".")
-            chain.append(cname)
-            cur=cname
-    except Exception:
-        pass
-    return chain
+    return (await DNS.resolve(host)).cname_chain
 
 async def ip_to_org(host:str)->str|None:
-    try:
-        ip = socket.gethostbyname(host)
-        # quick-and-dirty ASN org hint via reverse name (works sometimes)
-        return ip
-    except Exception:
+    # quick-and-dirty ASN org hint via reverse name (works sometimes)
+    return (await DNS.resolve(host)).ip
+
+async def selector_links(session:CatalogSession, u:str)->list[str]|None:
+    """Every link on a country-selector page, absolute; None if it couldn't be fetched"""
+    from parsel import Selector
+    r, _ = await session.fetch(u)
+    if not r:
+        return None
+    sel = Selector(r.text)
+    return [urljoin(u, href) for href in (a.attrib.get("href","") for a in sel.css("a")) if href]
+
+async def hreflang_links(session:CatalogSession, root:str)->list[str]|None:
+    """The hreflang alternates a root declares; None if it couldn't be fetched"""
+    # Alternates live in <head>; don't download the rest of the page
+    head = await session.fetch_head(root)
+    if not head:
         return None
+    return [a for _, a in head.alternates]
 
-async def scrape_selectors()->set[str]:
-    roots=set()
-    async with httpx.AsyncClient(http2=True) as client:
-        for u in SELECTORS:
-            r, _ = await fetch(client,u)
-            if not r: continue
-            sel = Selector(r.text)
-            links = [a.attrib.get("href","") for a in sel.css("a")]
-            for L in links:
-                if L and is_resmed_url(L):
-                    roots.add(norm_root(L))
-    return roots
-
-async def expand_hreflang(roots:set[str])->set[tuple[str,str]]:
-    out=set()
-    async with httpx.AsyncClient(http2=True) as client:
-        async def worker(root):
-            async with SEM:
-                r, _ = await fetch(client, root)
-                if not r:
-                    out.add((root,"n"))
-                    return
-                sel = Selector(r.text)
-                alts = sel.xpath("//link[translate(@rel,'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz')='alternate' and @hreflang]/@href").getall()
-                found=False
-                for a in alts:
-                    if is_resmed_url(a):
-                        out.add((norm_root(a),"y"))
-                        found=True
-                out.add((root,"n" if not found else "n")) # keep root too
-        await asyncio.gather(*(worker(u) for u in roots))
-    return out
-
-async def query_crt_sh()->set[str]:
-    """Query Certificate Transparency logs via crt.sh for resmed domains"""
-    domains = set()
-    print("Querying Certificate Transparency logs...")
-    async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:
-        try:
-            # Query for %.resmed.com and %.resmed.%
-            r = await client.get("https://crt.sh/?q=%.resmed.com&output=json")
-            if r.status_code == 200:
-                data = r.json()
-                for entry in data:
-                    name = entry.get("name_value", "")
-                    for line in name.split("\n"):
-                        line = line.strip().lower()
-                        if "resmed." in line and not line.startswith("*"):
-                            # Extract domain, handle wildcards
-                            domain = line.replace("*.", "")
-                            if domain and not domain.startswith("."):
-                                domains.add(f"https://{domain}")
-            print(f"  Found {len(domains)} domains from crt.sh")
-        except Exception as e:
-            print(f"  Certificate Transparency query failed: {e}")
-    return domains
-
-async def enumerate_tlds()->set[str]:
+async def query_crt_sh(session:CatalogSession, emit)->None:
+    """Query Certificate Transparency logs via crt.sh for resmed domains
+
+    The response is decoded as it streams in and hosts are emitted as they are
+    first seen. A live run saves the raw response to CT_SAVE; --crt-dump (or an
+    offline run) reads such a file instead of the endpoint.
+    """
+    ct = CTHosts()
+    try:
+        if CT_DUMP or session.offline:
+            dump = CT_DUMP or CT_SAVE
+            if not dump or not Path(dump).exists():
+                print("  crt.sh: no saved CT dump to read offline")
+                return
+            chunks = read_dump(dump)
+        else:
+            chunks = stream_url(session, CT_URL, save_to=CT_SAVE, timeout=httpx.Timeout(30.0))
+        async for host in ct.ingest(chunks):
+            await emit(f"https://{host}")
+        print(f"  crt.sh: {len(ct.hosts)} hosts from {ct.entries} CT entries")
+    except Exception as e:
+        print(f"  Certificate Transparency query failed after {len(ct.hosts)} hosts: {e}")
+
+def enumerate_tlds():
     """Try common TLD variations of resmed"""
-    domains = set()
-    print("Enumerating TLD variations...")
     for tld in TLDS:
-        domains.add(f"https://resmed.{tld}")
-        domains.add(f"https://www.resmed.{tld}")
-    print(f"  Generated {len(domains)} TLD variations")
-    return domains
-
-async def enumerate_subdomains(base_domains:set[str])->set[str]:
-    """Try common subdomains on known domains"""
-    domains = set()
-    print("Enumerating subdomains...")
-    # Extract unique base domains (without subdomain)
-    bases = set()
-    for url in base_domains:
-        host = re.sub(r"^https?://", "", url).split("/")[0]
-        extracted = tldextract.extract(host)
-        if extracted.domain == "resmed":
-            base = f"{extracted.domain}.{extracted.suffix}"
-            bases.add(base)
-
-    # Try each subdomain on each base
-    for base in bases:
-        for sub in SUBDOMAINS:
-            domains.add(f"https://{sub}.{base}")
-
-    print(f"  Generated {len(domains)} subdomain combinations")
-    return domains
-
-async def check_domain_exists(client:httpx.AsyncClient, url:str)->str|None:
-    """Quick check if domain responds (HEAD request)"""
-    try:
-        host = re.sub(r"^https?://", "", url).split("/")[0]
-        # Try DNS lookup first (faster than HTTP)
-        socket.gethostbyname(host)
-        return url
-    except Exception:
-        return None
+        yield f"https://resmed.{tld}"
+        yield f"https://www.resmed.{tld}"
+
+@cache
+def suffix_extractor():
+    """tldextract over the local suffix list, loaded on first use"""
+    import tldextract
+    local = Path(SUFFIX_LIST)
+    urls = (local.resolve().as_uri(),) if local.exists() else ()
+    return tldextract.TLDExtract(cache_dir=None, suffix_list_urls=urls, fallback_to_snapshot=True)
+
+def base_domain(url:str)->str|None:
+    """resmed.<suffix> for a ResMed URL, None for anything else"""
+    host = re.sub(r"^https?://", "", url).split("/")[0]
+    extracted = suffix_extractor()(host)
+    if extracted.domain == "resmed":
+        return f"{extracted.domain}.{extracted.suffix}"
+    return None
 
-async def filter_live_domains(domains:set[str])->set[str]:
-    """Filter to only domains that resolve in DNS"""
-    live = set()
-    print(f"Checking {len(domains)} domains for DNS resolution...")
-
-    async with httpx.AsyncClient(http2=True) as client:
-        async def worker(url):
-            async with SEM:
-                result = await check_domain_exists(client, url)
-                if result:
-                    live.add(result)
-
-        await asyncio.gather(*(worker(u) for u in domains))
-
-    print(f"  {len(live)} domains resolve in DNS")
-    return live
-
-async def catalog():
-    all_domains = set()
-
-    # 1. Original scraping method
-    print("\n=== Phase 1: Scraping country selectors ===")
-    seed = await scrape_selectors()
-    print(f"Found {len(seed)} domains from selectors")
-    all_domains.update(seed)
-
-    # 2. Expand via hreflang
-    print("\n=== Phase 2: Expanding via hreflang tags ===")
-    expanded = await expand_hreflang(seed)
-    hreflang_domains = {u for (u,_) in expanded}
-    print(f"Found {len(hreflang_domains)} domains via hreflang")
-    all_domains.update(hreflang_domains)
-
-    # 3. Certificate Transparency
-    print("\n=== Phase 3: Certificate Transparency ===")
-    crt_domains = await query_crt_sh()
-    all_domains.update(crt_domains)
-
-    # 4. TLD enumeration
-    print("\n=== Phase 4: TLD enumeration ===")
-    tld_domains = await enumerate_tlds()
-    tld_live = await filter_live_domains(tld_domains)
-    all_domains.update(tld_live)
-
-    # 5. Subdomain enumeration on discovered domains
-    print("\n=== Phase 5: Subdomain enumeration ===")
-    subdomain_candidates = await enumerate_subdomains(all_domains)
-    subdomain_live = await filter_live_domains(subdomain_candidates)
-    all_domains.update(subdomain_live)
-
-    # Deduplicate and filter out excluded domains
-    hosts = sorted([d for d in set(all_domains) if not should_exclude(d)])
-    print(f"\n=== Total unique domains discovered: {len(hosts)} (after filtering) ===")
-
-    # Catalog all discovered domains
-    print("\n=== Phase 6: Cataloging all domains ===")
-    all_rows=[]
-    async with httpx.AsyncClient(http2=True) as client:
-        async def worker(u):
-            async with SEM:
-                r, final_url = await fetch(client,u)
-                status = r.status_code if r else None
-                title = None
-                headers = {}
-                if r:
-                    headers = dict(r.headers)
-                    content_type = headers.get("content-type", "").lower()
-                    # Only try to parse HTML for title
-                    if "text/html" in content_type:
-                        try:
-                            sel = Selector(r.text)
-                            t = sel.xpath("//title/text()").get()
-                            title = t.strip() if t else None
-                        except Exception:
-                            pass
-                host = re.sub(r"^https?://","",u).split("/")[0]
-                cname_chain = await resolve_cname_chain(host)
-                ip = await ip_to_org(host)
-                hosting = guess_hosting(headers, cname_chain, ip)
-                # Include final_url for deduplication
-                all_rows.append([host,u,status,title,hosting,ip,";".join(cname_chain),final_url])
-        await asyncio.gather(*(worker(u) for u in hosts))
-
-    # Filter results based on response characteristics
-    # row format: [host, url, status, title, hosting, ip, cname_chain, final_url]
-    rows = [row for row in all_rows if not should_exclude_result(row[2], row[3], row[4], row[5])]
-    print(f"Filtered to {len(rows)} production/public sites (removed admin/dev/test/api/login/404/503/empty)")
-
-    # Deduplicate based on final redirect destination
-    # If multiple URLs redirect to the same final root domain, keep only the final one
-    seen_final_roots = {}
-    deduped_rows = []
-    for row in rows:
-        final_url = row[7]  # final_url column
-        if final_url:
-            final_root = norm_root(final_url)
-            # If this URL is different from its final destination, it's a redirect
-            original_root = norm_root(row[1])  # row[1] is the original URL
-            if original_root != final_root:
-                # This URL redirects elsewhere
-                # Check if we've already seen the final destination
-                if final_root not in seen_final_roots:
-                    # Use the final destination, not the redirect
-                    final_host = re.sub(r"^https?://","",final_root).split("/")[0]
-                    row[0] = final_host  # Update host
-                    row[1] = final_root  # Update URL to final destination
-                    seen_final_roots[final_root] = row
-                    deduped_rows.append(row)
-                # else: skip this redirect since we already have the destination
+def enumerate_subdomains(base:str):
+    """Try common subdomains on a known base domain"""
+    for sub in SUBDOMAINS:
+        yield f"https://{sub}.{base}"
+
+async def check_domain_exists(url:str)->str|None:
+    """Quick check if domain resolves (DNS is faster than HTTP)"""
+    host = re.sub(r"^https?://", "", url).split("/")[0]
+    return url if (await DNS.resolve(host)).exists else None
+
+class Pipeline:
+    """Streams roots from every discovery source into the catalog workers.
+
+    Sources call emit() as they find roots; each root is deduplicated, its base
+    domain queued for subdomain guesses, and (unless should_exclude) handed to
+    the catalog queue. Guessed names go through a bounded candidate queue and
+    a pool of DNS checkers first. Bounded queues give backpressure end to end.
+    Redirect chains seen while cataloging go into ``redirects``.
+    """
+    def __init__(self, root_queue:int=ROOT_QUEUE_SIZE, candidate_queue:int=CANDIDATE_QUEUE_SIZE):
+        self.roots:asyncio.Queue = asyncio.Queue(root_queue)
+        self.candidates:asyncio.Queue = asyncio.Queue(candidate_queue)
+        self.seen:set[str] = set()
+        self.bases:set[str] = set()
+        self.generators:list[asyncio.Task] = []
+        self.found:Counter[str] = Counter()
+        self.excluded = 0
+        self.redirects = RedirectGraph()
+        self.skipped_aliases = 0
+        self.frontier:RootFrontier|None = None
+
+    def emitter(self, source:str):
+        async def emit(url:str):
+            await self.emit(url, source)
+        return emit
+
+    async def emit(self, url:str, source:str):
+        root = norm_root(url)
+        if root in self.seen:
+            return
+        self.seen.add(root)
+        self.found[source] += 1
+        base = base_domain(root)
+        if base and base not in self.bases:
+            # Subdomain guesses start as soon as a new base domain shows up
+            self.bases.add(base)
+            if BRUTE:
+                guesses = BRUTE.run(base, self.emitter("wordlist"), skip=self.known)
             else:
-                # No redirect, or redirects to itself
-                if final_root not in seen_final_roots:
-                    seen_final_roots[final_root] = row
-                    deduped_rows.append(row)
-        else:
-            # No final URL tracked, keep it if we haven't seen this root
-            original_root = norm_root(row[1])
-            if original_root not in seen_final_roots:
-                seen_final_roots[original_root] = row
-                deduped_rows.append(row)
-
-    print(f"Deduplicated to {len(deduped_rows)} unique sites (removed redirect duplicates)")
-
-    # Remove the final_url column before writing to CSV
-    output_rows = [[r[0], r[1], r[2], r[3], r[4], r[5], r[6]] for r in deduped_rows]
+                guesses = self.guess(enumerate_subdomains(base), "subdomain")
+            self.generators.append(asyncio.create_task(guesses))
+        if should_exclude(root):
+            self.excluded += 1
+            return
+        await self.roots.put(root)
+
+    def known(self, host:str)->bool:
+        """Nothing to learn from resolving host: already seen, or excluded either way"""
+        url = f"https://{host}"
+        return url in self.seen or should_exclude(url)
+
+    async def guess(self, urls, source:str):
+        """Queue guessed names for a DNS check; only live ones are emitted"""
+        for u in urls:
+            await self.candidates.put((u, source))
+
+    async def check_candidates(self):
+        while True:
+            u, source = await self.candidates.get()
+            try:
+                if norm_root(u) not in self.seen and await check_domain_exists(u):
+                    await self.emit(u, source)
+            finally:
+                self.candidates.task_done()
+
+    async def discover(self, session:CatalogSession):
+        """Run every source to completion, including guesses they trigger"""
+        checkers = [asyncio.create_task(self.check_candidates()) for _ in range(DNS_WORKERS)]
+        async def links(url:str, kind:str):
+            return await (selector_links(session, url) if kind == SELECTOR else hreflang_links(session, url))
+        # Selector pages and hreflang alternates, followed until no new roots turn up
+        self.frontier = RootFrontier(links, is_resmed_url, FRONTIER_DB, max_depth=DISCOVERY_DEPTH,
+                                     max_age=FRONTIER_MAX_AGE)
+        sources = [asyncio.create_task(source) for source in (
+            METRICS.timed("selectors_hreflang", self.frontier.run(SELECTORS, self.emit)),
+            METRICS.timed("crt.sh", query_crt_sh(session, self.emitter("crt.sh"))),
+            METRICS.timed("tld_guesses", self.guess(enumerate_tlds(), "tld")))]
+        try:
+            try:
+                await asyncio.gather(*sources)
+            finally:
+                # gather leaves the other sources running when one raises; stop them
+                # before the frontier's DB goes away under them
+                for t in sources:
+                    t.cancel()
+                await asyncio.gather(*sources, return_exceptions=True)
+                self.frontier.close()
+            # Live guesses can reveal new base domains, which queue more guesses
+            with METRICS.phase("subdomain_guesses"):
+                while True:
+                    pending = [t for t in self.generators if not t.done()]
+                    await asyncio.gather(*pending)
+                    await self.candidates.join()
+                    if all(t.done() for t in self.generators):
+                        break
+        finally:
+            # Also when a source raised: nothing would drain the queue any more, and
+            # guesses blocked on it would never finish
+            tasks = [*checkers, *self.generators]
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+async def catalog_host(session:CatalogSession, u:str, redirects:RedirectGraph|None=None)->SiteRecord:
+    # Headers and <title> are all we need, so stop reading at </head>
+    head = await session.fetch_head(u)
+    status = head.status if head else None
+    title = head.title if head else None
+    headers = head.headers if head else {}
+    final_url = head.final_url if head else None
+    host = re.sub(r"^https?://","",u).split("/")[0]
+    if redirects is not None and head:
+        redirects.add_chain([u, *head.history, head.final_url])
+        if status not in THROTTLE_STATUSES:
+            redirects.mark(head.final_url)
+    # DNS of the host that served the page, not of the alias that sent us there;
+    # CNAME chain and A records come from one cached resolution
+    served_by = re.sub(r"^https?://","",final_url or u).split("/")[0]
+    cname_chain = await resolve_cname_chain(served_by)
+    ip = await ip_to_org(served_by)
+    hosting = guess_hosting(headers, cname_chain, ip)
+    # final_url and the hops before it are kept for deduplication
+    return SiteRecord(host, u, status, title, hosting, ip, ";".join(cname_chain), final_url,
+                      tuple(head.history) if head else ())
+
+async def catalog(session:CatalogSession, journal:CatalogJournal|None=None):
+    # Discovery and cataloging overlap: each root is fetched as soon as any
+    # source finds it, instead of after the slowest discovery phase
+    print("\n=== Discovering and cataloging (selectors, hreflang, crt.sh, TLDs, subdomains) ===")
+    pipeline = Pipeline()
+    # Rows go to the journal as they complete; a crashed run left one to resume from.
+    # Throttled hosts aren't a verdict, so a resumed run asks them again
+    journal = journal or CatalogJournal(JOURNAL_PATH)
+    answered:set[str] = set()
+    for record in journal.replay():
+        pipeline.redirects.add_chain([record.url, *record.history, record.final_url or record.url])
+        if record.status not in THROTTLE_STATUSES:
+            answered.add(record.url)
+            if record.final_url:
+                pipeline.redirects.mark(record.final_url)
+    journal.open()
+    if answered:
+        print(f"Resuming: {len(answered)} hosts already cataloged in {journal.path}")
+    METRICS.gauge("root_queue", pipeline.roots.qsize)
+    METRICS.gauge("candidate_queue", pipeline.candidates.qsize)
+    METRICS.gauge("dns_in_flight", lambda: DNS.in_flight)
+    if BRUTE:
+        METRICS.gauge("wordlist_in_flight", lambda: BRUTE.dns.in_flight)
+    sampler = asyncio.create_task(METRICS.sampler())
+    throttled:list[str] = []
+    resumed = 0
+    stopped = False
+    async def worker():
+        nonlocal resumed
+        while True:
+            u = await pipeline.roots.get()
+            if u is None:
+                return
+            if u in answered:
+                resumed += 1
+                continue
+            if pipeline.redirects.covered(u):
+                # An alias (or the target) of a site already cataloged through another name
+                pipeline.skipped_aliases += 1
+                continue
+            record = await catalog_host(session, u, pipeline.redirects)
+            if stopped:
+                # Interrupted; the host is fetched again on resume
+                return
+            journal.write(record)
+            if record.status in THROTTLE_STATUSES:
+                throttled.append(u)
+            print(f"  [{journal.written}] {record.host} {record.status} {record.hosting_provider or ''}")
+    workers = [asyncio.create_task(worker()) for _ in range(CATALOG_WORKERS)]
+    try:
+        with METRICS.phase("discover"):
+            await pipeline.discover(session)
+        # Whatever is still queued once discovery ends
+        with METRICS.phase("catalog_drain"):
+            for _ in workers:
+                await pipeline.roots.put(None)
+            await asyncio.gather(*workers)
+    finally:
+        # On an interrupt, nothing may write to the journal after it is closed.
+        # httpcore shields connection cleanup, which can swallow a cancel, so
+        # workers also check the flag
+        stopped = True
+        for t in workers:
+            t.cancel()
+        sampler.cancel()
+    METRICS.count("roots_discovered", len(pipeline.seen))
+    METRICS.count("roots_cataloged", journal.written)
+    METRICS.count("roots_resumed", resumed)
+    METRICS.count("aliases_skipped", pipeline.skipped_aliases)
+
+    print(f"\n=== Total unique domains discovered: {len(pipeline.seen)}, "
+          f"cataloged {journal.written} ({resumed} from the journal, {pipeline.excluded} excluded, "
+          f"{pipeline.skipped_aliases} known aliases not fetched) ===")
+    for source, n in pipeline.found.most_common():
+        print(f"  {source}: {n}")
+    if pipeline.frontier:
+        METRICS.info["frontier"] = pipeline.frontier.stats()
+        print(pipeline.frontier.report())
+    if BRUTE:
+        METRICS.info["wordlist"] = BRUTE.stats()
+        print(BRUTE.report())
+
+    # 429/503 after retries still only means "busy right now"; give those hosts
+    # one more unhurried pass (their limiters have already backed off) before judging
+    METRICS.count("throttled_after_retries", len(throttled))
+    if throttled:
+        print(f"Re-checking {len(throttled)} throttled hosts in {RECHECK_DELAY:.0f}s...")
+        await asyncio.sleep(RECHECK_DELAY)
+        rechecked = await METRICS.timed("recheck", asyncio.gather(*(catalog_host(session, u, pipeline.redirects)
+                                                                      for u in throttled)))
+        for record in rechecked:
+            journal.write(record)
+        still = sorted(r.url for r in rechecked if r.status in THROTTLE_STATUSES)
+        if still:
+            # Not a verdict on the site, so keep a record instead of silently dropping it
+            with open("resmed_sites_throttled.csv","w",newline="",encoding="utf-8") as f:
+                w=csv.writer(f)
+                w.writerow(["url"])
+                w.writerows([u] for u in still)
+            print(f"  {len(still)} still throttled; listed in resmed_sites_throttled.csv for a later run")
+
+    # Read back from the journal, keeping only the best row per canonical site.
+    # Rows are filtered on response characteristics first; a throttled row a
+    # recheck replaced is dropped here too, since 429/503 are excluded.
+    # A direct fetch of the canonical root wins, then the lowest URL, so the
+    # result doesn't depend on completion order
+    redirects = pipeline.redirects
+    by_site:dict[str, tuple[tuple, SiteRecord]] = {}
+    kept = 0
+    for record in journal.records():
+        if should_exclude_result(record.status, record.title, record.hosting_provider, record.ip):
+            continue
+        kept += 1
+        canonical = redirects.canonical(record.url)
+        if canonical != root_of(record.url) and should_exclude(canonical):
+            # Redirects into an excluded site (e.g. resmed.ca)
+            continue
+        rank = (root_of(record.url) != canonical, record.url)
+        if canonical not in by_site or rank < by_site[canonical][0]:
+            by_site[canonical] = (rank, record)
+    print(f"Filtered to {kept} production/public sites (removed admin/dev/test/api/login/404/503/empty)")
+    print(f"Deduplicated to {len(by_site)} unique sites (removed redirect duplicates)")
 
     with open("resmed_sites.csv","w",newline="",encoding="utf-8") as f:
         w=csv.writer(f)
-        w.writerow(["host","url","status","title","hosting_provider","ip","cname_chain"])
-        w.writerows(output_rows)
-    print(f"\n✓ Wrote {len(output_rows)} rows to resmed_sites.csv")
+        w.writerow(CSV_FIELDS)
+        for canonical, (_, record) in sorted(by_site.items()):
+            record.host = re.sub(r"^https?://","",canonical)
+            record.url = canonical
+            w.writerow(record.csv_row())
+    print(f"\n✓ Wrote {len(by_site)} rows to resmed_sites.csv")
+
+    # Old name -> live site, for rewriting links and setting up redirects after migration
+    aliases = redirects.aliases()
+    with open("resmed_redirects.csv","w",newline="",encoding="utf-8") as f:
+        w=csv.writer(f)
+        w.writerow(["alias","canonical","landing_url"])
+        w.writerows(aliases)
+    print(f"✓ Wrote {len(aliases)} redirect aliases to resmed_redirects.csv")
+    # Complete: the next run starts from scratch rather than resuming this one
+    journal.discard()
+
+async def run(args):
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache, max_age=args.cache_max_age_days*86400, max_bytes=args.cache_max_mb*1024*1024)
+    DNS.persist = cache
+    DNS.offline = args.offline
+    DNS.metrics = METRICS
+    global CT_URL, CT_DUMP, CT_SAVE, BRUTE, DISCOVERY_DEPTH, FRONTIER_DB, FRONTIER_MAX_AGE
+    CT_URL, CT_DUMP = args.crt_url, args.crt_dump
+    DISCOVERY_DEPTH, FRONTIER_DB = args.discovery_depth, args.frontier
+    FRONTIER_MAX_AGE = args.frontier_max_age_days * 86400
+    if args.no_cache:
+        CT_SAVE = None
+    if args.wordlist:
+        # Its own engine: millions of misses shouldn't crowd the shared cache
+        BRUTE = SubdomainBrute(args.wordlist, BruteDNS(nameservers=DNS.nameservers, port=DNS.port,
+                                                        offline=args.offline),
+                               concurrency=args.brute_concurrency, extra_words=SUBDOMAINS)
+    journal = CatalogJournal(args.journal)
+    if args.fresh:
+        journal.discard()
+    # One client for every phase, so warm connections carry over between them
+    session = CatalogSession(HEADERS, TIMEOUT, max_connections=args.max_connections,
+                             global_limit=args.concurrency, per_host=args.per_host,
+                             cache=cache, offline=args.offline, max_per_host=args.max_per_host,
+                             host_rate=args.host_rate, retries=args.retries, metrics=METRICS)
+    try:
+        async with session:
+            with METRICS.phase("total"):
+                await catalog(session, journal)
+    finally:
+        journal.close()
+        print(f"\n{session.report()}")
+        METRICS.info["http"] = session.stats()
+        METRICS.info["dns_engine"] = DNS.stats()
+        if cache:
+            stats = cache.stats()
+            lookups = stats["hits"] + stats["misses"]
+            METRICS.info["cache"] = stats
+            METRICS.info["cache_hit_ratio"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+            print(f"Cache: {stats}")
+            cache.close()
+        print(METRICS.report())
+        if args.metrics_dir:
+            json_path, prom_path = METRICS.write(args.metrics_dir)
+            print(f"Metrics written to {json_path} and {prom_path}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Discover and catalog ResMed sites")
+    ap.add_argument("--cache", default=CACHE_PATH, help=f"response/DNS cache database (default: {CACHE_PATH})")
+    ap.add_argument("--no-cache", action="store_true", help="fetch everything from the network")
+    ap.add_argument("--offline", action="store_true", help="serve only from the cache, no network access")
+    ap.add_argument("--cache-max-age-days", type=float, default=30, help="drop cache entries not validated for this long")
+    ap.add_argument("--cache-max-mb", type=int, default=512, help="evict least-recently-used entries above this size")
+    ap.add_argument("--crt-url", default=CT_URL, help="crt.sh query URL (or a local stand-in)")
+    ap.add_argument("--crt-dump", help="read Certificate Transparency results from a saved crt.sh JSON file (.gz ok)")
+    ap.add_argument("--concurrency", type=int, default=50, help="requests in flight across all hosts")
+    ap.add_argument("--per-host", type=int, default=6, help="requests in flight per host")
+    ap.add_argument("--max-connections", type=int, default=100, help="size of the shared connection pool")
+    ap.add_argument("--max-per-host", type=int, default=32, help="ceiling for adaptive per-host concurrency")
+    ap.add_argument("--host-rate", type=float, default=10.0, help="starting requests/second per host (adapts)")
+    ap.add_argument("--retries", type=int, default=3, help="retries for throttled or timed-out requests")
+    ap.add_argument("--wordlist", help="brute-force subdomains from this file (one word per line) on every base domain")
+    ap.add_argument("--brute-concurrency", type=int, default=BRUTE_CONCURRENCY, help="DNS queries in flight for --wordlist")
+    ap.add_argument("--metrics-dir", default=METRICS_DIR, help="where to write run metrics (JSON and Prometheus text)")
+    ap.add_argument("--profile", metavar="FILE", help="cProfile the run and dump pstats to FILE")
+    ap.add_argument("--discovery-depth", type=int, default=MAX_DEPTH, help="hops followed from the country-selector pages through selectors and hreflang")
+    ap.add_argument("--frontier", default=FRONTIER_PATH, help="roots found through selectors/hreflang; later runs start from it")
+    ap.add_argument("--frontier-max-age-days", type=float, default=MAX_AGE_DAYS, help="re-read a known page's links after this long")
+    ap.add_argument("--journal", default=JOURNAL_PATH, help="rows streamed here as hosts complete; an interrupted run resumes from it")
+    ap.add_argument("--fresh", action="store_true", help="discard an interrupted run's journal instead of resuming")
+    args = ap.parse_args()
+    if args.offline and args.no_cache:
+        ap.error("--offline needs the cache")
+    with profiled(args.profile):
+        asyncio.run(run(args))
 
 if __name__ == "__main__":
-    asyncio.run(catalog())
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Shared SQLite store for per-site and per-page analysis results.
+
+Any number of writers (scoring processes, agent report importers) can add
+rows concurrently: the database runs in WAL mode, each batch is one short
+transaction, and writers wait on a busy timeout instead of failing. Reports
+are built with GROUP BY queries over these tables rather than by re-reading
+markdown.
+"""
+import csv
+import sqlite3
+import time
+from pathlib import Path
+
+STORE_PATH = "data/analysis/results.sqlite"
+
+COMPONENTS = ("inline_styles", "structure", "semantic", "custom_code", "nesting")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS site_results (
+    site TEXT NOT NULL,
+    source TEXT NOT NULL,
+    platform TEXT,
+    pages_scored INTEGER,
+    pages_total INTEGER,
+    score REAL,
+    inline_styles REAL,
+    structure REAL,
+    semantic REAL,
+    custom_code REAL,
+    nesting REAL,
+    inline_style_ratio REAL,
+    semantic_ratio REAL,
+    max_div_depth INTEGER,
+    shortcodes INTEGER,
+    hubl INTEGER,
+    scripts INTEGER,
+    iframes INTEGER,
+    hours_per_page REAL,
+    effort_hours REAL,
+    automation_pct REAL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (site, source)
+);
+CREATE TABLE IF NOT EXISTS page_results (
+    url TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    platform TEXT,
+    score REAL,
+    inline_styles REAL,
+    structure REAL,
+    semantic REAL,
+    custom_code REAL,
+    nesting REAL,
+    inline_style_ratio REAL,
+    semantic_ratio REAL,
+    max_div_depth INTEGER,
+    avg_div_depth REAL,
+    shortcodes INTEGER,
+    hubl INTEGER,
+    wp_blocks INTEGER,
+    scripts INTEGER,
+    inline_scripts INTEGER,
+    iframes INTEGER,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS page_results_site ON page_results(site);
+CREATE TABLE IF NOT EXISTS catalog (
+    host TEXT PRIMARY KEY,
+    url TEXT,
+    status INTEGER,
+    hosting_provider TEXT
+);
+-- One row per site: measured results win over agent estimates
+CREATE VIEW IF NOT EXISTS sites AS
+SELECT r.*, COALESCE(c.hosting_provider, 'Unknown') AS hosting_provider
+FROM site_results r LEFT JOIN catalog c ON c.host = r.site
+WHERE r.source = 'html_score'
+   OR NOT EXISTS (SELECT 1 FROM site_results m WHERE m.site = r.site AND m.source = 'html_score');
+"""
+
+SITE_COLUMNS = ["site", "source", "platform", "pages_scored", "pages_total", "score", *COMPONENTS,
+                "inline_style_ratio", "semantic_ratio", "max_div_depth", "shortcodes", "hubl",
+                "scripts", "iframes", "hours_per_page", "effort_hours", "automation_pct"]
+PAGE_COLUMNS = ["url", "site", "platform", "score", *COMPONENTS, "inline_style_ratio", "semantic_ratio",
+                "max_div_depth", "avg_div_depth", "shortcodes", "hubl", "wp_blocks", "scripts",
+                "inline_scripts", "iframes"]
+
+
+def hours_per_page(score: float) -> float:
+    """Effort per page from the difficulty score (0.5h simple .. 4h very difficult)."""
+    if score >= 7:
+        return 0.5
+    if score >= 4:
+        return 1.5
+    if score >= 2:
+        return 3.0
+    return 4.0
+
+
+def automation_pct(score: float) -> float:
+    """Share of content expected to migrate by script; tracks the score."""
+    return round(max(0.0, min(100.0, (score - 1) / 9 * 90 + 5)), 1)
+
+
+class ResultStore:
+    """Thin wrapper around the results database; safe to open from many processes."""
+
+    def __init__(self, path: str | Path = STORE_PATH, timeout: float = 60.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=timeout)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def _upsert(self, table: str, columns: list[str], rows) -> int:
+        now = time.time()
+        sql = (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}, updated_at) "
+               f"VALUES ({', '.join('?' * len(columns))}, ?)")
+        values = [[row.get(c) for c in columns] + [now] for row in rows]
+        with self.db:
+            self.db.executemany(sql, values)
+        return len(values)
+
+    def write_sites(self, rows, source: str = "html_score") -> int:
+        """Upsert site rows (dicts keyed by SITE_COLUMNS); effort is derived if missing."""
+        out = []
+        for row in rows:
+            row = {**row, "source": source}
+            if row.get("score") is not None:
+                row.setdefault("hours_per_page", hours_per_page(row["score"]))
+                row.setdefault("automation_pct", automation_pct(row["score"]))
+                pages = row.get("pages_total") or row.get("pages_scored")
+                if row.get("effort_hours") is None and pages:
+                    row["effort_hours"] = round(pages * row["hours_per_page"], 1)
+            out.append(row)
+        return self._upsert("site_results", SITE_COLUMNS, out)
+
+    def write_pages(self, rows) -> int:
+        return self._upsert("page_results", PAGE_COLUMNS, rows)
+
+    def import_catalog(self, sites_csv: str = "data/resmed_sites.csv") -> int:
+        """Hosting provider per host from the catalog CSV, for grouping."""
+        if not Path(sites_csv).exists():
+            return 0
+        with open(sites_csv, encoding="utf-8") as f:
+            rows = [r for r in csv.DictReader(f) if r.get("host")]
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO catalog (host, url, status, hosting_provider) "
+                                "VALUES (?, ?, ?, ?)",
+                                [(r["host"], r.get("url"), r.get("status") or None,
+                                  r.get("hosting_provider") or None) for r in rows])
+        return len(rows)
+
+    def query(self, sql: str, params=()) -> list[sqlite3.Row]:
+        return self.db.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def summary(store: ResultStore) -> dict:
+    """Every consolidated figure, each from a single aggregate query."""
+    totals = store.query("""
+        SELECT COUNT(*) AS sites, COALESCE(SUM(COALESCE(pages_total, pages_scored)), 0) AS pages,
+               COALESCE(SUM(effort_hours), 0) AS hours, AVG(score) AS avg_score,
+               AVG(automation_pct) AS automation
+        FROM sites""")[0]
+    distribution = store.query("""
+        SELECT CASE WHEN score >= 7 THEN 'Easy (7-10)' WHEN score >= 4 THEN 'Medium (4-6)'
+                    ELSE 'Difficult (1-3)' END AS band,
+               COUNT(*) AS sites, SUM(effort_hours) AS hours
+        FROM sites WHERE score IS NOT NULL GROUP BY band ORDER BY MIN(score) DESC""")
+    histogram = store.query("""
+        SELECT CAST(score AS INTEGER) AS bucket, COUNT(*) AS pages
+        FROM page_results WHERE score IS NOT NULL GROUP BY bucket ORDER BY bucket""")
+    grouped = {
+        key: store.query(f"""
+            SELECT COALESCE({key}, 'Unknown') AS name, COUNT(*) AS sites,
+                   SUM(COALESCE(pages_total, pages_scored)) AS pages, ROUND(AVG(score), 1) AS avg_score,
+                   ROUND(SUM(effort_hours), 1) AS hours, ROUND(AVG(automation_pct), 1) AS automation
+            FROM sites GROUP BY name ORDER BY sites DESC, name""")
+        for key in ("platform", "hosting_provider")
+    }
+    components = store.query(f"""
+        SELECT {', '.join(f'ROUND(AVG({c}), 2) AS {c}' for c in COMPONENTS)} FROM sites""")[0]
+    easiest = store.query("SELECT site, score, effort_hours FROM sites WHERE score IS NOT NULL "
+                          "ORDER BY score DESC, effort_hours LIMIT 5")
+    hardest = store.query("SELECT site, score, effort_hours FROM sites WHERE score IS NOT NULL "
+                          "ORDER BY score, effort_hours DESC LIMIT 5")
+    return {"totals": totals, "distribution": distribution, "histogram": histogram,
+            "platform": grouped["platform"], "hosting_provider": grouped["hosting_provider"],
+            "components": components, "easiest": easiest, "hardest": hardest}
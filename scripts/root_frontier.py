@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Breadth-first discovery of site roots through country selectors and hreflang alternates.
+
+There are two kinds of node. A selector page is a full URL whose links are
+read. A root is scheme://host, whose hreflang alternates are read. Links that
+look like another country selector become selector nodes, and their site's
+root becomes a root node as well; the rest become roots. Expansion goes level
+by level, each level's fetches running concurrently. It stops when a level
+adds nothing new, or at the depth limit (hops from a seed). The visited set
+keeps any node from being fetched twice.
+
+Nodes are kept in SQLite along with when they were last expanded. A later
+run emits every known root straight away and fetches only the frontier: nodes
+never expanded (cut off by the depth limit, or their fetch failed) and nodes
+whose expansion is older than max_age.
+"""
+import asyncio
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit, urlunsplit
+
+from redirect_graph import root_of
+
+FRONTIER_PATH = "data/cache/roots.sqlite"
+MAX_DEPTH = 10
+CONCURRENCY = 20
+MAX_AGE_DAYS = 7.0
+COUNTRY_SELECTOR = re.compile(r"country[-_]?select", re.I)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    url TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    found REAL NOT NULL,
+    expanded REAL
+);
+"""
+
+SELECTOR, ROOT = "selector", "root"
+
+
+def classify(url: str) -> tuple[str, str]:
+    """(kind, node URL) for a link: selector pages keep their path, anything else is cut to its root."""
+    parts = urlsplit(url)
+    if COUNTRY_SELECTOR.search(parts.path):
+        return SELECTOR, urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ""))
+    return ROOT, root_of(url)
+
+
+class RootFrontier:
+    """Persistent BFS over selector pages and roots.
+
+    ``links(url, kind)`` fetches one node and returns the URLs it links to, or
+    None if the fetch failed (the node then stays in the frontier).
+    ``accept(url)`` filters links, e.g. to ResMed hosts.
+    """
+
+    def __init__(self, links: Callable[[str, str], Awaitable[list[str] | None]],
+                 accept: Callable[[str], bool], path: str | Path = FRONTIER_PATH,
+                 max_depth: int = MAX_DEPTH, concurrency: int = CONCURRENCY,
+                 max_age: float = MAX_AGE_DAYS * 86400):
+        self.links = links
+        self.accept = accept
+        self.max_depth = max_depth
+        self.concurrency = concurrency
+        self.max_age = max_age
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.known_roots = 0
+        self.expanded = 0
+        self.failed = 0
+        self.new_nodes = 0
+        self.levels = 0
+        self.at_limit = 0
+
+    def close(self) -> None:
+        self.db.close()
+
+    async def run(self, seeds: list[str], emit: Callable[[str, str], Awaitable[None]]) -> None:
+        """Expand from seeds (selector pages) and the saved frontier; emit(root, source) per root."""
+        now = time.time()
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO nodes (url, kind, depth, found) VALUES (?, ?, 0, ?)",
+                                [(url, SELECTOR, now) for url in seeds])
+        visited = set()
+        levels: dict[int, list[tuple[str, str]]] = {}
+        stale = now - self.max_age
+        for url, kind, depth, expanded in self.db.execute("SELECT url, kind, depth, expanded FROM nodes"):
+            visited.add(url)
+            if kind == ROOT:
+                self.known_roots += 1
+                await emit(url, "known")
+            if expanded is None or expanded < stale:
+                if depth < self.max_depth:
+                    levels.setdefault(depth, []).append((url, kind))
+                else:
+                    self.at_limit += 1
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def expand(url: str, kind: str) -> tuple[str, str, list[str] | None]:
+            async with slots:
+                return url, kind, await self.links(url, kind)
+
+        while levels:
+            depth = min(levels)
+            level = levels.pop(depth)
+            self.levels += 1
+            found = []
+            for task in asyncio.as_completed([expand(url, kind) for url, kind in level]):
+                url, kind, links = await task
+                if links is None:
+                    self.failed += 1
+                    continue
+                self.expanded += 1
+                found.append(url)
+                source = "selector" if kind == SELECTOR else "hreflang"
+                for link in links:
+                    if not self.accept(link):
+                        continue
+                    child_kind, child = classify(link)
+                    # Another site's selector page is a site too: its root is kept alongside it
+                    children = [(child_kind, child)] + ([(ROOT, root_of(child))] if child_kind == SELECTOR else [])
+                    for child_kind, child in children:
+                        if child in visited:
+                            continue
+                        visited.add(child)
+                        self.new_nodes += 1
+                        self.db.execute("INSERT OR IGNORE INTO nodes (url, kind, depth, found) VALUES (?, ?, ?, ?)",
+                                        (child, child_kind, depth + 1, time.time()))
+                        if child_kind == ROOT:
+                            await emit(child, source)
+                        if depth + 1 < self.max_depth:
+                            levels.setdefault(depth + 1, []).append((child, child_kind))
+                        else:
+                            self.at_limit += 1
+            with self.db:
+                self.db.executemany("UPDATE nodes SET expanded=? WHERE url=?", [(time.time(), u) for u in found])
+
+    def stats(self) -> dict:
+        return {"known_roots": self.known_roots, "expanded": self.expanded, "failed": self.failed,
+                "new_nodes": self.new_nodes, "levels": self.levels, "at_depth_limit": self.at_limit}
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"  frontier: {s['expanded']} pages expanded over {s['levels']} levels, {s['new_nodes']} new, "
+                f"{s['known_roots']} roots known from earlier runs; {s['failed']} failed, "
+                f"{s['at_depth_limit']} left at the depth limit")
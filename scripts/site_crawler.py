@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""Build a per-site page inventory from robots.txt, sitemaps and link following.
+
+Starts from the rows of resmed_sites.csv. Every site gets its own
+deduplicating frontier, a small number of concurrent requests and a minimum
+delay between them; many sites are crawled side by side. All state (queued
+and fetched pages, processed sitemaps) lives in SQLite, so an interrupted
+crawl picks up where it stopped.
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import sqlite3
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from http_session import HEADERS, CatalogSession
+
+STATE_PATH = "data/crawl/crawl_state.sqlite"
+ROBOTS_AGENT = "ResMedCatalogBot"
+MAX_PAGES = 5000
+MAX_DEPTH = 5
+MAX_SITEMAP_DEPTH = 3
+MAX_HTML_BYTES = 2 * 1024 * 1024
+
+# Not pages; left for the asset inventory
+SKIP_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".bmp", ".tif", ".tiff",
+    ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".gz",
+    ".mp3", ".mp4", ".mov", ".avi", ".webm", ".css", ".js", ".json", ".xml",
+    ".woff", ".woff2", ".ttf", ".eot", ".otf",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sites (
+    site TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    host TEXT NOT NULL,
+    state TEXT NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS sitemaps (
+    url TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    urls INTEGER
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    site TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    status INTEGER,
+    content_type TEXT,
+    final_url TEXT,
+    bytes INTEGER,
+    html BLOB,
+    fetched_at REAL
+);
+CREATE INDEX IF NOT EXISTS pages_site_state ON pages(site, state);
+"""
+
+
+def open_state(path: str = STATE_PATH) -> sqlite3.Connection:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.executescript(SCHEMA)
+    return db
+
+
+def normalize_url(url: str) -> str | None:
+    """Canonical form used for deduplication: no fragment, lowercase host, no default port."""
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    netloc = parts.hostname if port in (None, 80, 443) else f"{parts.hostname}:{port}"
+    return urlunsplit((parts.scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def is_page_url(url: str) -> bool:
+    path = urlsplit(url).path.lower()
+    return not any(path.endswith(ext) for ext in SKIP_EXTENSIONS)
+
+
+class LinkExtractor(HTMLParser):
+    """Collects <a href> targets (raw, as written) and the <base href>, if any."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.base: str | None = None
+        self.links: list[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href.strip())
+        elif tag == "base" and self.base is None:
+            self.base = dict(attrs).get("href")
+
+
+def extract_links(html: str, page_url: str) -> list[str]:
+    """Absolute http(s) URLs linked from a page."""
+    parser = LinkExtractor()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass
+    base = urljoin(page_url, parser.base) if parser.base else page_url
+    out = []
+    for href in parser.links:
+        if href.startswith(("mailto:", "tel:", "javascript:", "#")):
+            continue
+        url = normalize_url(urljoin(base, href))
+        if url:
+            out.append(url)
+    return out
+
+
+def parse_sitemap(body: bytes) -> tuple[list[str], list[str]]:
+    """(nested sitemap URLs, page URLs) from a sitemap or sitemap index, gzipped or not."""
+    if body[:2] == b"\x1f\x8b":
+        body = gzip.decompress(body)
+    sitemaps, urls = [], []
+    is_index = None
+    try:
+        for event, el in ET.iterparse(io.BytesIO(body), events=("start", "end")):
+            tag = el.tag.rsplit("}", 1)[-1]
+            if event == "start":
+                if is_index is None:
+                    is_index = tag == "sitemapindex"
+                continue
+            if tag == "loc" and el.text:
+                (sitemaps if is_index else urls).append(el.text.strip())
+            elif tag in ("url", "sitemap"):
+                el.clear()
+    except ET.ParseError:
+        pass
+    return sitemaps, urls
+
+
+class SiteCrawler:
+    """Crawls one site within its politeness limits, persisting as it goes."""
+
+    def __init__(self, crawler: "Crawler", site: str, root: str):
+        self.crawler = crawler
+        self.db = crawler.db
+        self.session = crawler.session
+        self.site = site
+        self.root = root
+        self.scheme = urlsplit(root).scheme or "https"
+        self.host = urlsplit(root).hostname or site
+        self.robots: RobotFileParser | None = None
+        self.delay = crawler.delay
+        self.seen: set[str] = set()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.fetched = 0
+        self._next_request = 0.0
+        self._turn = asyncio.Lock()
+
+    async def _polite(self):
+        """Space out request starts by at least ``delay`` seconds."""
+        async with self._turn:
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _get(self, url: str) -> httpx.Response | None:
+        await self._polite()
+        r, _ = await self.session.fetch(url)
+        return r
+
+    async def run(self):
+        row = self.db.execute("SELECT * FROM sites WHERE site=?", (self.site,)).fetchone()
+        if row and row["state"] == "done":
+            return
+        first = None
+        if row is None:
+            # Crawl the host the root finally lands on (e.g. www. or a new domain)
+            first = await self._get(normalize_url(self.root) or self.root)
+            if first is not None:
+                self.scheme, self.host = first.url.scheme, first.url.host
+            self.db.execute("INSERT INTO sites VALUES (?,?,?,?,?,NULL)",
+                            (self.site, self.root, self.host, "crawling", time.time()))
+            self.db.commit()
+        else:
+            self.host = row["host"]
+            self.scheme = urlsplit(row["root"]).scheme or "https"
+
+        # Resume: everything recorded is seen, and unfetched pages go back on the queue
+        for r in self.db.execute("SELECT url, depth, state FROM pages WHERE site=?", (self.site,)):
+            self.seen.add(r["url"])
+            if r["state"] == "queued":
+                self.queue.put_nowait((r["url"], r["depth"]))
+        await self._load_robots()
+        await self._read_sitemaps()
+        home = normalize_url(f"{self.scheme}://{self.host}/")
+        if first is not None and self._admit(home, 0, "root"):
+            # The root is scheme://host and landed on this host: that response is the home page
+            self._store(home, 0, first)
+        else:
+            self.add(home, 0, "root")
+        self.db.commit()
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.crawler.per_site)]
+        try:
+            await self.queue.join()
+        finally:
+            for w in workers:
+                w.cancel()
+            # Let interrupted workers unwind before the caller closes the DB
+            await asyncio.gather(*workers, return_exceptions=True)
+        self.db.execute("UPDATE sites SET state='done', finished=? WHERE site=?", (time.time(), self.site))
+        self.db.commit()
+        print(f"  {self.site}: {len(self.seen)} pages known, {self.fetched} fetched this run")
+
+    async def _load_robots(self):
+        """Read robots.txt as RobotFileParser.read() would: a 401 or 403 for it puts
+        the whole site off limits, sitemaps included; any other failure means no
+        restrictions."""
+        self.robots = RobotFileParser()
+        r = await self._get(f"{self.scheme}://{self.host}/robots.txt")
+        if r is not None and r.status_code == 200:
+            self.robots.parse(r.text.splitlines())
+            delay = self.robots.crawl_delay(ROBOTS_AGENT)
+            if delay:
+                self.delay = max(self.delay, float(delay))
+        elif r is not None and r.status_code in (401, 403):
+            self.robots.disallow_all = True
+            return
+        else:
+            self.robots.parse([])
+        sitemaps = self.robots.site_maps() or [f"{self.scheme}://{self.host}/sitemap.xml",
+                                               f"{self.scheme}://{self.host}/sitemap_index.xml"]
+        self.db.executemany("INSERT OR IGNORE INTO sitemaps (url, site, depth) VALUES (?,?,0)",
+                            [(u, self.site) for u in sitemaps])
+
+    async def _read_sitemaps(self):
+        while True:
+            pending = self.db.execute("SELECT url, depth FROM sitemaps WHERE site=? AND state='queued'",
+                                      (self.site,)).fetchall()
+            if not pending:
+                return
+            for row in pending:
+                r = await self._get(row["url"])
+                nested, urls = parse_sitemap(r.content) if r is not None and r.status_code == 200 else ([], [])
+                if row["depth"] < MAX_SITEMAP_DEPTH:
+                    self.db.executemany("INSERT OR IGNORE INTO sitemaps (url, site, depth) VALUES (?,?,?)",
+                                        [(u, self.site, row["depth"] + 1) for u in nested])
+                for u in urls:
+                    self.add(normalize_url(u), 0, "sitemap")
+                self.db.execute("UPDATE sitemaps SET state='done', urls=? WHERE url=?", (len(urls), row["url"]))
+                self.db.commit()
+
+    def _admit(self, url: str | None, depth: int, source: str) -> bool:
+        """Record a page if it is new, on this site, allowed and within limits."""
+        if (not url or url in self.seen or urlsplit(url).hostname != self.host
+                or len(self.seen) >= self.crawler.max_pages or not is_page_url(url)
+                or not self.robots.can_fetch(ROBOTS_AGENT, url)):
+            return False
+        self.seen.add(url)
+        self.db.execute("INSERT OR IGNORE INTO pages (url, site, depth, source) VALUES (?,?,?,?)",
+                        (url, self.site, depth, source))
+        return True
+
+    def add(self, url: str | None, depth: int, source: str) -> None:
+        """Queue a page if _admit() takes it."""
+        if self._admit(url, depth, source):
+            self.queue.put_nowait((url, depth))
+
+    async def _worker(self):
+        while True:
+            url, depth = await self.queue.get()
+            try:
+                await self._crawl(url, depth)
+            except Exception as e:
+                self.db.execute("UPDATE pages SET state='failed' WHERE url=?", (url,))
+                print(f"    {url}: {e}")
+            finally:
+                self.db.commit()
+                self.queue.task_done()
+
+    async def _crawl(self, url: str, depth: int):
+        self._store(url, depth, await self._get(url))
+
+    def _store(self, url: str, depth: int, r: httpx.Response | None):
+        """Save a fetched page and queue the links it adds."""
+        self.fetched += 1
+        if r is None:
+            self.db.execute("UPDATE pages SET state='failed', fetched_at=? WHERE url=?", (time.time(), url))
+            return
+        content_type = r.headers.get("content-type", "")
+        html = None
+        if "text/html" in content_type.lower():
+            if self.crawler.store_html and len(r.content) <= MAX_HTML_BYTES:
+                html = zlib.compress(r.content)
+            if depth < self.crawler.max_depth:
+                for link in extract_links(r.text, str(r.url)):
+                    self.add(link, depth + 1, "link")
+        self.db.execute(
+            "UPDATE pages SET state='done', status=?, content_type=?, final_url=?, bytes=?, html=?, fetched_at=? "
+            "WHERE url=?",
+            (r.status_code, content_type, str(r.url), len(r.content), html, time.time(), url))
+
+
+class Crawler:
+    """Runs SiteCrawlers for many sites at once over one shared session."""
+
+    def __init__(self, session: CatalogSession, db: sqlite3.Connection, parallel_sites: int = 20,
+                 per_site: int = 2, delay: float = 0.5, max_pages: int = MAX_PAGES,
+                 max_depth: int = MAX_DEPTH, store_html: bool = True):
+        self.session = session
+        self.db = db
+        self.parallel_sites = parallel_sites
+        self.per_site = per_site
+        self.delay = delay
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.store_html = store_html
+
+    async def crawl(self, roots: list[str]):
+        sem = asyncio.Semaphore(self.parallel_sites)
+
+        async def one(root: str):
+            async with sem:
+                site = urlsplit(root).hostname
+                try:
+                    await SiteCrawler(self, site, root).run()
+                except Exception as e:
+                    print(f"  {site}: crawl failed: {e}")
+
+        await asyncio.gather(*(one(root) for root in roots))
+
+
+def load_roots(sites_csv: str) -> list[str]:
+    with open(sites_csv, encoding="utf-8") as f:
+        return [row["url"] for row in csv.DictReader(f) if row.get("url")]
+
+
+def export_inventory(db: sqlite3.Connection, out_dir: str = "data/crawl"):
+    """Write inventory.csv (one row per page) and page_counts.csv (one row per site)."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / "inventory.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["site", "url", "status", "content_type", "source", "depth"])
+        w.writerows(db.execute("SELECT site, url, status, content_type, source, depth FROM pages "
+                               "WHERE state='done' ORDER BY site, url"))
+    with open(out / "page_counts.csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["site", "pages", "html_pages", "from_sitemap", "from_links", "errors", "failed"])
+        w.writerows(db.execute("""
+            SELECT site,
+                   SUM(state='done' AND status < 400),
+                   SUM(state='done' AND status < 400 AND content_type LIKE 'text/html%'),
+                   SUM(source='sitemap'), SUM(source='link'),
+                   SUM(state='done' AND status >= 400), SUM(state='failed')
+            FROM pages GROUP BY site ORDER BY site"""))
+    print(f"Inventory written to {out / 'inventory.csv'} and {out / 'page_counts.csv'}")
+
+
+async def run(args):
+    roots = load_roots(args.sites)
+    if args.only:
+        roots = [u for u in roots if urlsplit(u).hostname in args.only]
+    db = open_state(args.state)
+    if args.recrawl:
+        db.execute("DELETE FROM pages")
+        db.execute("DELETE FROM sitemaps")
+        db.execute("DELETE FROM sites")
+        db.commit()
+    # Per-host politeness is enforced by SiteCrawler; keep the session cap in line
+    session = CatalogSession(HEADERS, 20.0, global_limit=args.parallel_sites * args.per_site,
+                             per_host=args.per_site)
+    print(f"Crawling {len(roots)} sites...")
+    async with session:
+        await Crawler(session, db, args.parallel_sites, args.per_site, args.delay,
+                      args.max_pages, args.max_depth, not args.no_html).crawl(roots)
+    print(session.report())
+    export_inventory(db, str(Path(args.state).parent))
+    db.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Crawl cataloged sites into a page inventory")
+    ap.add_argument("--sites", default="data/resmed_sites.csv", help="catalog CSV to start from")
+    ap.add_argument("--state", default=STATE_PATH, help="crawl state database (resumable)")
+    ap.add_argument("--only", nargs="*", help="crawl only these hosts")
+    ap.add_argument("--parallel-sites", type=int, default=20, help="sites crawled at once")
+    ap.add_argument("--per-site", type=int, default=2, help="requests in flight per site")
+    ap.add_argument("--delay", type=float, default=0.5, help="minimum seconds between requests to a site")
+    ap.add_argument("--max-pages", type=int, default=MAX_PAGES, help="page cap per site")
+    ap.add_argument("--max-depth", type=int, default=MAX_DEPTH, help="link hops from the root or a sitemap")
+    ap.add_argument("--no-html", action="store_true", help="don't keep page HTML (needed for scoring)")
+    ap.add_argument("--recrawl", action="store_true", help="discard saved state and start over")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
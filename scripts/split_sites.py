@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
-"""Split sites into chunks for parallel agent analysis."""
+"""Split sites into chunks for parallel agent analysis, or queue them for workers."""
+import argparse
 import csv
 import json
+import sqlite3
 from pathlib import Path
 
+from job_queue import DEFAULT_PAGES, QUEUE_PATH, SECONDS_PER_PAGE, JobQueue
+
 def split_sites_into_chunks(input_csv: str, output_dir: str, num_chunks: int = 4):
     """Split sites CSV into N chunks for parallel processing."""
 
@@ -50,9 +54,57 @@ def split_sites_into_chunks(input_csv: str, output_dir: str, num_chunks: int = 4
 
     print(f"\nChunks written to: {output_path}")
 
+
+def known_page_counts(crawl_state: str) -> dict:
+    """Pages per site from a previous crawl, if there is one."""
+    if not Path(crawl_state).exists():
+        return {}
+    db = sqlite3.connect(crawl_state)
+    try:
+        return dict(db.execute("SELECT site, COUNT(*) FROM pages GROUP BY site"))
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        db.close()
+
+
+def enqueue_sites(input_csv: str, queue_path: str = QUEUE_PATH,
+                  crawl_state: str = "data/crawl/crawl_state.sqlite") -> int:
+    """Queue one job per site, weighted by its known page count (or last run time)."""
+
+    with open(input_csv, 'r', encoding='utf-8') as f:
+        sites = [s for s in csv.DictReader(f) if s.get('url')]
+
+    pages = known_page_counts(crawl_state)
+    queue = JobQueue(queue_path)
+    for site in sites:
+        host = site.get('host') or site['url']
+        estimate = pages.get(host, DEFAULT_PAGES) * SECONDS_PER_PAGE
+        queue.enqueue(host, {"url": site['url'], "host": host}, estimate)
+
+    print(f"Queued {len(sites)} sites in {queue_path} ({len(pages)} with known page counts)")
+    print(queue.report())
+    queue.close()
+    return len(sites)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--input", default="data/resmed_sites.csv")
+    ap.add_argument("--chunks", type=int, default=4, help="number of fixed chunks to write")
+    ap.add_argument("--queue", nargs="?", const=QUEUE_PATH,
+                    help="queue sites for job_queue.py workers instead of writing chunks")
+    args = ap.parse_args()
+
+    if args.queue:
+        enqueue_sites(args.input, args.queue)
+    else:
+        split_sites_into_chunks(
+            input_csv=args.input,
+            output_dir="data/chunks",
+            num_chunks=args.chunks
+        )
+
+
 if __name__ == "__main__":
-    split_sites_into_chunks(
-        input_csv="data/resmed_sites.csv",
-        output_dir="data/chunks",
-        num_chunks=4
-    )
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""Wordlist subdomain brute force over DNS, for sites nothing links to.
+
+Candidates (word.base) are generated lazily, reading the wordlist file once
+per base domain, and resolved by a window of thousands of concurrent
+queries multiplexed over one UDP socket per nameserver (BruteDNS). Most
+answers are NXDOMAINs, read straight from the header. Before a base is
+brute-forced a few random labels are resolved under it. If they answer,
+the zone has wildcard DNS, and a candidate resolving to the same addresses
+or CNAME target is the catch-all, not a site. NXDOMAINs land in the
+engine's negative cache, so repeated words and names other sources already
+tried cost nothing.
+"""
+import asyncio
+import random
+import re
+import secrets
+import struct
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, Iterator
+
+import dns.message
+import dns.resolver
+
+from dns_engine import MIN_TTL, NEGATIVE_TTL, DNSEngine, DNSResult, result_from_response
+
+BRUTE_CONCURRENCY = 2000
+# Random labels resolved per base to detect wildcard DNS
+WILDCARD_PROBES = 3
+LABEL = re.compile(r"^(?!-)[a-z0-9-]{1,63}(?<!-)$")
+# The engine's timeout is split over these; a lost datagram is retried on the next nameserver
+QUERY_ATTEMPTS = 3
+# Floor and starting size of the loss-driven query window
+MIN_WINDOW = 32
+RCODE_NOERROR, RCODE_NXDOMAIN = 0, 3
+
+
+def iter_words(path) -> Iterator[str]:
+    """Subdomain words from a wordlist (one per line; '#' comments and invalid labels skipped)."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            word = line.strip().lower().strip(".")
+            if word and not word.startswith("#") and all(LABEL.match(p) for p in word.split(".")):
+                yield word
+
+
+def query_wire(qid: int, host: str) -> tuple[bytes, bytes]:
+    """(full query, question section) for an A query with recursion desired."""
+    question = b"".join(bytes([len(label)]) + label for label in host.encode("ascii").split(b".")) \
+        + b"\0" + struct.pack("!HH", 1, 1)
+    return struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0) + question, question
+
+
+class _Nameserver(asyncio.DatagramProtocol):
+    """One connected UDP socket; replies are handed to the owning BruteDNS."""
+
+    def __init__(self, owner: "BruteDNS"):
+        self.owner = owner
+        self.transport: asyncio.DatagramTransport | None = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.owner._reply(data)
+
+    def error_received(self, exc):
+        pass
+
+
+class BruteDNS(DNSEngine):
+    """DNSEngine that multiplexes queries over one UDP socket per nameserver.
+
+    dnspython's resolver opens a socket and builds full message objects per
+    query, which caps a single process at a few hundred lookups a second.
+    Here a query is a few packed bytes, replies are matched back by ID and
+    echoed question, and only responses that carry answers are parsed. TC,
+    non-ASCII names and other rare cases fall back to the regular resolver.
+
+    Resolvers drop what they can't keep up with, and a lost reply reads as
+    "no such name". So datagrams in flight are limited by a window, as
+    HostLimiter does for HTTP. It starts small and grows by one per answer
+    until the first timeout (slow start). After that it grows by one per
+    window of answers and halves on a timeout, at most once per timeout
+    period.
+    """
+
+    def __init__(self, *args, attempts: int = QUERY_ATTEMPTS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.attempts = attempts
+        self.retries = 0
+        self.unanswered = 0
+        self.window = float(MIN_WINDOW)
+        self.slow_start = True
+        self.cuts = 0
+        self._servers: list[_Nameserver] = []
+        self._pending: dict[int, tuple[bytes, asyncio.Future]] = {}
+        self._opening: asyncio.Lock | None = None
+        self._slots: asyncio.Semaphore | None = None
+        # Permits to swallow on release after the window shrank
+        self._debt = 0
+        self._last_cut = 0.0
+
+    async def _open(self) -> list[_Nameserver]:
+        if self._opening is None:
+            self._opening = asyncio.Lock()
+            self.window = float(min(MIN_WINDOW, self.concurrency))
+            self._slots = asyncio.Semaphore(int(self.window))
+        async with self._opening:
+            if not self._servers:
+                loop = asyncio.get_running_loop()
+                nameservers = self.nameservers or dns.resolver.Resolver().nameservers
+                for ns in nameservers:
+                    _, server = await loop.create_datagram_endpoint(lambda: _Nameserver(self),
+                                                                    remote_addr=(ns, self.port))
+                    self._servers.append(server)
+        return self._servers
+
+    def _reply(self, data: bytes) -> None:
+        if len(data) < 12:
+            return
+        entry = self._pending.get(int.from_bytes(data[:2], "big"))
+        # A late or stray datagram must echo our exact question to count
+        if entry is None or data[12:12 + len(entry[0])].lower() != entry[0]:
+            return
+        future = entry[1]
+        if not future.done():
+            future.set_result(data)
+
+    def _grow(self) -> None:
+        grew = int(self.window)
+        step = 1 if self.slow_start else 1 / self.window
+        self.window = min(float(self.concurrency), self.window + step)
+        if int(self.window) > grew:
+            if self._debt:
+                self._debt -= 1
+            else:
+                self._slots.release()
+
+    def _cut(self) -> None:
+        now = time.monotonic()
+        if now - self._last_cut < self.timeout / self.attempts:
+            return
+        self._last_cut = now
+        self.slow_start = False
+        self.cuts += 1
+        smaller = max(float(MIN_WINDOW), self.window / 2)
+        self._debt += int(self.window) - int(smaller)
+        self.window = smaller
+
+    async def _send(self, server: _Nameserver, host: str) -> bytes | None:
+        await self._slots.acquire()
+        while (qid := random.getrandbits(16)) in self._pending:
+            pass
+        wire, question = query_wire(qid, host)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[qid] = (question, future)
+        try:
+            server.transport.sendto(wire)
+            data = await asyncio.wait_for(future, self.timeout / self.attempts)
+            self._grow()
+            return data
+        except (asyncio.TimeoutError, OSError):
+            self._cut()
+            return None
+        finally:
+            del self._pending[qid]
+            if self._debt:
+                self._debt -= 1
+            else:
+                self._slots.release()
+
+    async def _ask(self, host: str) -> tuple[DNSResult, float]:
+        if not host.isascii():
+            return await super()._ask(host)
+        servers = await self._open()
+        for attempt in range(self.attempts):
+            data = await self._send(servers[attempt % len(servers)], host)
+            if data is None:
+                self.retries += 1
+                continue
+            if data[2] & 0x02:
+                # Truncated: let the full resolver retry over TCP
+                return await super()._ask(host)
+            rcode = data[3] & 0x0F
+            if rcode == RCODE_NXDOMAIN:
+                # Not worth parsing the SOA for its minimum on the hot path
+                return DNSResult(host, nxdomain=True), NEGATIVE_TTL
+            if rcode == RCODE_NOERROR:
+                if data[6:8] == b"\0\0":
+                    return DNSResult(host), NEGATIVE_TTL
+                return result_from_response(host, dns.message.from_wire(data))
+            # SERVFAIL, REFUSED: another server (or another try) may do better
+            self.retries += 1
+        self.unanswered += 1
+        return DNSResult(host), MIN_TTL
+
+    def stats(self) -> dict:
+        return {**super().stats(), "retries": self.retries, "unanswered": self.unanswered,
+                "window": int(self.window), "window_cuts": self.cuts}
+
+
+@dataclass(frozen=True)
+class Wildcard:
+    """What a base's catch-all record answers with; empty when there is none."""
+    ips: frozenset[str] = frozenset()
+    targets: frozenset[str] = frozenset()
+
+    def __bool__(self) -> bool:
+        return bool(self.ips or self.targets)
+
+    def matches(self, result: DNSResult) -> bool:
+        if result.cname_chain and result.cname_chain[-1] in self.targets:
+            return True
+        # Round-robin wildcards return a rotating subset, so any overlap counts
+        return bool(self.ips.intersection(result.ips))
+
+
+class SubdomainBrute:
+    """Resolves every wordlist entry under each base domain it is given.
+
+    ``dns`` should be an engine of its own (a BruteDNS, without persistence
+    or metrics) so millions of misses don't crowd the catalog's cache.
+    ``extra_words`` are tried before the file's.
+    """
+
+    def __init__(self, wordlist, dns: DNSEngine, concurrency: int = BRUTE_CONCURRENCY,
+                 extra_words: Iterable[str] = ()):
+        self.wordlist = wordlist
+        self.dns = dns
+        self.extra_words = list(extra_words)
+        self.concurrency = concurrency
+        self.dns.concurrency = max(self.dns.concurrency, concurrency)
+        self.candidates = 0
+        self.live = 0
+        self.wildcard_hits = 0
+        self._slots: asyncio.Semaphore | None = None
+        self._wildcards: dict[str, asyncio.Future] = {}
+
+    def words(self) -> Iterator[str]:
+        yield from self.extra_words
+        yield from iter_words(self.wordlist)
+
+    def wildcard(self, base: str) -> Awaitable[Wildcard]:
+        """Wildcard answer for base, probed once however many callers ask."""
+        probe = self._wildcards.get(base)
+        if probe is None:
+            probe = self._wildcards[base] = asyncio.ensure_future(self._probe(base))
+        return probe
+
+    async def _probe(self, base: str) -> Wildcard:
+        results = await asyncio.gather(*(self.dns.resolve(f"{secrets.token_hex(10)}.{base}")
+                                         for _ in range(WILDCARD_PROBES)))
+        ips = frozenset(ip for r in results for ip in r.ips)
+        targets = frozenset(r.cname_chain[-1] for r in results if r.cname_chain)
+        return Wildcard(ips, targets)
+
+    async def run(self, base: str, emit: Callable[[str], Awaitable[None]],
+                  skip: Callable[[str], bool] | None = None) -> None:
+        """Try every word under base; emit(url) for names that resolve and aren't the wildcard.
+
+        ``skip(host)`` drops candidates before any query is sent (already
+        known, or excluded anyway). Candidates are created only as slots free
+        up, so memory doesn't grow with the wordlist.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+        wildcard = await self.wildcard(base)
+        pending: set[asyncio.Task] = set()
+        for word in self.words():
+            host = f"{word}.{base}"
+            if skip and skip(host):
+                continue
+            await self._slots.acquire()
+            self.candidates += 1
+            task = asyncio.create_task(self._check(host, wildcard, emit))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _check(self, host: str, wildcard: Wildcard, emit) -> None:
+        try:
+            result = await self.dns.resolve(host)
+        finally:
+            self._slots.release()
+        if not result.exists:
+            return
+        if wildcard and wildcard.matches(result):
+            self.wildcard_hits += 1
+            return
+        self.live += 1
+        await emit(f"https://{host}")
+
+    def stats(self) -> dict:
+        wildcard_bases = sorted(base for base, probe in self._wildcards.items()
+                                if probe.done() and not probe.cancelled() and probe.exception() is None
+                                and probe.result())
+        return {"candidates": self.candidates, "live": self.live, "wildcard_hits": self.wildcard_hits,
+                "bases": len(self._wildcards), "wildcard_bases": wildcard_bases,
+                "queries": self.dns.queries, "concurrency": self.concurrency,
+                **{k: v for k, v in self.dns.stats().items() if k in ("unanswered", "window", "window_cuts")}}
+
+    def report(self) -> str:
+        s = self.stats()
+        line = (f"  wordlist: {s['candidates']} candidates over {s['bases']} base domains, {s['queries']} queries, "
+                f"{s['live']} live, {s['wildcard_hits']} wildcard answers dropped")
+        if s.get("unanswered"):
+            line += f"; {s['unanswered']} names got no answer (window {s['window']})"
+        if s["wildcard_bases"]:
+            line += f" (wildcard DNS on {', '.join(s['wildcard_bases'])})"
+        return line
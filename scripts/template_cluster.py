@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Groups a site's pages into templates by the shape of their DOM, without comparing every pair.
+
+Each page is reduced to the set of tag paths it contains (``body/div/main/ul/li``,
+and so on). A MinHash signature of that set estimates Jaccard similarity
+between two pages from NUM_PERM integers. Signatures are cut into BANDS bands.
+Pages that agree on a whole band land in the same LSH bucket, and only those
+candidates are compared. Similar pairs are merged with union-find, so
+clustering a site costs about NUM_PERM work per page however many pages it has.
+"""
+import random
+import zlib
+from typing import Hashable, Iterable, Sequence
+
+NUM_PERM = 64
+# 16 bands of 4 rows: pages about 50% alike usually share a bucket, and
+# SIMILARITY then decides
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Estimated Jaccard similarity of tag-path sets for two pages to share a template
+SIMILARITY = 0.6
+# Tag paths deeper than this add nothing about the layout
+MAX_PATH_DEPTH = 16
+
+_PRIME = (1 << 61) - 1
+# Fixed seed: signatures from different runs and processes must be comparable
+_rng = random.Random(0x7E3)
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(NUM_PERM)]
+
+
+def shingle(path: Sequence[str]) -> int:
+    """32-bit hash of one tag path."""
+    return zlib.crc32("/".join(path[:MAX_PATH_DEPTH]).encode("ascii", errors="replace"))
+
+
+def minhash(shingles: Iterable[int]) -> tuple[int, ...]:
+    """MinHash signature of a set of shingle hashes; empty for an empty set."""
+    hashes = set(shingles)
+    if not hashes:
+        return ()
+    return tuple(min([(a * h + b) % _PRIME for h in hashes]) for a, b in _PERMS)
+
+
+def similarity(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the sets behind two signatures."""
+    if not a or not b:
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+def cluster(signatures: Sequence[tuple[int, ...]], threshold: float = SIMILARITY) -> list[list[int]]:
+    """Indices of signatures grouped into templates, largest group first.
+
+    Each bucket keeps one representative per cluster that reached it, and a
+    newcomer is compared against those only. A bucket full of one template's
+    pages therefore costs a single comparison per page. Pages with an empty
+    signature (no body) stay on their own.
+    """
+    parent = list(range(len(signatures)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: dict[Hashable, list[int]] = {}
+    for i, sig in enumerate(signatures):
+        if not sig:
+            continue
+        for band in range(BANDS):
+            reps = buckets.setdefault((band, sig[band * ROWS:(band + 1) * ROWS]), [])
+            for j in reps:
+                if find(i) == find(j):
+                    break
+                if similarity(sig, signatures[j]) >= threshold:
+                    parent[find(i)] = find(j)
+                    break
+            else:
+                reps.append(i)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(signatures)):
+        groups.setdefault(find(i), []).append(i)
+    return sorted(groups.values(), key=lambda g: (-len(g), g[0]))
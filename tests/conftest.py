@@ -0,0 +1,5 @@
+"""The scripts import each other by module name, as when run from scripts/."""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
@@ -0,0 +1,66 @@
+"""CatalogJournal resumption: a torn or garbled tail is dropped, and appending
+carries on from the last intact record."""
+from catalog_journal import CatalogJournal, SiteRecord
+
+RECORDS = [
+    SiteRecord("www.resmed.com", "https://www.resmed.com", 200, "ResMed", "Akamai", "127.0.0.1",
+               "www.resmed.com.edgekey.net", "https://www.resmed.com/", ("https://resmed.com/",)),
+    SiteRecord("www.resmed.fr", "https://www.resmed.fr", 301, "Accueil – ResMed", None, None, "",
+               "https://www.resmed.fr/fr-fr/"),
+    SiteRecord("nosuch.resmed.de", "https://nosuch.resmed.de"),
+]
+
+
+def journal_with(tmp_path, records, tail: bytes = b"") -> CatalogJournal:
+    journal = CatalogJournal(tmp_path / "journal.jsonl")
+    journal.open()
+    for record in records:
+        journal.write(record)
+    journal.close()
+    with open(journal.path, "ab") as f:
+        f.write(tail)
+    return CatalogJournal(journal.path)
+
+
+def test_replay_round_trips(tmp_path):
+    journal = journal_with(tmp_path, RECORDS)
+    assert list(journal.replay()) == RECORDS
+
+
+def test_replay_stops_at_a_torn_write(tmp_path):
+    torn = RECORDS[2].to_json().encode("utf-8")[:-7]
+    journal = journal_with(tmp_path, RECORDS[:2], tail=torn)
+    assert list(journal.replay()) == RECORDS[:2]
+
+
+def test_replay_stops_at_a_garbled_line(tmp_path):
+    journal = journal_with(tmp_path, RECORDS[:1], tail=b"\x00\x00\x00\n" + RECORDS[1].to_json().encode() + b"\n")
+    assert list(journal.replay()) == RECORDS[:1]
+
+
+def test_resumed_run_appends_after_the_last_good_record(tmp_path):
+    torn = RECORDS[2].to_json().encode("utf-8")[:-7]
+    journal = journal_with(tmp_path, RECORDS[:2], tail=torn)
+    assert len(list(journal.replay())) == 2
+    journal.open()
+    journal.write(RECORDS[2])
+    assert list(journal.records()) == RECORDS
+    journal.close()
+    assert list(CatalogJournal(journal.path).replay()) == RECORDS
+
+
+def test_open_without_replay_starts_empty(tmp_path):
+    journal = journal_with(tmp_path, RECORDS)
+    journal.open()
+    journal.write(RECORDS[0])
+    journal.close()
+    assert list(CatalogJournal(journal.path).replay()) == RECORDS[:1]
+
+
+def test_discard_removes_the_file(tmp_path):
+    journal = journal_with(tmp_path, RECORDS)
+    list(journal.replay())
+    journal.open()
+    journal.discard()
+    assert not journal.path.exists()
+    assert list(CatalogJournal(journal.path).replay()) == []
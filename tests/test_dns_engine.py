@@ -0,0 +1,81 @@
+"""DNSEngine against fake_fleet's stub resolver: answers, and which lookups
+the cache saves from going to the network."""
+import asyncio
+
+from dns_engine import DNSEngine
+from fake_fleet import Fleet, FleetServer
+from http_cache import ResponseCache
+
+FLEET = Fleet(40)
+ALIASED = next(h for h, s in FLEET.sites.items() if s.cname)
+PLAIN = next(h for h, s in FLEET.sites.items() if not s.cname)
+
+
+def against_fleet(test):
+    """Run test(dns_port) with the fleet's stub DNS listening."""
+    async def main():
+        server = FleetServer(FLEET)
+        _, dns_port = await server.start()
+        try:
+            return await test(dns_port)
+        finally:
+            await server.close()
+    return asyncio.run(main())
+
+
+def engine(dns_port: int, **kwargs) -> DNSEngine:
+    return DNSEngine(nameservers=["127.0.0.1"], port=dns_port, timeout=2.0, **kwargs)
+
+
+def test_second_lookup_comes_from_cache():
+    async def test(port):
+        dns = engine(port)
+        first = await dns.resolve(ALIASED)
+        again = await dns.resolve(ALIASED.upper() + ".")
+        assert first.cname_chain[0] == FLEET.sites[ALIASED].cname
+        assert first.cname_chain[1].endswith(".akamaiedge.net")
+        assert first.ips == ["127.0.0.1"]
+        assert again == first
+        assert (await dns.resolve(PLAIN)).cname_chain == []
+        assert (dns.queries, dns.cache_hits) == (2, 1)
+    against_fleet(test)
+
+
+def test_nxdomain_is_cached():
+    async def test(port):
+        dns = engine(port)
+        for _ in range(3):
+            result = await dns.resolve("nosuch.resmed.com")
+            assert result.nxdomain and not result.exists
+        assert (dns.queries, dns.cache_hits) == (1, 2)
+        assert dns.stats()["negative_names"] == 1
+    against_fleet(test)
+
+
+def test_concurrent_lookups_share_one_query():
+    async def test(port):
+        dns = engine(port)
+        results = await dns.resolve_many([PLAIN] * 20)
+        assert all(r.ip == "127.0.0.1" for r in results)
+        assert dns.queries == 1
+    against_fleet(test)
+
+
+def test_persisted_answers_serve_an_offline_run(tmp_path):
+    store = ResponseCache(str(tmp_path / "cache.sqlite"))
+
+    async def online(port):
+        return await engine(port, persist=store).resolve_many([ALIASED, PLAIN, "nosuch.resmed.com"])
+
+    async def offline():
+        # Nothing listens here; every answer has to come from the store
+        dns = engine(9, persist=store, offline=True)
+        return await dns.resolve_many([ALIASED, PLAIN, "nosuch.resmed.com"]), dns.queries
+
+    try:
+        live = against_fleet(online)
+        replayed, queries = asyncio.run(offline())
+    finally:
+        store.close()
+    assert replayed == live
+    assert queries == 0
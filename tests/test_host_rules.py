@@ -0,0 +1,215 @@
+"""host_rules against the if-chains it replaced: same answers, and no slower.
+
+legacy_should_exclude and legacy_guess_hosting are resmed_catalog's
+functions from before the rule table, kept verbatim as the reference.
+"""
+import random
+import re
+import time
+
+from host_rules import default_classifier
+
+WORDS = ["www", "shop", "dev", "api", "uat", "test", "staging", "stage", "admin", "portal", "mail",
+         "vpn", "sbx", "sit", "qa", "poc", "backend", "cognos", "internal", "au", "fr", "de", "jp",
+         "myair", "store", "support", "learn", "news", "investor", "careers", "sleep"]
+SUFFIXES = ["resmed.com", "resmed.com.au", "resmed.ca", "resmed.co.uk", "resmed.de", "resmed.fr"]
+SIGNALS = ["cloudflare", "nginx", "apache", "akamaighost", "fastly", "amazons3", "microsoft-iis/10.0",
+           "litespeed", "envoy", "gws", "vercel", "netlify", "kestrel", "openresty", "cowboy"]
+# Rows per timing run; enough to dwarf timer noise, small enough for a quick suite
+N = 50_000
+
+
+def legacy_should_exclude(u:str)->bool:
+    """Exclude VPN, mail, admin, dev, stage/staging, API subdomains, and resmed.ca"""
+    host = re.sub(r"^https?://", "", u).split("/")[0].lower()
+
+    # Exclude all resmed.ca domains
+    if "resmed.ca" in host:
+        return True
+
+    # Check for excluded prefixes
+    excluded_prefixes = [
+        "vpn.", "mail.", "webmail.",
+        "admin.", "admin-",
+        "api.", "api-", "apim.", "apigateway",
+        "dev.", "dev-", "dev2-", "dev3-", "developer.",
+        "stage.", "staging.", "staging-",
+        "test.", "test-",
+        "uat.", "uat-", "uat2-",
+        "qa.", "qa-", "qa2-",
+        "sbx.", "-sbx.", "sandbox.",
+        "sit.", "-sit.",
+        "poc.", "-poc.",
+        "internal-",
+    ]
+
+    for prefix in excluded_prefixes:
+        if host.startswith(prefix) or f"-{prefix.rstrip('.-')}" in host:
+            return True
+
+    # Check for excluded keywords anywhere in hostname (substring match)
+    excluded_keywords = [
+        "dev", "uat", "test", "staging", "stage", "admin", "sandbox", "sbx", "sit", "qa", "poc",
+        "api", "backend", "analytics", "cognos", "portal"
+    ]
+
+    parts = host.split(".")
+    for part in parts:
+        # Check if any excluded keyword appears anywhere in this part
+        for keyword in excluded_keywords:
+            if keyword in part:
+                return True
+
+    return False
+
+
+def legacy_guess_hosting(headers:dict, cname_chain:list[str], ip:str|None=None)->str|None:
+    """Enhanced hosting/CDN provider detection"""
+    h = {k.lower():v for k,v in headers.items()}
+    server = h.get("server","").lower()
+    via = h.get("via","").lower()
+    powered_by = h.get("x-powered-by","").lower()
+    cname = " ".join(cname_chain).lower()
+
+    # Combine all signals
+    hay = f"{server} {via} {cname} {powered_by}".lower()
+
+    # CDNs (check first as they're most common)
+    if "cloudflare" in hay or "cf-ray" in h: return "Cloudflare"
+    if "akamai" in hay or "edgesuite.net" in hay or "akamaihd.net" in hay or "akamaiedge" in hay: return "Akamai"
+    if "fastly" in hay or "fastly.net" in hay: return "Fastly"
+    if "cloudfront" in hay or "cloudfront.net" in hay: return "Amazon CloudFront"
+
+    # E-commerce platforms
+    if "shopify" in hay or "myshopify.com" in hay: return "Shopify"
+    if "bigcommerce" in hay or "mybigcommerce.com" in hay: return "BigCommerce"
+    if "woocommerce" in powered_by: return "WooCommerce"
+
+    # CMS/Marketing platforms
+    if "hubspot" in hay or "hscoscdn" in hay or "hubspot.net" in hay: return "HubSpot"
+    if "wordpress.com" in hay or "wp.com" in hay: return "WordPress.com"
+    if "squarespace" in hay: return "Squarespace"
+    if "wix" in hay: return "Wix"
+    if "webflow" in hay: return "Webflow"
+    if "ghost" in hay: return "Ghost"
+
+    # Managed WordPress
+    if "wpengine" in hay or "wpenginepowered" in hay: return "WP Engine"
+    if "kinsta" in hay: return "Kinsta"
+    if "pantheon" in hay or "pantheonsite.io" in hay: return "Pantheon"
+    if "flywheel" in hay: return "Flywheel"
+
+    # PaaS/Hosting
+    if "vercel" in hay or "vercel-dns" in hay or "vercel.app" in hay: return "Vercel"
+    if "netlify" in hay or "netlify.app" in hay or "netlify.com" in hay: return "Netlify"
+    if "heroku" in hay or "herokuapp.com" in hay: return "Heroku"
+    if "aws" in hay or "amazon" in hay or "elastic" in hay: return "AWS"
+    if "azure" in hay or "azurewebsites" in hay or "windows" in hay: return "Microsoft Azure"
+    if "google" in hay or "gcp" in hay or "appspot" in hay: return "Google Cloud"
+    if "digitalocean" in hay: return "DigitalOcean"
+    if "linode" in hay: return "Linode"
+    if "vultr" in hay: return "Vultr"
+
+    # Enterprise/Other
+    if "equisolve" in hay: return "Q4 (Equisolve)"
+    if "q4web" in hay: return "Q4 Web Systems"
+    if "adobedc" in hay or "adobedtm" in hay or "omtrdc" in hay: return "Adobe Experience Cloud"
+    if "optimizely" in hay or "episerver" in hay: return "Optimizely"
+    if "sitecore" in hay: return "Sitecore"
+    if "acquia" in hay: return "Acquia"
+
+    # Web servers (only if no hosting platform detected)
+    if "nginx" in server: return "Nginx (self-hosted)"
+    if "apache" in server: return "Apache (self-hosted)"
+    if "iis" in server or "microsoft" in server: return "IIS (self-hosted)"
+    if "litespeed" in server: return "LiteSpeed (self-hosted)"
+
+    return None
+
+
+def hosts(n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        labels = [rng.choice(WORDS) + rng.choice(["", "", "-" + rng.choice(WORDS), str(rng.randint(1, 9))])
+                  for _ in range(rng.randint(1, 2))]
+        out.append(f"https://{'.'.join(labels)}.{rng.choice(SUFFIXES)}/")
+    return out
+
+
+def responses(n: int, seed: int = 0, lower: bool = True) -> list[tuple[dict, list[str]]]:
+    """Response header sets: the usual headers plus hosting signals. The catalog
+    passes dict(response.headers), whose names httpx has lower-cased."""
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        headers = {"Date": f"Sun, 18 Oct 2026 12:{i // 60 % 60:02}:{i % 60:02} GMT",
+                   "Content-Type": "text/html; charset=utf-8", "Content-Length": str(rng.randint(500, 90000)),
+                   "Cache-Control": "max-age=300", "ETag": f'"{rng.getrandbits(32):x}"', "Vary": "Accept-Encoding",
+                   "Strict-Transport-Security": "max-age=31536000", "X-Frame-Options": "SAMEORIGIN",
+                   "Server": rng.choice(SIGNALS)}
+        if rng.random() < 0.2:
+            headers["Via"] = "1.1 " + rng.choice(SIGNALS)
+        if rng.random() < 0.1:
+            headers["X-Powered-By"] = rng.choice(["PHP/8.1", "WooCommerce", "Express", "ASP.NET"])
+        if rng.random() < 0.05:
+            headers["CF-RAY"] = "0000-SYD"
+        edge = rng.choice(["akamaiedge.net", "cloudfront.net", "herokuapp.com", "example.net"])
+        chain = [f"e{rng.randint(1, 99)}.{edge}"] if rng.random() < 0.3 else []
+        out.append(({k.lower(): v for k, v in headers.items()} if lower else headers, chain))
+    return out
+
+
+def best_of(runs: int, *fns) -> list[float]:
+    """Fastest of `runs` timings for each function, run in turn so that load on
+    the machine falls on all of them alike."""
+    best = [float("inf")] * len(fns)
+    for _ in range(runs):
+        for i, fn in enumerate(fns):
+            start = time.perf_counter()
+            fn()
+            best[i] = min(best[i], time.perf_counter() - start)
+    return best
+
+
+def keeps_up(legacy, *fns, tries: int = 3) -> bool:
+    """Whether the fns all ran no slower than legacy in one of a few tries; one
+    try is at the mercy of whatever else the machine is doing, a slower
+    implementation loses every one."""
+    for _ in range(tries):
+        base, *times = best_of(5, legacy, *fns)
+        if max(times) <= base:
+            return True
+    return False
+
+
+def test_exclusion_matches_legacy():
+    urls = hosts(N)
+    rules = default_classifier()
+    assert [r is not None for r in rules.classify_hosts(urls)] == [legacy_should_exclude(u) for u in urls]
+    assert [rules.exclusion(u) is not None for u in urls] == [legacy_should_exclude(u) for u in urls]
+
+
+def test_hosting_matches_legacy():
+    rows = responses(N // 2) + responses(N // 2, seed=2, lower=False)
+    rules = default_classifier()
+    expected = [legacy_guess_hosting(h, c) for h, c in rows]
+    assert [r.name if r else None for r in rules.classify_hosting(rows)] == expected
+    assert [(r := rules.hosting_provider(h, c)) and r.name for h, c in rows] == expected
+
+
+def test_exclusion_not_slower_than_legacy():
+    # Distinct hosts, so classify_hosts' per-host memo doesn't flatter it
+    urls = hosts(N, seed=1)
+    rules = default_classifier()
+    assert 0.3 < sum(r is not None for r in rules.classify_hosts(urls)) / N < 0.8
+    assert keeps_up(lambda: [legacy_should_exclude(u) for u in urls],
+                    lambda: [rules.exclusion(u) for u in urls],
+                    lambda: rules.classify_hosts(urls))
+
+
+def test_hosting_not_slower_than_legacy():
+    rows = responses(N, seed=1)
+    rules = default_classifier()
+    assert keeps_up(lambda: [legacy_guess_hosting(h, c) for h, c in rows],
+                    lambda: rules.classify_hosting(rows))
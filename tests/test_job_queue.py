@@ -0,0 +1,85 @@
+"""JobQueue leases: expiry puts a job back, only the holder may finish it, and
+re-enqueueing never takes a job away from the worker running it."""
+import time
+
+import pytest
+
+from job_queue import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = JobQueue(tmp_path / "jobs.sqlite", lease_seconds=60, max_attempts=3)
+    yield q
+    q.close()
+
+
+def expire(queue: JobQueue, key: str) -> None:
+    queue._tx("UPDATE jobs SET lease_expires=? WHERE key=?", (time.time() - 1, key))
+
+
+def state(queue: JobQueue, key: str) -> str:
+    return queue._read("SELECT state FROM jobs WHERE key=?", (key,))[0]["state"]
+
+
+def test_costliest_job_first(queue):
+    queue.enqueue("small", {}, estimate=5)
+    queue.enqueue("big", {}, estimate=50)
+    assert queue.lease("w1").key == "big"
+    assert queue.lease("w2").key == "small"
+    assert queue.lease("w3") is None
+
+
+def test_expired_lease_goes_back_to_the_queue(queue):
+    queue.enqueue("site", {"url": "https://site"})
+    first = queue.lease("w1")
+    assert queue.lease("w2") is None
+    expire(queue, "site")
+    second = queue.lease("w2")
+    assert (second.key, second.worker, second.attempts) == ("site", "w2", 2)
+    assert second.payload == {"url": "https://site"}
+
+
+def test_stale_worker_cannot_touch_the_job(queue):
+    queue.enqueue("site", {})
+    stale = queue.lease("w1")
+    expire(queue, "site")
+    holder = queue.lease("w2")
+    assert not queue.renew(stale)
+    assert stale.lost.is_set()
+    assert not queue.complete(stale)
+    assert not queue.fail(stale, "boom")
+    assert state(queue, "site") == "leased"
+    assert queue.renew(holder) and not holder.lost.is_set()
+    assert queue.complete(holder)
+    assert state(queue, "site") == "done"
+
+
+def test_attempts_run_out(queue):
+    queue.enqueue("site", {})
+    for _ in range(3):
+        job = queue.lease("w1")
+        assert queue.fail(job, "boom")
+    assert state(queue, "site") == "failed"
+    assert queue.lease("w1") is None
+
+
+def test_reenqueue_leaves_a_leased_job_alone(queue):
+    queue.enqueue("site", {"run": 1})
+    job = queue.lease("w1")
+    queue.enqueue("site", {"run": 2})
+    assert state(queue, "site") == "leased"
+    assert queue.lease("w2") is None
+    assert queue.renew(job)
+    assert queue.complete(job)
+
+
+def test_reenqueue_rearms_finished_jobs(queue):
+    queue.enqueue("site", {"run": 1}, estimate=5)
+    job = queue.lease("w1")
+    assert queue.complete(job)
+    queue.enqueue("site", {"run": 2}, estimate=5)
+    again = queue.lease("w2")
+    assert (again.payload, again.attempts) == ({"run": 2}, 1)
+    # Costed by how long the first run took, not the estimate
+    assert again.cost < 5